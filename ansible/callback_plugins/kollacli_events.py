@@ -0,0 +1,135 @@
+# Copyright(c) 2015, Oracle and/or its affiliates.  All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+"""ansible callback plugin that records playbook events for kollacli
+
+Each event is written as one json line to the file named by the
+KOLLACLI_EVENTS_PATH environment variable. Without that variable the
+plugin does nothing, so other ansible runs are not affected.
+
+This plugin is run by ansible, it must not import kollacli.
+"""
+import json
+import os
+import time
+
+try:
+    from ansible.plugins.callback import CallbackBase
+except ImportError:
+    # ansible 1.x
+    CallbackBase = object
+
+EVENTS_PATH_ENV = 'KOLLACLI_EVENTS_PATH'
+
+
+class CallbackModule(CallbackBase):
+
+    CALLBACK_VERSION = 2.0
+    CALLBACK_TYPE = 'aggregate'
+    CALLBACK_NAME = 'kollacli_events'
+
+    def __init__(self, *args, **kwargs):
+        super(CallbackModule, self).__init__(*args, **kwargs)
+        self._events_file = None
+        path = os.environ.get(EVENTS_PATH_ENV)
+        if path:
+            self._events_file = open(path, 'a')
+
+    def _event(self, event, **kwargs):
+        if not self._events_file:
+            return
+        kwargs['event'] = event
+        kwargs['time'] = time.time()
+        self._events_file.write(json.dumps(kwargs) + '\n')
+        self._events_file.flush()
+
+    def _host_result(self, host, status, res=None):
+        msg = None
+        if status in ('failed', 'unreachable') and isinstance(res, dict):
+            msg = res.get('msg')
+        if status == 'ok' and isinstance(res, dict) and res.get('changed'):
+            status = 'changed'
+        self._event('host_result', host=host, status=status, msg=msg)
+
+    # ansible 2 callbacks
+
+    def v2_playbook_on_play_start(self, play):
+        self._event('play_start', name=play.get_name())
+
+    def v2_playbook_on_task_start(self, task, is_conditional):
+        role = None
+        name = task.get_name()
+        if getattr(task, '_role', None):
+            role = task._role.get_name()
+            # the task name is prefixed with "role : "
+            prefix = '%s : ' % role
+            if name.startswith(prefix):
+                name = name[len(prefix):]
+        self._event('task_start', name=name, role=role)
+
+    def v2_playbook_on_handler_task_start(self, task):
+        self.v2_playbook_on_task_start(task, False)
+
+    def v2_runner_on_ok(self, result):
+        self._host_result(_get_hostname(result), 'ok', result._result)
+
+    def v2_runner_on_failed(self, result, ignore_errors=False):
+        status = 'failed'
+        if ignore_errors:
+            status = 'ok'
+        self._host_result(_get_hostname(result), status, result._result)
+
+    def v2_runner_on_skipped(self, result):
+        self._host_result(_get_hostname(result), 'skipped')
+
+    def v2_runner_on_unreachable(self, result):
+        self._host_result(_get_hostname(result), 'unreachable',
+                          result._result)
+
+    def v2_playbook_on_stats(self, stats):
+        self._event('playbook_end')
+
+    # ansible 1.x callbacks
+
+    def playbook_on_play_start(self, name):
+        self._event('play_start', name=name)
+
+    def playbook_on_task_start(self, name, is_conditional):
+        # role task names are of the form "role | task"
+        role = None
+        if ' | ' in name:
+            role, name = name.split(' | ', 1)
+        self._event('task_start', name=name, role=role)
+
+    def runner_on_ok(self, host, res):
+        self._host_result(host, 'ok', res)
+
+    def runner_on_failed(self, host, res, ignore_errors=False):
+        status = 'failed'
+        if ignore_errors:
+            status = 'ok'
+        self._host_result(host, status, res)
+
+    def runner_on_skipped(self, host, item=None):
+        self._host_result(host, 'skipped')
+
+    def runner_on_unreachable(self, host, res):
+        self._host_result(host, 'unreachable', res)
+
+    def playbook_on_stats(self, stats):
+        self._event('playbook_end')
+
+
+def _get_hostname(result):
+    host = getattr(result, 'host', None) or result._host
+    return host.get_name()
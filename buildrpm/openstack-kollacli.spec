@@ -37,7 +37,6 @@ BuildRequires:  python-setuptools           >= 0.9.8
 BuildRequires:  python-pbr                  >= 1.3.0
 Requires:       openstack-kolla-ansible     >= 0.1.0
 Requires:       babel                       >= 2.0
-Requires:       pexpect                     >= 2.3
 Requires:       python-babel                >= 2.0
 Requires:       python-cliff                >= 1.13.0
 Requires:       python-cliff-tablib         >= 1.1
@@ -90,9 +89,11 @@ mkdir -m 0770 -p %{buildroot}/%{_var}/log/kolla
 cp -r tools/* %{buildroot}/%{_datadir}/kolla/kollacli/tools
 cp -r ansible/* %{buildroot}/%{_datadir}/kolla/kollacli/ansible
 
-# Create an empty inventory file
+# Create empty inventory and inventory journal files
 touch %{buildroot}/%{_sysconfdir}/kolla/kollacli/ansible/inventory.json
 chmod 0664 %{buildroot}/%{_sysconfdir}/kolla/kollacli/ansible/inventory.json
+touch %{buildroot}/%{_sysconfdir}/kolla/kollacli/ansible/inventory.journal
+chmod 0664 %{buildroot}/%{_sysconfdir}/kolla/kollacli/ansible/inventory.journal
 
 %clean
 rm -rf %{buildroot}
@@ -106,7 +107,9 @@ rm -rf %{buildroot}
 %attr(550, %{kolla_user}, %{kolla_group}) %dir %{_datadir}/kolla/kollacli/tools
 %attr(500, %{kolla_user}, %{kolla_group}) %{_datadir}/kolla/kollacli/tools/passwd*
 %attr(550, %{kolla_user}, %{kolla_group}) %{_datadir}/kolla/kollacli/tools/log_*
+%attr(550, %{kolla_user}, %{kolla_group}) %{_datadir}/kolla/kollacli/tools/yaml_*
 %attr(550, %{kolla_user}, %{kolla_group}) %{_datadir}/kolla/kollacli/ansible/*.yml
+%attr(550, %{kolla_user}, %{kolla_group}) %{_datadir}/kolla/kollacli/ansible/callback_plugins
 %attr(-, %{kolla_user}, %{kolla_group}) %config(noreplace) %{_sysconfdir}/kolla/kollacli
 %attr(2770, %{kolla_user}, %{kolla_group}) %dir %{_var}/log/kolla
 
@@ -136,6 +139,31 @@ then
         /etc/sudoers.d/%{kolla_user}
 fi
 
+# kollacli runs ansible through sudo, keep its output unbuffered.
+# only for the kolla commands, replacing the global line of old installs
+sed -i '/^Defaults env_keep += "PYTHONUNBUFFERED"$/d' \
+    /etc/sudoers.d/%{kolla_user}
+if ! grep -q 'KOLLA_CMDS env_keep.*PYTHONUNBUFFERED' \
+    /etc/sudoers.d/%{kolla_user}
+then
+    echo 'Defaults!KOLLA_CMDS env_keep += "PYTHONUNBUFFERED"' \
+        >> /etc/sudoers.d/%{kolla_user}
+fi
+
+# kollacli passes its ansible settings and event callback through sudo.
+# only the variables it sets, and only for the kolla commands, replacing
+# the global line of old installs
+sed -i '/^Defaults env_keep += "ANSIBLE_\* KOLLACLI_\*"$/d' \
+    /etc/sudoers.d/%{kolla_user}
+if ! grep -q 'KOLLA_CMDS env_keep.*KOLLACLI_EVENTS_PATH' \
+    /etc/sudoers.d/%{kolla_user}
+then
+    echo 'Defaults!KOLLA_CMDS env_keep += "ANSIBLE_CALLBACK_PLUGINS'\
+' ANSIBLE_FORKS ANSIBLE_PIPELINING ANSIBLE_SSH_ARGS ANSIBLE_SSH_PIPELINING'\
+' ANSIBLE_STRATEGY KOLLACLI_EVENTS_PATH"' \
+        >> /etc/sudoers.d/%{kolla_user}
+fi
+
 # remove obsolete json_generator script
 if test -f %{_datadir}/kolla/kollacli/tools/json_generator.py
 then
@@ -0,0 +1,203 @@
+# Copyright(c) 2015, Oracle and/or its affiliates.  All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+import hashlib
+import json
+import logging
+import os
+
+from kollacli.ansible import passwords
+from kollacli.ansible import planner
+from kollacli.ansible.inventory import SERVICES
+from kollacli.ansible.properties import ALLVARS_PATH
+from kollacli.ansible.properties import ANSIBLE_ROLES_PATH
+from kollacli.ansible.properties import GLOBALS_FILENAME
+from kollacli.utils import atomic_write_file
+from kollacli.utils import get_kolla_etc
+from kollacli.utils import get_relevant_values
+from kollacli.utils import get_kolla_home
+from kollacli.utils import get_kollacli_etc
+from kollacli.utils import sync_read_file
+from kollacli.utils import yaml_load
+
+FINGERPRINTS_PATH = 'ansible/service_fingerprints.json'
+
+# directory of the configuration override files of the services, relative
+# to the kolla etc directory
+CONFIG_OVERRIDES_PATH = 'config'
+
+
+def get_fingerprints(inventory, servicenames, password_fingerprints=None):
+    """fingerprint the configuration of services
+
+    The fingerprint of a service covers:
+    - the properties in globals.yml and the passwords whose names are
+      prefixed with the service name, or with no service name at all
+    - group_vars/all.yml
+    - the files of the service role
+    - the configuration override files of the service, in
+      /etc/kolla/config/<service>
+    - the groups of the service and its sub-services, and their hosts
+    - the fingerprints of the services it depends on, as in
+      planner.SERVICE_DEPENDENCIES
+
+    password_fingerprints is as returned by
+    passwords.get_password_fingerprints(SERVICES), which is called if it
+    is not given.
+
+    return dict of service name to fingerprint
+    """
+    kolla_home = get_kolla_home()
+    kolla_etc = get_kolla_etc()
+    globals_data = sync_read_file(os.path.join(kolla_etc, GLOBALS_FILENAME))
+    global_props = yaml_load(globals_data) or {}
+    if password_fingerprints is None:
+        password_fingerprints = passwords.get_password_fingerprints(SERVICES)
+    allvars_hash = _get_file_hash(os.path.join(kolla_home, ALLVARS_PATH))
+
+    # the services that the services depend on are fingerprinted too
+    own_fingerprints = {}
+    remaining = list(servicenames)
+    while remaining:
+        servicename = remaining.pop()
+        if servicename in own_fingerprints:
+            continue
+        remaining.extend(planner.SERVICE_DEPENDENCIES.get(servicename, []))
+        service = inventory.get_service(servicename)
+        groups = {}
+        if service:
+            groupnames = service.get_groupnames()
+            for sub_servicename in service.get_sub_servicenames():
+                sub_service = inventory.get_sub_service(sub_servicename)
+                if sub_service:
+                    groupnames.extend(
+                        ['%s:%s' % (sub_servicename, groupname)
+                         for groupname in sub_service.get_groupnames()])
+            for groupname in groupnames:
+                group = inventory.get_group(groupname.split(':')[-1])
+                groups[groupname] = sorted(group.get_hostnames()
+                                           if group else [])
+
+        role_dir = os.path.join(kolla_home, ANSIBLE_ROLES_PATH, servicename)
+        overrides_dir = os.path.join(kolla_etc, CONFIG_OVERRIDES_PATH,
+                                     servicename)
+        config = {
+            'properties': get_relevant_values(global_props, servicename,
+                                              SERVICES),
+            'passwords': password_fingerprints.get(servicename),
+            'allvars': allvars_hash,
+            'role': _get_dir_hash(role_dir),
+            'overrides': _get_dir_hash(overrides_dir),
+            'groups': groups,
+            }
+        own_fingerprints[servicename] = _get_hash(config)
+
+    fingerprints = {}
+    for servicename in servicenames:
+        fingerprints[servicename] = _get_combined_fingerprint(
+            servicename, own_fingerprints, {})
+    return fingerprints
+
+
+def load_fingerprints():
+    """return dict of service name to fingerprint of its last deploy"""
+    path = os.path.join(get_kollacli_etc(), FINGERPRINTS_PATH)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r') as fingerprints_file:
+            return json.load(fingerprints_file)
+    except (IOError, ValueError) as e:
+        # every service is deployed again
+        log = logging.getLogger(__name__)
+        log.warning('Service fingerprints not loaded: %s' % e)
+        return {}
+
+
+def save_fingerprints(fingerprints):
+    """store fingerprints of deployed services
+
+    The fingerprints of other services are kept.
+    """
+    stored = load_fingerprints()
+    stored.update(fingerprints)
+    path = os.path.join(get_kollacli_etc(), FINGERPRINTS_PATH)
+    atomic_write_file(path, json.dumps(stored, indent=2, sort_keys=True))
+
+
+def clear_fingerprints(servicenames=None):
+    """forget the fingerprints of services, or of all services
+
+    A service deployed without being fingerprinted is cleared, so that
+    the next incremental deploy does not skip it. If the fingerprints
+    cannot be rewritten, the file is removed, which forgets them all.
+    """
+    path = os.path.join(get_kollacli_etc(), FINGERPRINTS_PATH)
+    if not os.path.exists(path):
+        return
+    stored = {}
+    if servicenames:
+        stored = load_fingerprints()
+        for servicename in servicenames:
+            stored.pop(servicename, None)
+    try:
+        atomic_write_file(path, json.dumps(stored, indent=2,
+                                           sort_keys=True))
+    except Exception:
+        os.remove(path)
+
+
+def get_changed_services(fingerprints):
+    """return sorted names of services whose fingerprint has changed"""
+    stored = load_fingerprints()
+    return sorted([servicename for servicename, fingerprint
+                   in fingerprints.items()
+                   if stored.get(servicename) != fingerprint])
+
+
+def _get_combined_fingerprint(servicename, own_fingerprints, combined):
+    """return the fingerprint of a service and its dependencies"""
+    if servicename not in combined:
+        combined[servicename] = _get_hash(
+            [own_fingerprints[servicename]] +
+            [_get_combined_fingerprint(dependency, own_fingerprints,
+                                       combined)
+             for dependency
+             in sorted(planner.SERVICE_DEPENDENCIES.get(servicename, []))])
+    return combined[servicename]
+
+
+def _get_hash(value):
+    return hashlib.sha1(
+        json.dumps(value, sort_keys=True, default=str)).hexdigest()
+
+
+def _get_dir_hash(path):
+    """return a hash of the names and contents of the files in path"""
+    if not os.path.isdir(path):
+        return None
+    file_hashes = []
+    for dir_path, dir_names, file_names in os.walk(path):
+        dir_names.sort()
+        for file_name in sorted(file_names):
+            file_path = os.path.join(dir_path, file_name)
+            file_hashes.append((os.path.relpath(file_path, path),
+                                _get_file_hash(file_path)))
+    return _get_hash(file_hashes)
+
+
+def _get_file_hash(path):
+    if not os.path.isfile(path):
+        return None
+    with open(path, 'rb') as hashed_file:
+        return hashlib.sha1(hashed_file.read()).hexdigest()
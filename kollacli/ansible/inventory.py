@@ -11,18 +11,36 @@
 #    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
 #    License for the specific language governing permissions and limitations
 #    under the License.
+import copy
+import fcntl
+import glob
+import hashlib
 import json
 import jsonpickle
 import logging
 import os
+import re
+import stat
 import tempfile
+import time
 import traceback
+import uuid
+
+from collections import OrderedDict
 
 from kollacli import exceptions
 from kollacli import utils
 
+from kollacli.ansible.settings import AnsibleSettings
+from kollacli.ansible.settings import FORKS
+from kollacli.ansible.settings import INVENTORY_FORMAT
+from kollacli.ansible.settings import INVENTORY_FORMAT_INI
+from kollacli.ansible.settings import INVENTORY_FORMAT_JSON
+from kollacli.ansible.settings import INVENTORY_FORMAT_SCRIPT
+from kollacli.ansible.settings import INVENTORY_FORMATS
 from kollacli.exceptions import CommandError
 from kollacli.sshutils import ssh_setup_host
+from kollacli.sshutils import ssh_setup_hosts
 from kollacli.utils import get_admin_user
 
 ANSIBLE_SSH_USER = 'ansible_ssh_user'
@@ -30,6 +48,59 @@ ANSIBLE_CONNECTION = 'ansible_connection'
 ANSIBLE_BECOME = 'ansible_become'
 
 INVENTORY_PATH = 'ansible/inventory.json'
+INVENTORY_JOURNAL_PATH = 'ansible/inventory.journal'
+ANSIBLE_JSON_CACHE_PATH = 'ansible/ansible_json_cache.json'
+
+# number of inventory filters whose ansible json is cached per revision
+ANSIBLE_JSON_CACHE_SIZE = 8
+
+# inventory files for ansible are named by the hash of their content
+GENERATED_INVENTORY_PREFIX = 'ansible/generated_inventory_'
+
+# oldest ansible with the yaml inventory plugin, which reads the json
+# inventory format
+JSON_INVENTORY_MIN_ANSIBLE_VERSION = (2, 4)
+
+# seconds after its last use that an inventory file for ansible is
+# removed. This must be longer than the longest deploy, as a deploy reads
+# its file until it ends.
+GENERATED_INVENTORY_MAX_AGE = 24 * 60 * 60
+
+# number of journal records after which the journal is folded back
+# into the inventory file
+JOURNAL_COMPACT_THRESHOLD = 100
+
+# key of the journal header, the first line of the journal, which holds
+# the revision of the json inventory file
+JOURNAL_SNAPSHOT_REVISION_KEY = 'snapshot_rev'
+
+# inventory methods that are recorded in, and replayed from, the journal
+JOURNAL_OPS = [
+    'add_group',
+    'add_group_to_service',
+    'add_host',
+    'create_service',
+    'create_sub_service',
+    'delete_service',
+    'delete_sub_service',
+    'remove_group',
+    'remove_group_from_service',
+    'remove_host',
+    'set_deploy_mode',
+    ]
+
+# present at the top level of inventory files written by jsonpickle
+JSONPICKLE_OBJECT_KEY = 'py/object'
+
+# most ansible forks used to check hosts
+HOST_CHECK_MAX_FORKS = 50
+
+# first line of a host result from an ansible ad-hoc command, e.g.
+#   host1 | SUCCESS => {          (ansible 2)
+#   host1 | UNREACHABLE! => {     (ansible 2)
+#   host1 | success >> {          (ansible 1)
+#   host1 | FAILED => SSH Error   (ansible 1)
+ANSIBLE_RESULT_RE = re.compile(r'^(\S+) \| (\w+)!? (?:=>|>>)\s*(.*)$')
 
 COMPUTE_GRP_NAME = 'compute'
 CONTROL_GRP_NAME = 'control'
@@ -117,29 +188,69 @@ class Host(object):
     def upgrade(self):
         pass
 
+    def to_dict(self):
+        return {'name': self.name,
+                'alias': self.alias,
+                'is_mgmt': self.is_mgmt,
+                'hypervisor': self.hypervisor,
+                'vars': self.vars,
+                'version': self.version}
+
+    @staticmethod
+    def from_dict(host_dict):
+        host = Host(host_dict['name'])
+        host.alias = host_dict.get('alias', '')
+        host.is_mgmt = host_dict.get('is_mgmt', False)
+        host.hypervisor = host_dict.get('hypervisor', '')
+        host.vars = host_dict.get('vars', {})
+        return host
+
 
 class HostGroup(object):
-    class_version = 1
+    class_version = 2
+
+    """class version history
 
+    1: initial release
+    2: hostnames are kept in an ordered dict rather than a list
+    """
     def __init__(self, name):
         self.name = name
-        self.hostnames = []
+        self._hostnames = OrderedDict()     # kv = hostname:None
         self.vars = {}
         self.version = self.__class__.class_version
 
     def upgrade(self):
-        pass
+        if self.version <= 1:
+            self._hostnames = OrderedDict.fromkeys(self.hostnames)
+            del self.hostnames
+        self.version = self.__class__.class_version
+
+    def to_dict(self):
+        return {'name': self.name,
+                'hostnames': list(self._hostnames),
+                'vars': self.vars,
+                'version': self.version}
+
+    @staticmethod
+    def from_dict(group_dict):
+        group = HostGroup(group_dict['name'])
+        group._hostnames = \
+            OrderedDict.fromkeys(group_dict.get('hostnames', []))
+        group.vars = group_dict.get('vars', {})
+        return group
 
     def add_host(self, host):
-        if host.name not in self.hostnames:
-            self.hostnames.append(host.name)
+        self._hostnames[host.name] = None
 
     def remove_host(self, host):
-        if host.name in self.hostnames:
-            self.hostnames.remove(host.name)
+        self._hostnames.pop(host.name, None)
+
+    def has_host(self, hostname):
+        return hostname in self._hostnames
 
     def get_hostnames(self):
-        return self.hostnames
+        return list(self._hostnames)
 
     def get_vars(self):
         return self.vars.copy()
@@ -164,64 +275,112 @@ class HostGroup(object):
 
 
 class Service(object):
-    class_version = 1
+    class_version = 2
 
+    """class version history
+
+    1: initial release
+    2: groupnames and sub_servicenames are kept in ordered dicts rather
+       than lists
+    """
     def __init__(self, name):
         self.name = name
-        self._sub_servicenames = []
-        self._groupnames = []
+        self._sub_servicenames = OrderedDict()  # kv = sub_servicename:None
+        self._groupnames = OrderedDict()        # kv = groupname:None
         self._vars = {}
         self.version = self.__class__.class_version
 
     def upgrade(self):
-        pass
+        if self.version <= 1:
+            self._sub_servicenames = \
+                OrderedDict.fromkeys(self._sub_servicenames)
+            self._groupnames = OrderedDict.fromkeys(self._groupnames)
+        self.version = self.__class__.class_version
+
+    def to_dict(self):
+        return {'name': self.name,
+                'sub_servicenames': list(self._sub_servicenames),
+                'groupnames': list(self._groupnames),
+                'vars': self._vars,
+                'version': self.version}
+
+    @staticmethod
+    def from_dict(service_dict):
+        service = Service(service_dict['name'])
+        service._sub_servicenames = \
+            OrderedDict.fromkeys(service_dict.get('sub_servicenames', []))
+        service._groupnames = \
+            OrderedDict.fromkeys(service_dict.get('groupnames', []))
+        service._vars = service_dict.get('vars', {})
+        return service
 
     def add_groupname(self, groupname):
-        if groupname is not None and groupname not in self._groupnames:
-            self._groupnames.append(groupname)
+        if groupname is not None:
+            self._groupnames[groupname] = None
 
     def remove_groupname(self, groupname):
-        if groupname in self._groupnames:
-            self._groupnames.remove(groupname)
+        self._groupnames.pop(groupname, None)
 
     def get_groupnames(self):
-        return self._groupnames
+        return list(self._groupnames)
 
     def get_sub_servicenames(self):
-        return self._sub_servicenames
+        return list(self._sub_servicenames)
 
     def add_sub_servicename(self, sub_servicename):
-        if sub_servicename not in self._sub_servicenames:
-            self._sub_servicenames.append(sub_servicename)
+        self._sub_servicenames[sub_servicename] = None
 
     def get_vars(self):
         return self._vars.copy()
 
 
 class SubService(object):
-    class_version = 1
+    class_version = 2
 
+    """class version history
+
+    1: initial release
+    2: groupnames are kept in an ordered dict rather than a list
+    """
     def __init__(self, name):
         self.name = name
 
         # groups and parent services are mutually exclusive
-        self._groupnames = []
+        self._groupnames = OrderedDict()        # kv = groupname:None
         self._parent_servicename = None
 
         self._vars = {}
         self.version = self.__class__.class_version
 
     def upgrade(self):
-        pass
+        if self.version <= 1:
+            self._groupnames = OrderedDict.fromkeys(self._groupnames)
+        self.version = self.__class__.class_version
+
+    def to_dict(self):
+        return {'name': self.name,
+                'groupnames': list(self._groupnames),
+                'parent_servicename': self._parent_servicename,
+                'vars': self._vars,
+                'version': self.version}
+
+    @staticmethod
+    def from_dict(sub_service_dict):
+        sub_service = SubService(sub_service_dict['name'])
+        sub_service._groupnames = \
+            OrderedDict.fromkeys(sub_service_dict.get('groupnames', []))
+        sub_service._parent_servicename = \
+            sub_service_dict.get('parent_servicename')
+        sub_service._vars = sub_service_dict.get('vars', {})
+        return sub_service
 
     def add_groupname(self, groupname):
         if groupname not in self._groupnames:
-            self._groupnames.append(groupname)
+            self._groupnames[groupname] = None
             self._parent_servicename = None
 
     def remove_groupname(self, groupname):
-        if groupname in self._groupnames:
-            self._groupnames.remove(groupname)
+        self._groupnames.pop(groupname, None)
         if not self._groupnames:
             # no groups left, re-associate to the parent
             for servicename in SERVICES:
@@ -230,11 +389,11 @@ class SubService(object):
                     break
 
     def get_groupnames(self):
-        return self._groupnames
+        return list(self._groupnames)
 
     def set_parent_servicename(self, parent_svc_name):
         self._parent_servicename = parent_svc_name
-        self._groupnames = []
+        self._groupnames = OrderedDict()
 
     def get_parent_service_name(self):
         return self._parent_servicename
@@ -244,52 +403,82 @@ class SubService(object):
 
 
 class Inventory(object):
-    class_version = 1
+    class_version = 2
 
     log = logging.getLogger(__name__)
 
     """class version history
 
     1: initial release
+    2: inventory file is written with an explicit json schema
+       rather than with jsonpickle
     """
     def __init__(self):
         self._groups = {}           # kv = name:object
         self._hosts = {}            # kv = name:object
         self._services = {}         # kv = name:object
         self._sub_services = {}     # kv = name:object
+        self._host_groups = {}      # kv = hostname:set(groupnames)
         self.vars = {}
         self.version = self.__class__.class_version
         self.remote_mode = True
 
-        # initialize the inventory to its defaults
+        # identifies this inventory across saves, see get_ansible_json()
+        self._id = uuid.uuid4().hex
+
+        # initialize the inventory to its defaults, the defaults are
+        # not journaled
+        self._init_journal()
+        self._journaling = False
         self._create_default_inventory()
+        self._init_journal()
 
     def upgrade(self):
         if self.version <= 1:
-            # upgrade from v1
-            pass
-
-        # update the version and save upgraded inventory file
+            # upgrade from v1, the in-memory objects are unchanged, only
+            # the file format is. load() rewrites the old jsonpickle file
+            # with the new schema.
+            self._init_journal()
+            self._id = uuid.uuid4().hex
+
+        for obj in (self._groups.values() + self._services.values() +
+                    self._sub_services.values()):
+            if obj.version != obj.class_version:
+                obj.upgrade()
+        self._index_host_groups()
+
+        # update the version, the upgraded inventory file is written by
+        # load(). Any journal records are still replayed on top of it.
         self.version = self.__class__.class_version
-        Inventory.save(self)
+        self._upgraded = True
 
     @staticmethod
     def load():
-        """load the inventory from a pickle file"""
-        inventory_path = os.path.join(utils.get_kollacli_etc(), INVENTORY_PATH)
-        data = ''
-        try:
-            if os.path.exists(inventory_path):
-                data = utils.sync_read_file(inventory_path)
+        """load the inventory
 
-            if data.strip():
-                inventory = jsonpickle.decode(data)
+        The inventory is the json inventory file plus the mutations
+        recorded in the journal since that file was last written. The
+        journal is share locked while both are read, so that a compaction
+        by another command cannot happen in between.
 
-                # upgrade version handling
-                if inventory.version != inventory.class_version:
-                    inventory.upgrade()
-            else:
-                inventory = Inventory()
+        An inventory file of an older version is upgraded and written
+        back with the journal exclusively locked.
+        """
+        try:
+            with Inventory._open_journal() as journal_file:
+                fcntl.flock(journal_file, fcntl.LOCK_SH)
+                inventory = Inventory._load_snapshot()
+                if inventory._upgraded:
+                    # the lock is released while it is converted, so the
+                    # file is read again in case another command has
+                    # upgraded it since
+                    fcntl.flock(journal_file, fcntl.LOCK_EX)
+                    inventory = Inventory._load_snapshot()
+                    if inventory._upgraded:
+                        Inventory._write_snapshot(inventory)
+                        inventory._upgraded = False
+                journal_data = journal_file.read()
+                inventory._replay_journal(journal_data)
         except Exception:
             raise CommandError('loading inventory failed: %s'
                                % traceback.format_exc())
@@ -297,18 +486,379 @@ class Inventory(object):
 
     @staticmethod
     def save(inventory):
-        """Save the inventory in a pickle file"""
-        inventory_path = os.path.join(utils.get_kollacli_etc(), INVENTORY_PATH)
+        """Save the inventory
+
+        Mutations made since the inventory was loaded are appended to the
+        journal, so the cost of a save does not depend on the size of the
+        inventory. Once the journal grows past JOURNAL_COMPACT_THRESHOLD
+        records, or if the json inventory file is still empty, the journal
+        is compacted: the whole inventory is written to the json inventory
+        file and the journal is emptied.
+
+        If there is nothing to journal (a new or upgraded inventory), the
+        whole inventory is written, with any mutations journaled by other
+        commands replayed into it first.
+        """
         try:
-            # multiple trips thru json to render a readable inventory file
-            data = jsonpickle.encode(inventory)
-            data_str = json.loads(data)
-            pretty_data = json.dumps(data_str, indent=4)
-            utils.sync_write_file(inventory_path, pretty_data)
+            if inventory._pending_ops:
+                Inventory._append_journal(inventory)
+            else:
+                with Inventory._open_journal() as journal_file:
+                    fcntl.flock(journal_file, fcntl.LOCK_EX)
+                    inventory._replay_journal(journal_file.read())
+                    Inventory._write_snapshot(inventory)
+                    Inventory._reset_journal(journal_file,
+                                             inventory._revision)
 
         except Exception as e:
             raise CommandError('saving inventory failed: %s' % e)
 
+    @staticmethod
+    def _load_snapshot():
+        inventory_path = os.path.join(utils.get_kollacli_etc(), INVENTORY_PATH)
+        data = ''
+        if os.path.exists(inventory_path):
+            data = utils.sync_read_file(inventory_path)
+
+        if data.strip():
+            inventory = Inventory.decode(data)
+
+            # upgrade version handling
+            if inventory.version != inventory.class_version:
+                inventory.upgrade()
+        else:
+            inventory = Inventory()
+        return inventory
+
+    @staticmethod
+    def _read_snapshot_revision():
+        """return the revision of the json inventory file
+
+        This parses the whole file, the journal header has the revision
+        once the journal has been compacted.
+        """
+        inventory_path = os.path.join(utils.get_kollacli_etc(), INVENTORY_PATH)
+        data = ''
+        if os.path.exists(inventory_path):
+            data = utils.sync_read_file(inventory_path)
+        if not data.strip():
+            return 0
+        # inventory files written by jsonpickle have no revision
+        return json.loads(data).get('revision', 0)
+
+    @staticmethod
+    def _snapshot_exists():
+        inventory_path = os.path.join(utils.get_kollacli_etc(), INVENTORY_PATH)
+        return (os.path.exists(inventory_path) and
+                os.path.getsize(inventory_path) > 0)
+
+    @staticmethod
+    def _write_snapshot(inventory):
+        """write the json inventory file
+
+        The journal must be exclusively locked. The file is replaced
+        rather than rewritten in place, keeping its permissions, so
+        readers never see it partly written.
+        """
+        inventory_path = os.path.join(utils.get_kollacli_etc(), INVENTORY_PATH)
+        data = Inventory.encode(inventory)
+        permissions = 0o664
+        if os.path.exists(inventory_path):
+            permissions = stat.S_IMODE(os.stat(inventory_path).st_mode)
+        utils.atomic_write_file(inventory_path, data, permissions)
+
+    @staticmethod
+    def _open_journal():
+        """open the journal for reading and appending, from its start"""
+        journal_path = os.path.join(utils.get_kollacli_etc(),
+                                    INVENTORY_JOURNAL_PATH)
+        journal_file = open(journal_path, 'a+')
+        journal_file.seek(0)
+        return journal_file
+
+    @staticmethod
+    def _reset_journal(journal_file, snapshot_revision):
+        """empty the journal, leaving only its header"""
+        journal_file.truncate(0)
+        journal_file.write(
+            Inventory._get_journal_header(snapshot_revision) + '\n')
+
+    @staticmethod
+    def _get_journal_header(snapshot_revision):
+        return json.dumps({JOURNAL_SNAPSHOT_REVISION_KEY: snapshot_revision},
+                          separators=(',', ':'))
+
+    @staticmethod
+    def _append_journal(inventory):
+        """append the pending mutations of inventory to the journal
+
+        The journal stays locked while it is read and appended to (or
+        compacted), so concurrent commands get distinct revisions. The new
+        records follow both the json inventory file and the journal, which
+        may have moved on since inventory was loaded. If they have, the
+        mutations of the other commands are not in inventory, so it is
+        rebuilt from disk.
+
+        The revision of the json inventory file is taken from the journal
+        header, so the file is not read unless the journal is compacted.
+        """
+        with Inventory._open_journal() as journal_file:
+            fcntl.flock(journal_file, fcntl.LOCK_EX)
+            journal_data = journal_file.read()
+            snapshot_revision, journal_records = \
+                Inventory._parse_journal(journal_data)
+            header = None
+            if snapshot_revision is None:
+                # a journal written before it had a header, or by a new
+                # install. An empty one is given a header now.
+                snapshot_revision = Inventory._read_snapshot_revision()
+                if not journal_data.strip():
+                    header = Inventory._get_journal_header(snapshot_revision)
+
+            loaded_revision = \
+                inventory._revision - len(inventory._pending_ops)
+            disk_revision = snapshot_revision
+            if journal_records:
+                disk_revision = max(disk_revision,
+                                    journal_records[-1]['rev'])
+            base_revision = max(loaded_revision, disk_revision)
+            records = []
+            for i, (op, args) in enumerate(inventory._pending_ops):
+                records.append({'rev': base_revision + i + 1,
+                                'op': op,
+                                'args': args})
+
+            current = None
+            if (len(journal_records) + len(records) <
+                    JOURNAL_COMPACT_THRESHOLD and
+                    Inventory._snapshot_exists()):
+                lines = [json.dumps(record, separators=(',', ':'))
+                         for record in records]
+                if header:
+                    journal_file.truncate(0)
+                    lines.insert(0, header)
+                journal_file.write('\n'.join(lines) + '\n')
+            else:
+                # fold the journal into the inventory file. It is
+                # rebuilt from disk so that mutations journaled by other
+                # commands since this inventory was loaded are kept.
+                current = Inventory._load_snapshot()
+                current._replay_records(journal_records + records)
+                Inventory._write_snapshot(current)
+                Inventory._reset_journal(journal_file, current._revision)
+
+            if disk_revision > loaded_revision:
+                if not current:
+                    current = Inventory._load_snapshot()
+                    current._replay_records(journal_records + records)
+                inventory._restore(current)
+            inventory._revision = base_revision + len(records)
+            inventory._pending_ops = []
+
+    @staticmethod
+    def _parse_journal(journal_data):
+        """return (snapshot revision, records) of the journal
+
+        The snapshot revision is None if the journal has no header.
+        """
+        snapshot_revision = None
+        records = []
+        for line in journal_data.split('\n'):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            if JOURNAL_SNAPSHOT_REVISION_KEY in record:
+                snapshot_revision = record[JOURNAL_SNAPSHOT_REVISION_KEY]
+            else:
+                records.append(record)
+        return snapshot_revision, records
+
+    def _replay_journal(self, journal_data):
+        self._replay_records(Inventory._parse_journal(journal_data)[1])
+
+    def _replay_records(self, records):
+        """apply journal records newer than the inventory revision"""
+        self._journaling = False
+        try:
+            for record in records:
+                if record['rev'] <= self._revision:
+                    # already part of the inventory file
+                    continue
+                if record['op'] not in JOURNAL_OPS:
+                    self.log.warn('skipping unknown inventory journal '
+                                  'operation (%s)' % record['op'])
+                    continue
+                try:
+                    getattr(self, record['op'])(*record['args'])
+                except CommandError as e:
+                    self.log.warn('skipping inventory journal operation '
+                                  '(%s %s): %s'
+                                  % (record['op'], record['args'], e))
+                self._revision = record['rev']
+        finally:
+            self._journaling = True
+
+    def _init_journal(self, revision=0):
+        self._revision = revision
+        self._upgraded = False      # not yet written with class_version
+        self._pending_ops = []      # [(op, [args])] not yet saved
+        self._journaling = True
+        self._ansible_json = {}     # kv = filter key:ansible json
+
+    def _journal(self, op, *args):
+        """record a mutation, to be appended to the journal on save"""
+        self._revision += 1
+        self._ansible_json = {}
+        if self._journaling:
+            self._pending_ops.append((op, list(args)))
+
+    @staticmethod
+    def encode(inventory):
+        """encode the inventory to a json string
+
+        The inventory is written in a single pass from plain dicts and
+        lists, see to_dict() for the schema.
+        """
+        return json.dumps(inventory.to_dict(), separators=(',', ':'))
+
+    @staticmethod
+    def decode(data):
+        """decode an inventory from a json string
+
+        Files written before version 2 were encoded with jsonpickle. Those
+        are still decoded with jsonpickle so that they can be upgraded.
+        """
+        inv_dict = json.loads(data)
+        if JSONPICKLE_OBJECT_KEY in inv_dict:
+            return jsonpickle.decode(data)
+        return Inventory.from_dict(inv_dict)
+
+    def to_dict(self):
+        """return the inventory as json-ready dicts and lists
+
+        schema:
+        {
+        'version': 2,
+        'id': '<uuid>',
+        'revision': 0,
+        'remote_mode': True,
+        'vars': {},
+        'groups': [ {'name':, 'hostnames': [], 'vars': {}, 'version':} ],
+        'hosts': [ {'name':, 'alias':, 'is_mgmt':, 'hypervisor':,
+                    'vars': {}, 'version':} ],
+        'services': [ {'name':, 'sub_servicenames': [], 'groupnames': [],
+                       'vars': {}, 'version':} ],
+        'sub_services': [ {'name':, 'groupnames': [],
+                           'parent_servicename':, 'vars': {},
+                           'version':} ],
+        }
+        """
+        return {'version': self.version,
+                'id': self._id,
+                'revision': self._revision,
+                'remote_mode': self.remote_mode,
+                'vars': self.vars,
+                'groups': [group.to_dict()
+                           for group in self._groups.values()],
+                'hosts': [host.to_dict()
+                          for host in self._hosts.values()],
+                'services': [service.to_dict()
+                             for service in self._services.values()],
+                'sub_services': [sub_service.to_dict()
+                                 for sub_service
+                                 in self._sub_services.values()],
+                }
+
+    @staticmethod
+    def from_dict(inv_dict):
+        # the defaults are not created here, everything comes from the dict
+        inventory = Inventory.__new__(Inventory)
+        inventory._groups = {}
+        inventory._hosts = {}
+        inventory._services = {}
+        inventory._sub_services = {}
+        inventory.vars = inv_dict.get('vars', {})
+        inventory.version = inv_dict.get('version', 1)
+        inventory.remote_mode = inv_dict.get('remote_mode', True)
+        inventory._id = inv_dict.get('id') or uuid.uuid4().hex
+        inventory._init_journal(inv_dict.get('revision', 0))
+
+        for group_dict in inv_dict.get('groups', []):
+            group = HostGroup.from_dict(group_dict)
+            inventory._groups[group.name] = group
+        for host_dict in inv_dict.get('hosts', []):
+            host = Host.from_dict(host_dict)
+            inventory._hosts[host.name] = host
+        for service_dict in inv_dict.get('services', []):
+            service = Service.from_dict(service_dict)
+            inventory._services[service.name] = service
+        for sub_service_dict in inv_dict.get('sub_services', []):
+            sub_service = SubService.from_dict(sub_service_dict)
+            inventory._sub_services[sub_service.name] = sub_service
+        inventory._index_host_groups()
+        return inventory
+
+    def _index_host_groups(self):
+        """rebuild the host to groups index from the groups
+
+        The index is derived data, so it is not part of the inventory
+        file. It is rebuilt whenever an inventory is decoded.
+        """
+        self._host_groups = {}
+        for hostname in self._hosts:
+            self._host_groups[hostname] = set()
+        for group in self._groups.values():
+            for hostname in group.get_hostnames():
+                self._host_groups.setdefault(hostname, set()).add(group.name)
+
+    def apply_operations(self, operations):
+        """apply a list of inventory operations
+
+        operations is a list of (op, [args]) tuples, where op is the name
+        of one of the inventory methods in JOURNAL_OPS, for example:
+        [('add_host', ['host1']),
+         ('add_host', ['host1', 'control']),
+         ('add_group_to_service', ['control', 'nova'])]
+
+        All operations are validated by applying them in memory. If any
+        of them fail, the inventory is restored to its prior state and a
+        CommandError listing every failure is raised. The caller saves the
+        inventory once when all operations succeed.
+        """
+        # to_dict() shares the vars dicts of the live objects
+        prior_state = copy.deepcopy(self.to_dict())
+        prior_pending_ops = list(self._pending_ops)
+        failed_ops = []
+        for i, (op, args) in enumerate(operations):
+            try:
+                if op not in JOURNAL_OPS:
+                    raise CommandError('Invalid operation (%s)' % op)
+                getattr(self, op)(*args)
+            except Exception as e:
+                failed_ops.append((i + 1, op, args, e))
+
+        if failed_ops:
+            self._restore(Inventory.from_dict(prior_state))
+            self._pending_ops = prior_pending_ops
+            summary = '\n'
+            for (num, op, args, err) in failed_ops:
+                summary = summary + '- %s: %s %s: %s\n' % (
+                    num, op, ' '.join(['%s' % arg for arg in args]), err)
+            raise CommandError('Not all operations were valid, no changes '
+                               'were made: %s' % summary)
+
+    def _restore(self, inventory):
+        self._groups = inventory._groups
+        self._hosts = inventory._hosts
+        self._services = inventory._services
+        self._sub_services = inventory._sub_services
+        self._host_groups = inventory._host_groups
+        self.vars = inventory.vars
+        self.remote_mode = inventory.remote_mode
+        self._id = inventory._id
+        self._revision = inventory._revision
+        self._ansible_json = {}
+
     def _create_default_inventory(self):
 
         # create the default groups
@@ -362,15 +912,19 @@ class Inventory(object):
 
         # create new host if it doesn't exist
         host = Host(hostname)
-        if hostname not in self.get_hostnames():
+        if hostname not in self._hosts:
             # a new host is being added to the inventory
             self._hosts[hostname] = host
+            self._host_groups[hostname] = set()
 
         # a host is to be added to an existing group
         elif groupname:
             group = self._groups[groupname]
-            if hostname not in group.get_hostnames():
+            if not group.has_host(hostname):
                 group.add_host(host)
+                self._host_groups[hostname].add(groupname)
+
+        self._journal('add_host', hostname, groupname)
 
     def remove_host(self, hostname, groupname=None):
         """remove host
@@ -390,11 +944,15 @@ class Inventory(object):
         for group in groups:
             if not groupname or groupname == group.name:
                 group.remove_host(host)
+                self._host_groups[hostname].discard(group.name)
 
         if not groupname:
             del self._hosts[hostname]
+            del self._host_groups[hostname]
+
+        self._journal('remove_host', hostname, groupname)
 
-    def setup_hosts(self, hosts_info):
+    def setup_hosts(self, hosts_info, parallel=1, timeout=None, retries=0):
         """setup multiple hosts
 
         hosts_info is a dict of format:
@@ -404,24 +962,32 @@ class Inventory(object):
             }
         }
         The uname entry is optional.
+
+        Up to parallel hosts are set up at the same time. A host that
+        takes more than timeout seconds fails, and a failed host is tried
+        again up to retries times, unless it timed out.
         """
         failed_hosts = {}
+        setup_info = {}
         for hostname, host_info in hosts_info.items():
-            host = self.get_host(hostname)
-            if not host:
+            if not self.get_host(hostname):
                 failed_hosts[hostname] = "Host doesn't exist"
                 continue
-            if not host_info or 'password' not in host_info:
-                failed_hosts[hostname] = 'No password in yml file'
-                continue
-            passwd = host_info['password']
-            uname = None
-            if 'uname' in host_info:
-                uname = host_info['uname']
-            try:
-                self.setup_host(hostname, passwd, uname)
-            except Exception as e:
-                failed_hosts[hostname] = '%s' % e
+            setup_info[hostname] = host_info
+
+        if setup_info:
+            self.log.info('Starting setup of %s hosts' % len(setup_info))
+            failed_hosts.update(ssh_setup_hosts(setup_info, parallel,
+                                                timeout, retries))
+
+            # the post setup check of all the set up hosts is one
+            # ansible run
+            results = self.check_hosts([hostname for hostname in setup_info
+                                        if hostname not in failed_hosts])
+            for hostname, result in results['unreachable'].items():
+                failed_hosts[hostname] = ('Post setup check failed : %s'
+                                          % result['error'])
+
         if failed_hosts:
             summary = '\n'
             for hostname, err in failed_hosts.items():
@@ -430,11 +996,11 @@ class Inventory(object):
         else:
             self.log.info('All hosts were successfully set up')
 
-    def setup_host(self, hostname, password, uname=None):
+    def setup_host(self, hostname, password, uname=None, timeout=None):
         try:
             self.log.info('Starting setup of host (%s)'
                           % hostname)
-            ssh_setup_host(hostname, password, uname)
+            ssh_setup_host(hostname, password, uname, timeout=timeout)
             check_ok = self.check_host(hostname, True)
             if not check_ok:
                 raise Exception('Post setup check failed')
@@ -446,32 +1012,68 @@ class Inventory(object):
         return True
 
     def check_host(self, hostname, result_only=False):
-        command_string = '/usr/bin/sudo -u %s ansible ' % get_admin_user()
-        gen_file_path = self.create_json_gen_file()
-        err_msg = None
-        output = None
-        try:
-            inventory_string = '-i ' + gen_file_path
-            ping_string = ' %s %s' % (hostname, '-m ping')
-            cmd = (command_string + inventory_string + ping_string)
-            err_msg, output = utils.run_cmd(cmd, False)
-        except Exception as e:
-            raise e
-        finally:
-            if gen_file_path:
-                os.remove(gen_file_path)
-        if err_msg:
+        results = self.check_hosts([hostname])
+        if hostname in results['unreachable']:
             if result_only:
                 return False
             else:
                 raise exceptions.CommandError(
-                    'Host (%s) check failed : %s %s'
-                    % (hostname, err_msg, output))
+                    'Host (%s) check failed : %s'
+                    % (hostname, results['unreachable'][hostname]['error']))
         else:
             if not result_only:
                 self.log.info('Host (%s) check succeeded' % hostname)
         return True
 
+    def check_hosts(self, hostnames, forks=None):
+        """check the hosts with a single ansible ping command
+
+        return a dict of format:
+        {'reachable': {
+            'hostname1': {'time': seconds}
+            },
+         'unreachable': {
+            'hostname2': {'time': seconds, 'error': error_message}
+            }
+        }
+        The time of a host is when its result was reported, in seconds
+        from the start of the ansible command.
+        """
+        results = {'reachable': {}, 'unreachable': {}}
+        if not hostnames:
+            return results
+        ansible_settings = AnsibleSettings()
+        if not forks:
+            forks = ansible_settings.get_setting(FORKS)
+        if not forks:
+            forks = min(len(hostnames), HOST_CHECK_MAX_FORKS)
+
+        gen_file_path = self.create_inventory_file()
+        # hosts are separated by commas, as IPv6 addresses contain colons
+        cmd = ('/usr/bin/sudo -u %s ansible -i %s %s -m ping %s'
+               % (get_admin_user(), gen_file_path, ','.join(hostnames),
+                  ansible_settings.get_args({FORKS: forks})))
+        parser = _PingResultParser(time.time())
+        err_msg, output = utils.run_cmd(cmd, False,
+                                        line_callback=parser.add_line,
+                                        env=ansible_settings.get_env())
+        ping_results = parser.get_results()
+
+        for hostname in hostnames:
+            if hostname not in ping_results:
+                results['unreachable'][hostname] = {
+                    'time': None,
+                    'error': '%s %s' % (err_msg or 'No result from ansible',
+                                        output)}
+                continue
+            ok, elapsed, error = ping_results[hostname]
+            if ok:
+                results['reachable'][hostname] = {'time': elapsed}
+            else:
+                results['unreachable'][hostname] = {'time': elapsed,
+                                                    'error': error}
+        return results
+
     def add_group(self, groupname):
 
         # Group names cannot overlap with service names:
@@ -486,6 +1088,7 @@ class Inventory(object):
 
         group.set_remote(self.remote_mode)
 
+        self._journal('add_group', groupname)
         return group
 
     def remove_group(self, groupname):
@@ -501,8 +1104,12 @@ class Inventory(object):
             subservice.remove_groupname(groupname)
 
         if groupname in self._groups:
+            for hostname in self._groups[groupname].get_hostnames():
+                self._host_groups[hostname].discard(groupname)
             del self._groups[groupname]
 
+        self._journal('remove_group', groupname)
+
     def get_group(self, groupname):
         group = None
         if groupname in self._groups:
@@ -522,20 +1129,16 @@ class Inventory(object):
             groups = self._groups.values()
 
         else:
-            for group in self._groups.values():
-                if host.name in group.get_hostnames():
-                    groups.append(group)
+            for groupname in self._host_groups.get(host.name, []):
+                groups.append(self._groups[groupname])
         return groups
 
     def get_host_groups(self):
         """return { hostname : groupnames }"""
 
         host_groups = {}
-        for host in self._hosts.values():
-            host_groups[host.name] = []
-            groups = self.get_groups(host)
-            for group in groups:
-                host_groups[host.name].append(group.name)
+        for hostname, groupnames in self._host_groups.items():
+            host_groups[hostname] = sorted(groupnames)
         return host_groups
 
     def get_group_services(self):
@@ -570,11 +1173,13 @@ class Inventory(object):
         if servicename not in self._services:
             service = Service(servicename)
             self._services[servicename] = service
+            self._journal('create_service', servicename)
         return self._services[servicename]
 
     def delete_service(self, servicename):
         if servicename in self._services:
             del self._services[servicename]
+            self._journal('delete_service', servicename)
 
     def get_services(self):
         return self._services.values()
@@ -596,6 +1201,7 @@ class Inventory(object):
                 sub_service.add_groupname(groupname)
         else:
             raise CommandError('Service (%s) not found.' % servicename)
+        self._journal('add_group_to_service', groupname, servicename)
 
     def remove_group_from_service(self, groupname, servicename):
         if groupname not in self._groups:
@@ -608,16 +1214,19 @@ class Inventory(object):
                 sub_service.remove_groupname(groupname)
         else:
             raise CommandError('Service (%s) not found.' % servicename)
+        self._journal('remove_group_from_service', groupname, servicename)
 
     def create_sub_service(self, sub_servicename):
         if sub_servicename not in self._sub_services:
             sub_service = SubService(sub_servicename)
             self._sub_services[sub_servicename] = sub_service
+            self._journal('create_sub_service', sub_servicename)
         return self._sub_services[sub_servicename]
 
     def delete_sub_service(self, sub_servicename):
         if sub_servicename in self._sub_services:
             del self._sub_services[sub_servicename]
+            self._journal('delete_sub_service', sub_servicename)
 
     def get_sub_services(self):
         return self._sub_services.values()
@@ -664,7 +1273,70 @@ class Inventory(object):
         for group in self.get_groups():
             group.set_remote(remote_flag)
 
+        self._journal('set_deploy_mode', remote_flag)
+
     def get_ansible_json(self, inventory_filter=None):
+        """get json inventory for ansible
+
+        The json is cached, both in memory and in a cache file, keyed by
+        the inventory id and revision and by the filter. Any mutation of
+        the inventory changes its revision, which invalidates the cached
+        json. Inventories with unsaved mutations are only cached in
+        memory, as their revision is not final until they are saved.
+        """
+        filter_key = hashlib.sha1(
+            json.dumps(inventory_filter or {}, sort_keys=True)).hexdigest()
+        if filter_key in self._ansible_json:
+            return self._ansible_json[filter_key]
+
+        cache_key = None
+        if not self._pending_ops:
+            cache_key = '%s:%s:%s' % (self._id, self._revision, filter_key)
+            json_out = self._read_ansible_json_cache(cache_key)
+            if json_out is not None:
+                self._ansible_json[filter_key] = json_out
+                return json_out
+
+        json_out = self._build_ansible_json(inventory_filter)
+        self._ansible_json[filter_key] = json_out
+        if cache_key:
+            self._write_ansible_json_cache(cache_key, json_out)
+        return json_out
+
+    def _read_ansible_json_cache(self, cache_key):
+        cache_path = os.path.join(utils.get_kollacli_etc(),
+                                  ANSIBLE_JSON_CACHE_PATH)
+        try:
+            if os.path.exists(cache_path):
+                cache = json.loads(utils.sync_read_file(cache_path))
+                return cache.get(cache_key)
+        except Exception as e:
+            self.log.debug('ansible json cache not read: %s' % e)
+        return None
+
+    def _write_ansible_json_cache(self, cache_key, json_out):
+        """add json to the cache file
+
+        Entries for other inventory revisions are dropped, as they are
+        stale once the inventory has moved on.
+        """
+        cache_path = os.path.join(utils.get_kollacli_etc(),
+                                  ANSIBLE_JSON_CACHE_PATH)
+        revision_prefix = cache_key.rsplit(':', 1)[0] + ':'
+        try:
+            cache = {}
+            if os.path.exists(cache_path):
+                cache = json.loads(utils.sync_read_file(cache_path))
+            cache = dict([(key, value) for key, value in cache.items()
+                          if key.startswith(revision_prefix)])
+            if len(cache) >= ANSIBLE_JSON_CACHE_SIZE:
+                cache = {}
+            cache[cache_key] = json_out
+            utils.atomic_write_file(cache_path, json.dumps(cache))
+        except Exception as e:
+            self.log.debug('ansible json cache not written: %s' % e)
+
+    def _build_ansible_json(self, inventory_filter=None):
         """generate json inventory for ansible
 
         The hosts and groups added to the json output for ansible will be
@@ -710,6 +1382,7 @@ class Inventory(object):
                 deploy_groupnames = inventory_filter['deploy_groups']
 
         # add hostgroups
+        deploy_groupnames = set(deploy_groupnames)
         for group in self.get_groups():
             jdict[group.name] = {}
             jdict[group.name]['hosts'] = []
@@ -737,13 +1410,14 @@ class Inventory(object):
                 jdict[sub_svc.name]['children'] = \
                     [sub_svc.get_parent_service_name()]
 
-        # temporarily create group containing all hosts. this is needed for
-        # ansible commands that are performed on hosts not yet in groups.
-        group = self.add_group('__RESERVED__')
+        # add a group containing all hosts. this is needed for ansible
+        # commands that are performed on hosts not yet in groups. The group
+        # is not part of the inventory.
+        group = HostGroup('__RESERVED__')
+        group.set_remote(self.remote_mode)
         jdict[group.name] = {}
         jdict[group.name]['hosts'] = deploy_hostnames
         jdict[group.name]['vars'] = group.get_vars()
-        self.remove_group(group.name)
 
         # process hosts vars
         jdict['_meta'] = {}
@@ -757,11 +1431,176 @@ class Inventory(object):
     def _filter_hosts(self, initial_hostnames, deploy_hostnames):
         """filter out hosts not in deploy hosts"""
         filtered_hostnames = []
+        initial_hostnames = set(initial_hostnames)
         for hostname in deploy_hostnames:
             if hostname in initial_hostnames:
                 filtered_hostnames.append(hostname)
         return filtered_hostnames
 
+    def create_inventory_file(self, inventory_filter=None,
+                              inventory_format=None):
+        """create ansible inventory file using filter ({})
+
+        inventory_format is one of INVENTORY_FORMATS. If it is not given
+        the format is the inventory_format setting, set with
+        'kollacli setting set inventory_format <format>', or if that is
+        not set, the KOLLA_CLI_INVENTORY_FORMAT environment variable:
+        - script: an executable that prints the json inventory
+        - ini:    a static ini inventory file, host vars are set inline
+        - json:   a static inventory file in the layout of the ansible yaml
+                  inventory plugin (ansible 2.4 or later)
+
+        The static formats are read by ansible directly, without starting
+        a python interpreter to produce the inventory.
+
+        The file is kept in the kollacli etc directory and is named by the
+        hash of its content. As long as the inventory and the filter are
+        unchanged the same file is returned without being rewritten, its
+        modification time is updated to mark it in use. Files unused for
+        GENERATED_INVENTORY_MAX_AGE are removed. Callers must not remove
+        it.
+
+        return path to inventory file
+        """
+        if not inventory_format:
+            inventory_format = (
+                AnsibleSettings().get_setting(INVENTORY_FORMAT) or
+                utils.get_inventory_format())
+        if inventory_format not in INVENTORY_FORMATS:
+            raise CommandError('Invalid inventory format (%s). Format must '
+                               'be one of: %s'
+                               % (inventory_format,
+                                  ', '.join(INVENTORY_FORMATS)))
+        if inventory_format == INVENTORY_FORMAT_JSON:
+            ansible_version = utils.get_ansible_version()
+            if (ansible_version and ansible_version <
+                    JSON_INVENTORY_MIN_ANSIBLE_VERSION):
+                raise CommandError(
+                    'Inventory format (%s) requires ansible %s or later, '
+                    'ansible %s is installed'
+                    % (inventory_format,
+                       '.'.join(str(part) for part
+                                in JSON_INVENTORY_MIN_ANSIBLE_VERSION),
+                       '.'.join(str(part) for part in ansible_version)))
+
+        json_out = self.get_ansible_json(inventory_filter)
+        if inventory_format == INVENTORY_FORMAT_SCRIPT:
+            data = _get_json_gen_script(json_out)
+            suffix = '.py'
+            # set executable by group
+            permissions = 0o555
+        else:
+            jdict = json.loads(json_out)
+            if inventory_format == INVENTORY_FORMAT_INI:
+                data = self._get_ansible_ini(jdict)
+                suffix = '.ini'
+            else:
+                data = json.dumps(self._get_ansible_yaml_dict(jdict))
+                suffix = '.json'
+            # readable by group, ansible treats executable files as scripts
+            permissions = 0o444
+        if isinstance(data, unicode):
+            # the file is hashed and written as utf-8
+            data = data.encode('utf-8')
+
+        inventory_path = os.path.join(
+            utils.get_kollacli_etc(),
+            GENERATED_INVENTORY_PREFIX + hashlib.sha1(data).hexdigest() +
+            suffix)
+        if os.path.exists(inventory_path):
+            try:
+                os.utime(inventory_path, None)
+                return inventory_path
+            except OSError:
+                # a file of another user may not be touched, it is
+                # written again instead
+                pass
+
+        # another command may be reading an older file, so this one is
+        # created by an atomic rename rather than by rewriting that file
+        utils.atomic_write_file(inventory_path, data, permissions)
+        self._prune_inventory_files()
+        return inventory_path
+
+    def _prune_inventory_files(self):
+        """remove files unused for GENERATED_INVENTORY_MAX_AGE"""
+        paths = glob.glob(os.path.join(utils.get_kollacli_etc(),
+                                       GENERATED_INVENTORY_PREFIX + '*'))
+        min_time = time.time() - GENERATED_INVENTORY_MAX_AGE
+        for path in paths:
+            try:
+                if os.path.getmtime(path) >= min_time:
+                    continue
+                os.remove(path)
+            except OSError as e:
+                self.log.debug('inventory file %s not removed: %s'
+                               % (path, e))
+
+    def _get_ansible_ini(self, jdict):
+        """convert ansible json inventory to an ini inventory
+
+        Every group is written, even if empty, as ansible requires child
+        groups to be defined. Host vars are set inline on the host lines
+        of the __RESERVED__ group, which holds all hosts.
+        """
+        hostvars = jdict['_meta']['hostvars']
+        hosts_lines = []
+        children_lines = []
+        vars_lines = []
+        for name, group in sorted(jdict.items()):
+            if name == '_meta':
+                continue
+            hosts_lines.append('[%s]' % name)
+            for hostname in group.get('hosts', []):
+                host_line = hostname
+                if name == '__RESERVED__':
+                    for key, value in sorted(hostvars.get(hostname,
+                                                          {}).items()):
+                        host_line += ' %s=%s' % (key, _ini_value(value))
+                hosts_lines.append(host_line)
+            hosts_lines.append('')
+
+            if group.get('children'):
+                children_lines.append('[%s:children]' % name)
+                children_lines.extend(group['children'])
+                children_lines.append('')
+
+            if group.get('vars'):
+                vars_lines.append('[%s:vars]' % name)
+                for key, value in sorted(group['vars'].items()):
+                    vars_lines.append('%s=%s' % (key, _ini_value(value)))
+                vars_lines.append('')
+        return '\n'.join(hosts_lines + children_lines + vars_lines)
+
+    def _get_ansible_yaml_dict(self, jdict):
+        """convert ansible json inventory to the yaml plugin layout
+
+        {
+        'group': {
+            'hosts': { 'host1': { host vars } },
+            'vars': { group vars },
+            'children': { 'child_group': {} }
+            }
+        }
+        """
+        hostvars = jdict['_meta']['hostvars']
+        groups = {}
+        for name, group in jdict.items():
+            if name == '_meta':
+                continue
+            yaml_group = {}
+            if group.get('hosts'):
+                yaml_group['hosts'] = \
+                    dict([(hostname, hostvars.get(hostname, {}))
+                          for hostname in group['hosts']])
+            if group.get('vars'):
+                yaml_group['vars'] = group['vars']
+            if group.get('children'):
+                yaml_group['children'] = \
+                    dict([(child, {}) for child in group['children']])
+            groups[name] = yaml_group
+        return groups
+
     def create_json_gen_file(self, inventory_filter=None):
         """create json inventory file using filter ({})
 
@@ -774,11 +1613,70 @@ class Inventory(object):
         os.close(fd)  # avoid fd leak
 
         with open(json_gen_path, 'w') as json_gen_file:
-            json_gen_file.write('#!/usr/bin/env python\n')
-            # the quotes here are significant. The json_out has double quotes
-            # embedded in it so single quotes are needed to wrap it.
-            json_gen_file.write("print('%s')" % json_out)
+            json_gen_file.write(_get_json_gen_script(json_out))
 
         # set executable by group
         os.chmod(json_gen_path, 0o555)
         return json_gen_path
+
+
+class _PingResultParser(object):
+    """collect per-host results from the output of ansible -m ping"""
+
+    def __init__(self, start_time):
+        self._start_time = start_time
+        self._results = {}
+        self._hostname = None
+        self._lines = []
+
+    def add_line(self, line):
+        match = ANSIBLE_RESULT_RE.match(line)
+        if match:
+            self._finish_host()
+            hostname, status, rest = match.groups()
+            self._hostname = hostname
+            self._ok = status.lower() == 'success'
+            self._elapsed = time.time() - self._start_time
+            self._lines = [rest]
+        elif self._hostname:
+            self._lines.append(line)
+
+    def get_results(self):
+        """return dict of hostname to (ok, seconds, error message)"""
+        self._finish_host()
+        return self._results
+
+    def _finish_host(self):
+        if not self._hostname:
+            return
+        detail = '\n'.join(self._lines).strip()
+        error = None
+        if not self._ok:
+            error = detail
+            # ansible 2 reports the result as json, with the error in msg
+            json_end = detail.rfind('}')
+            if detail.startswith('{') and json_end > 0:
+                try:
+                    error = json.loads(detail[:json_end + 1]).get('msg',
+                                                                  detail)
+                except ValueError:
+                    pass
+        self._results[self._hostname] = (self._ok, self._elapsed, error)
+        self._hostname = None
+        self._lines = []
+
+
+def _get_json_gen_script(json_out):
+    """return a python script that prints json_out"""
+    # the quotes here are significant. The json_out has double quotes
+    # embedded in it so single quotes are needed to wrap it.
+    return "#!/usr/bin/env python\nprint('%s')" % json_out
+
+
+def _ini_value(value):
+    """format a var value for an ini inventory"""
+    if isinstance(value, basestring):
+        if not value or any(char.isspace() for char in value):
+            return json.dumps(value)
+        return value
+    return '%s' % value
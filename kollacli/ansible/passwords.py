@@ -56,6 +56,26 @@ def get_password_names():
     return pwd_names
 
 
+def get_password_fingerprints(servicenames):
+    """return a dict of service name to a fingerprint of its passwords
+
+    The passwords of a service are those whose names are prefixed with
+    the service name, or with none of servicenames. A fingerprint is keyed by a secret of
+    the passwords file owner, so it tells nothing about the values.
+    """
+    cmd = '%s -s %s' % (_get_cmd_prefix(), ','.join(servicenames))
+    err_msg, output = utils.run_cmd(cmd, print_output=False)
+    if err_msg:
+        raise CommandError('%s %s' % (err_msg, output))
+
+    pwd_fingerprints = {}
+    for line in output.split('\n'):
+        if ':' in line:
+            servicename, fingerprint = line.split(':', 1)
+            pwd_fingerprints[servicename] = fingerprint.strip()
+    return pwd_fingerprints
+
+
 def _get_cmd_prefix():
     editor_path = os.path.join(utils.get_kollacli_home(),
                                'tools',
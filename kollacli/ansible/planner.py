@@ -0,0 +1,179 @@
+# Copyright(c) 2015, Oracle and/or its affiliates.  All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+from kollacli.ansible.inventory import COMPUTE_GRP_NAME
+from kollacli.ansible.staged import StagedDeploy
+from kollacli.exceptions import CommandError
+
+# services that must be deployed before each service
+SERVICE_DEPENDENCIES = {
+    'cinder':       ['keystone', 'mysqlcluster', 'rabbitmq'],
+    'glance':       ['keystone', 'mysqlcluster'],
+    'haproxy':      [],
+    'heat':         ['keystone', 'mysqlcluster', 'rabbitmq'],
+    'horizon':      ['keystone', 'memcached'],
+    'keystone':     ['haproxy', 'memcached', 'mysqlcluster'],
+    'memcached':    [],
+    'murano':       ['keystone', 'mysqlcluster', 'rabbitmq'],
+    'mysqlcluster': [],
+    'neutron':      ['keystone', 'mysqlcluster', 'rabbitmq'],
+    'nova':         ['glance', 'keystone', 'mysqlcluster', 'rabbitmq'],
+    'rabbitmq':     [],
+    'swift':        ['keystone'],
+    }
+
+# groups that the plays of a service run on, other than the groups of
+# the service and its sub-services
+SERVICE_PLAY_GROUPS = {
+    'neutron':      [COMPUTE_GRP_NAME],
+    'nova':         [COMPUTE_GRP_NAME],
+    }
+
+
+def get_waves(servicenames, dependencies=None):
+    """order services into waves
+
+    Each wave holds the services whose dependencies are all in earlier
+    waves. Dependencies on services that are not in servicenames are
+    taken to be deployed already.
+
+    return list of waves, a wave is a sorted list of service names
+    """
+    if dependencies is None:
+        dependencies = SERVICE_DEPENDENCIES
+    remaining = {}
+    for servicename in servicenames:
+        remaining[servicename] = set(
+            [dependency for dependency in dependencies.get(servicename, [])
+             if dependency in servicenames])
+
+    waves = []
+    while remaining:
+        wave = sorted([servicename for servicename, service_deps
+                       in remaining.items() if not service_deps])
+        if not wave:
+            raise CommandError('Service dependencies form a cycle: %s'
+                               % ', '.join(sorted(remaining)))
+        waves.append(wave)
+        for servicename in wave:
+            del remaining[servicename]
+        for service_deps in remaining.values():
+            service_deps.difference_update(wave)
+    return waves
+
+
+def get_service_hostnames(inventory, servicename):
+    """return the hosts that the plays of a service run on
+
+    These are the hosts of the groups of the service and its
+    sub-services, and of its groups in SERVICE_PLAY_GROUPS.
+    """
+    service = inventory.get_service(servicename)
+    if not service:
+        raise CommandError('Service (%s) not found. ' % servicename)
+    groupnames = service.get_groupnames()
+    groupnames.extend(SERVICE_PLAY_GROUPS.get(servicename, []))
+    for sub_servicename in service.get_sub_servicenames():
+        sub_service = inventory.get_sub_service(sub_servicename)
+        if sub_service:
+            groupnames.extend(sub_service.get_groupnames())
+
+    hostnames = []
+    for groupname in groupnames:
+        group = inventory.get_group(groupname)
+        if not group:
+            continue
+        for hostname in group.get_hostnames():
+            if hostname not in hostnames:
+                hostnames.append(hostname)
+    return hostnames
+
+
+def get_plan(inventory, servicenames, hostnames=None):
+    """plan the deploy of services in waves
+
+    The services of a wave are split into runs with no hosts in common,
+    so the runs of a wave can be deployed at the same time. Services
+    that share a host are deployed by the same run. Only the hosts in
+    hostnames are included, if given. Services with no hosts are left
+    out.
+
+    return list of waves, a wave is a list of dicts of format:
+        {'services': service_names, 'hosts': hostnames}
+    """
+    plan = []
+    for wave in get_waves(servicenames):
+        runs = []
+        for servicename in wave:
+            service_hostnames = get_service_hostnames(inventory, servicename)
+            if hostnames:
+                service_hostnames = [hostname for hostname
+                                     in service_hostnames
+                                     if hostname in hostnames]
+            if not service_hostnames:
+                continue
+            new_run = {'services': [servicename],
+                       'hosts': service_hostnames}
+            for run in list(runs):
+                if not set(run['hosts']) & set(new_run['hosts']):
+                    continue
+                runs.remove(run)
+                new_run = {
+                    'services': sorted(run['services'] +
+                                       new_run['services']),
+                    'hosts': sorted(set(run['hosts'] + new_run['hosts']))
+                    }
+            runs.append(new_run)
+        if runs:
+            plan.append(sorted(runs, key=lambda run: run['services']))
+    return plan
+
+
+class WaveDeploy(StagedDeploy):
+    """deploy services in the waves of a plan
+
+    The waves are deployed one after the other. The runs of a wave are
+    deployed at the same time, each by its own copy of playbook. No more
+    waves are started after a run has failed.
+
+    plan is as returned by get_plan. The results are dicts of format:
+        {'wave': wave_number, 'services': service_names,
+         'hosts': hostnames, 'duration': seconds, 'error': error_message}
+    """
+    label = 'Wave deploy'
+    unit_label = 'service deploys'
+
+    def __init__(self, playbook, plan):
+        stages = []
+        for wave_number, runs in enumerate(plan, 1):
+            stages.append([('wave %s (%s)' % (wave_number,
+                                              ', '.join(run['services'])),
+                            {'wave': wave_number,
+                             'services': run['services'],
+                             'hosts': run['hosts']})
+                           for run in runs])
+        super(WaveDeploy, self).__init__(playbook, stages, _describe_run,
+                                         _limit_to_run, concurrency=None)
+
+
+def _describe_run(result):
+    return 'wave %s: %s' % (result['wave'], ', '.join(result['services']))
+
+
+def _limit_to_run(playbook, result):
+    # the inventory is not filtered, later waves must still find the
+    # hosts of the services of earlier waves
+    playbook.services = result['services']
+    playbook.hosts = None
+    playbook.groups = None
+    playbook.limit_hosts = result['hosts']
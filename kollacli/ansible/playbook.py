@@ -11,17 +11,37 @@
 #    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
 #    License for the specific language governing permissions and limitations
 #    under the License.
+import glob
+import json
 import logging
 import os
-import subprocess
+import time
 import traceback
+import uuid
 
 from kollacli.ansible.inventory import Inventory
+from kollacli.ansible.settings import AnsibleSettings
 from kollacli.exceptions import CommandError
+from kollacli.utils import atomic_write_file
 from kollacli.utils import get_admin_user
 from kollacli.utils import get_kolla_etc
+from kollacli.utils import get_kolla_log_dir
+from kollacli.utils import get_kollacli_home
 from kollacli.utils import run_cmd
 
+# the kollacli_events callback plugin writes playbook events to the
+# file named by this environment variable
+EVENTS_PATH_ENV = 'KOLLACLI_EVENTS_PATH'
+CALLBACK_PLUGINS_PATH = 'ansible/callback_plugins'
+
+# playbook run records and profiles are written to the kolla log directory
+RUN_RECORD_PREFIX = 'kollacli_run_'
+RUN_RECORD_LIMIT = 20
+PROFILE_PREFIX = 'kollacli_profile_'
+
+# host result statuses reported by the kollacli_events callback plugin
+HOST_STATUSES = ['ok', 'changed', 'failed', 'skipped', 'unreachable']
+
 
 class AnsiblePlaybook(object):
     playbook_path = ''
@@ -36,6 +56,18 @@ class AnsiblePlaybook(object):
     services = None
     serial = False
 
+    # hosts that the run is limited to with --limit. Unlike hosts, the
+    # other hosts stay in the inventory, so that templates can still
+    # find them.
+    limit_hosts = None
+
+    # dict of ansible setting name to value, in place of the stored ones
+    settings = None
+
+    # after run: the PlaybookEvents of the run and the path of its record
+    events = None
+    run_record_path = None
+
     log = logging.getLogger(__name__)
 
     def run(self):
@@ -53,23 +85,9 @@ class AnsiblePlaybook(object):
             command_string = ('/usr/bin/sudo -u %s ansible-playbook %s'
                               % (admin_user, flag))
             inventory = Inventory.load()
-            inventory_filter = {}
-            if self.hosts:
-                for hostname in self.hosts:
-                    host = inventory.get_host(hostname)
-                    if not host:
-                        raise CommandError(
-                            'Host (%s) not found. ' % hostname)
-                inventory_filter['deploy_hosts'] = self.hosts
-            elif self.groups:
-                for groupname in self.groups:
-                    group = inventory.get_group(groupname)
-                    if not group:
-                        raise CommandError(
-                            'Group (%s) not found. ' % groupname)
-                inventory_filter['deploy_groups'] = self.groups
+            inventory_filter = self.get_inventory_filter(inventory)
 
-            inventory_path = inventory.create_json_gen_file(inventory_filter)
+            inventory_path = inventory.create_inventory_file(inventory_filter)
             inventory_string = '-i ' + inventory_path
             cmd = (command_string + ' ' + inventory_string)
 
@@ -110,23 +128,42 @@ class AnsiblePlaybook(object):
                     service_string = service_string + service
                 cmd = (cmd + ' --tags ' + service_string)
 
+            if self.limit_hosts:
+                for hostname in self.limit_hosts:
+                    if not inventory.get_host(hostname):
+                        raise CommandError(
+                            'Host (%s) not found. ' % hostname)
+                # hosts are separated by commas, as IPv6 addresses
+                # contain colons
+                cmd = (cmd + ' --limit ' + ','.join(self.limit_hosts))
+
+            settings_args = AnsibleSettings().get_args(self.settings)
+            if settings_args:
+                cmd = (cmd + ' ' + settings_args)
+
             if self.flush_cache:
                 cmd = (cmd + ' --flush-cache')
 
             if self.verbose_level > 1:
                 # log the ansible command
                 self.log.debug('cmd:' + cmd)
+                self.log.debug('ansible settings: %s'
+                               % AnsibleSettings().get_env(self.settings))
 
                 if self.verbose_level > 2:
                     # log the inventory
-                    dbg_gen = inventory_path
-                    (inv, _) = \
-                        subprocess.Popen(dbg_gen.split(' '),
-                                         stdout=subprocess.PIPE,
-                                         stderr=subprocess.PIPE).communicate()
-                    self.log.debug(inv)
-
-            err_msg, output = run_cmd(cmd, self.print_output)
+                    self.log.debug(
+                        inventory.get_ansible_json(inventory_filter))
+
+            env = AnsibleSettings().get_env(self.settings)
+            events_path = self._create_events_file()
+            if events_path:
+                env[EVENTS_PATH_ENV] = events_path
+                env['ANSIBLE_CALLBACK_PLUGINS'] = _get_callback_plugins(
+                    os.environ.get('ANSIBLE_CALLBACK_PLUGINS'))
+            err_msg, output = run_cmd(cmd, self.print_output, env=env)
+            if events_path:
+                self._record_run(events_path, err_msg)
             if err_msg:
                 if not self.print_output:
                     # since the user didn't see the output, include it in
@@ -139,9 +176,91 @@ class AnsiblePlaybook(object):
             raise e
         except Exception:
             raise Exception(traceback.format_exc())
+
+    def get_inventory_filter(self, inventory):
+        """return the inventory filter for the hosts and groups"""
+        inventory_filter = {}
+        if self.hosts:
+            for hostname in self.hosts:
+                host = inventory.get_host(hostname)
+                if not host:
+                    raise CommandError(
+                        'Host (%s) not found. ' % hostname)
+            inventory_filter['deploy_hosts'] = self.hosts
+        if self.groups:
+            for groupname in self.groups:
+                group = inventory.get_group(groupname)
+                if not group:
+                    raise CommandError(
+                        'Group (%s) not found. ' % groupname)
+            inventory_filter['deploy_groups'] = self.groups
+        return inventory_filter
+
+    def _create_events_file(self):
+        """create the file for the events of this run
+
+        The file is in the kolla log directory, so that the admin user
+        that runs ansible can write to it. Events are not recorded if it
+        cannot be created.
+        """
+        events_path = os.path.join(get_kolla_log_dir(),
+                                   '%sevents_%s.json'
+                                   % (RUN_RECORD_PREFIX, uuid.uuid4().hex))
+        try:
+            with open(events_path, 'w'):
+                pass
+            os.chmod(events_path, 0o660)
+        except (IOError, OSError) as e:
+            self.log.debug('playbook events not recorded: %s' % e)
+            return None
+        return events_path
+
+    def _record_run(self, events_path, err_msg):
+        """parse the events of the run and write its run record"""
+        try:
+            self.events = PlaybookEvents.load(events_path)
+            record = {
+                'playbook': self.playbook_path,
+                'hosts': self.hosts,
+                'groups': self.groups,
+                'limit_hosts': self.limit_hosts,
+                'services': self.services,
+                'succeeded': not err_msg,
+                }
+            record.update(self.events.to_dict())
+            self.run_record_path = _get_log_path(RUN_RECORD_PREFIX)
+            atomic_write_file(self.run_record_path,
+                              json.dumps(record, indent=2))
+            self.log.debug('playbook run recorded in %s'
+                           % self.run_record_path)
+            _prune_run_records()
+        except Exception as e:
+            self.log.warning('playbook run not recorded: %s' % e)
         finally:
-            if inventory_path:
-                os.remove(inventory_path)
+            try:
+                os.remove(events_path)
+            except OSError:
+                pass
+
+    def write_profile(self):
+        """write the profile of the last run to the kolla log directory
+
+        return path to profile file
+        """
+        if not self.events:
+            raise CommandError('No playbook events were recorded')
+        profile = {
+            'playbook': self.playbook_path,
+            'hosts': self.hosts,
+            'groups': self.groups,
+            'limit_hosts': self.limit_hosts,
+            'services': self.services,
+            'run_record': self.run_record_path,
+            }
+        profile.update(self.events.get_profile())
+        profile_path = _get_log_path(PROFILE_PREFIX)
+        atomic_write_file(profile_path, json.dumps(profile, indent=2))
+        return profile_path
 
     def _get_globals_path(self):
         kolla_etc = get_kolla_etc()
@@ -150,3 +269,194 @@ class AnsiblePlaybook(object):
     def _get_password_path(self):
         kolla_etc = get_kolla_etc()
         return (' -e @' + os.path.join(kolla_etc, 'passwords.yml '))
+
+
+class PlaybookEvents(object):
+    """task and host times from the events of a playbook run
+
+    tasks is a list, in run order, of dicts of format:
+    {'name': task_name,
+     'role': role_name,
+     'play': play_name,
+     'start': start_time,
+     'duration': seconds,
+     'hosts': {
+        'hostname1': {'status': status, 'duration': seconds, 'msg': msg}
+        }
+    }
+    The duration of a task on a host is from the start of the task to
+    the result of that host.
+
+    hosts is a dict of hostname to a dict of format:
+    {'duration': seconds, 'ok': count, 'changed': count, 'failed': count,
+     'skipped': count, 'unreachable': count}
+    The duration of a host is the sum of its task durations.
+    """
+
+    def __init__(self, events):
+        self.start_time = None
+        self.end_time = None
+        self.tasks = []
+        self.hosts = {}
+        self._parse(events)
+
+    @staticmethod
+    def load(events_path):
+        events = []
+        with open(events_path, 'r') as events_file:
+            for line in events_file:
+                line = line.strip()
+                if line:
+                    events.append(json.loads(line))
+        return PlaybookEvents(events)
+
+    def get_duration(self):
+        if self.start_time is None:
+            return 0
+        return self.end_time - self.start_time
+
+    def get_profile(self):
+        """return the roles, tasks and hosts of the run, slowest first
+
+        return a dict of format:
+        {'duration': seconds,
+         'roles': [{'name': role_name, 'duration': seconds}],
+         'tasks': [{'name': task_name, 'role': role_name,
+                    'duration': seconds, 'slowest_host': hostname}],
+         'hosts': [{'name': hostname, 'duration': seconds}]
+        }
+        The duration of a role is the sum of its task durations.
+        """
+        role_times = {}
+        tasks = []
+        for task in self.tasks:
+            role = task['role']
+            role_times[role] = role_times.get(role, 0) + task['duration']
+            slowest_host = None
+            if task['hosts']:
+                slowest_host = max(
+                    task['hosts'].items(),
+                    key=lambda host: host[1]['duration'])[0]
+            tasks.append({'name': task['name'],
+                          'role': task['role'],
+                          'duration': task['duration'],
+                          'slowest_host': slowest_host})
+        roles = [{'name': role, 'duration': duration}
+                 for role, duration in role_times.items()]
+        hosts = [{'name': hostname, 'duration': host['duration']}
+                 for hostname, host in self.hosts.items()]
+
+        def by_duration(item):
+            return item['duration']
+
+        return {
+            'duration': self.get_duration(),
+            'roles': sorted(roles, key=by_duration, reverse=True),
+            'tasks': sorted(tasks, key=by_duration, reverse=True),
+            'hosts': sorted(hosts, key=by_duration, reverse=True),
+            }
+
+    def to_dict(self):
+        return {
+            'start_time': self.start_time,
+            'end_time': self.end_time,
+            'duration': self.get_duration(),
+            'tasks': self.tasks,
+            'hosts': self.hosts,
+            }
+
+    def _parse(self, events):
+        play = None
+        task = None
+        for event in events:
+            event_time = event['time']
+            if self.start_time is None:
+                self.start_time = event_time
+            self.end_time = event_time
+
+            event_type = event['event']
+            if event_type in ('play_start', 'task_start', 'playbook_end'):
+                if task:
+                    task['duration'] = event_time - task['start']
+                    task = None
+            if event_type == 'play_start':
+                play = event.get('name')
+            elif event_type == 'task_start':
+                task = {
+                    'name': event.get('name'),
+                    'role': event.get('role'),
+                    'play': play,
+                    'start': event_time,
+                    'duration': 0,
+                    'hosts': {},
+                    }
+                self.tasks.append(task)
+            elif event_type == 'host_result' and task:
+                self._add_host_result(task, event)
+        if task:
+            task['duration'] = self.end_time - task['start']
+
+    def _add_host_result(self, task, event):
+        hostname = event['host']
+        status = event['status']
+        duration = event['time'] - task['start']
+        task['hosts'][hostname] = {
+            'status': status,
+            'duration': duration,
+            'msg': event.get('msg'),
+            }
+        if hostname not in self.hosts:
+            self.hosts[hostname] = {'duration': 0}
+            for host_status in HOST_STATUSES:
+                self.hosts[hostname][host_status] = 0
+        host = self.hosts[hostname]
+        host['duration'] += duration
+        if status in host:
+            host[status] += 1
+
+
+def _get_callback_plugins(current_path):
+    """return the callback plugin path with the kollacli plugins added
+
+    Setting ANSIBLE_CALLBACK_PLUGINS replaces the callback plugin path of
+    ansible, so the kollacli plugins are appended to the current value,
+    or to the path that ansible is configured with.
+    """
+    paths = []
+    if current_path:
+        paths = current_path.split(os.pathsep)
+    else:
+        try:
+            from ansible import constants
+            configured = constants.DEFAULT_CALLBACK_PLUGIN_PATH
+        except Exception:
+            # ansible runs as another user, it may not be importable here
+            configured = None
+        if isinstance(configured, basestring):
+            # ansible 1 has a path string rather than a list
+            configured = configured.split(os.pathsep)
+        paths = list(configured or [])
+    kollacli_path = os.path.join(get_kollacli_home(), CALLBACK_PLUGINS_PATH)
+    if kollacli_path not in paths:
+        paths.append(kollacli_path)
+    return os.pathsep.join(path for path in paths if path)
+
+
+def _get_log_path(prefix):
+    """return a new path in the kolla log directory, in time order"""
+    # playbooks can run at the same time, so the time is not unique
+    return os.path.join(get_kolla_log_dir(),
+                        '%s%s_%s.json' % (prefix,
+                                          time.strftime('%Y%m%d%H%M%S'),
+                                          uuid.uuid4().hex[:8]))
+
+
+def _prune_run_records():
+    """remove all but the newest RUN_RECORD_LIMIT run records"""
+    paths = glob.glob(os.path.join(get_kolla_log_dir(),
+                                   RUN_RECORD_PREFIX + '[0-9]*.json'))
+    for path in sorted(paths)[:-RUN_RECORD_LIMIT]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
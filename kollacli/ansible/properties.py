@@ -11,19 +11,70 @@
 #    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
 #    License for the specific language governing permissions and limitations
 #    under the License.
+import json
 import logging
 import os
-import yaml
 
+from kollacli.utils import atomic_write_file
+from kollacli.utils import change_properties
 from kollacli.utils import change_property
 from kollacli.utils import get_kolla_etc
 from kollacli.utils import get_kolla_home
+from kollacli.utils import get_kollacli_etc
 from kollacli.utils import sync_read_file
+from kollacli.utils import yaml_load
 
 ALLVARS_PATH = 'ansible/group_vars/all.yml'
 GLOBALS_FILENAME = 'globals.yml'
 ANSIBLE_ROLES_PATH = 'ansible/roles'
 ANSIBLE_DEFAULTS_PATH = 'defaults/main.yml'
+PROPERTIES_CACHE_PATH = 'ansible/properties_cache.json'
+
+
+def get_property(property_name):
+    """return the value of one property, None if it is not set
+
+    The property files are read in precedence order: globals.yml,
+    group_vars/all.yml, then the role defaults files. The first string
+    value that is not a jinja2 template is returned, so only the files
+    up to that one are read. This gives the same value as
+    AnsibleProperties().get_property(), without parsing every file.
+    """
+    cache = _PropertyFileCache()
+    try:
+        for path, locked in _get_property_paths():
+            value = cache.load(path, locked).get(property_name)
+            if isinstance(value, basestring) and not _is_jinja2(value):
+                return value
+        return None
+    finally:
+        cache.write()
+
+
+def get_globals_path():
+    """return the path of globals.yml, the file that properties are set in"""
+    return os.path.join(get_kolla_etc(), GLOBALS_FILENAME)
+
+
+def _get_property_paths():
+    """yield (path, locked) of the property files, highest precedence first
+
+    Role defaults files are yielded in the reverse of the order that
+    AnsibleProperties loads them, as later files take precedence there.
+    """
+    kolla_home = get_kolla_home()
+    yield get_globals_path(), True
+    yield os.path.join(kolla_home, ALLVARS_PATH), False
+    start_dir = os.path.join(kolla_home, ANSIBLE_ROLES_PATH)
+    for service_name in reversed(next(os.walk(start_dir))[1]):
+        file_name = os.path.join(start_dir, service_name,
+                                 ANSIBLE_DEFAULTS_PATH)
+        if os.path.isfile(file_name):
+            yield file_name, False
+
+
+def _is_jinja2(value):
+    return '{{' in value and '}}' in value
 
 
 class AnsibleProperties(object):
@@ -37,6 +88,10 @@ class AnsibleProperties(object):
         KOLLA_ETC/passwords.yml
         KOLLA_HOME/group_vars/all.yml
         KOLLA_HOME/ansible/roles/<service>/default/main.yml
+
+        The parsed contents of each file are cached in a cache file,
+        keyed by the path, modification time, size and inode of the file.
+        Only the files that changed since they were cached are parsed.
         """
         kolla_etc = get_kolla_etc()
         kolla_home = get_kolla_home()
@@ -50,6 +105,8 @@ class AnsibleProperties(object):
         # property set command
         self.file_contents = {}
 
+        cache = _PropertyFileCache()
+
         try:
             start_dir = os.path.join(kolla_home, ANSIBLE_ROLES_PATH)
             services = next(os.walk(start_dir))[1]
@@ -57,37 +114,34 @@ class AnsibleProperties(object):
                 file_name = os.path.join(start_dir, service_name,
                                          ANSIBLE_DEFAULTS_PATH)
                 if os.path.isfile(file_name):
-                    with open(file_name) as service_file:
-                        service_contents = yaml.load(service_file)
-                        self.file_contents[file_name] = service_contents
-                        service_contents = self.filter_jinja2(service_contents)
-                        prop_file_name = service_name + ':main.yml'
-                        for key, value in service_contents.items():
-                            ansible_property = AnsibleProperty(key, value,
-                                                               prop_file_name)
-                            self.properties.append(ansible_property)
-                            self.unique_properties[key] = ansible_property
+                    service_contents = cache.load(file_name)
+                    self.file_contents[file_name] = service_contents
+                    service_contents = self.filter_jinja2(service_contents)
+                    prop_file_name = service_name + ':main.yml'
+                    for key, value in service_contents.items():
+                        ansible_property = AnsibleProperty(key, value,
+                                                           prop_file_name)
+                        self.properties.append(ansible_property)
+                        self.unique_properties[key] = ansible_property
         except Exception as e:
             raise e
 
         try:
             self.allvars_path = os.path.join(kolla_home, ALLVARS_PATH)
-            with open(self.allvars_path) as allvars_file:
-                allvars_contents = yaml.load(allvars_file)
-                self.file_contents[self.allvars_path] = allvars_contents
-                allvars_contents = self.filter_jinja2(allvars_contents)
-                for key, value in allvars_contents.items():
-                    ansible_property = AnsibleProperty(key, value,
-                                                       'group_vars/all.yml')
-                    self.properties.append(ansible_property)
-                    self.unique_properties[key] = ansible_property
+            allvars_contents = cache.load(self.allvars_path)
+            self.file_contents[self.allvars_path] = allvars_contents
+            allvars_contents = self.filter_jinja2(allvars_contents)
+            for key, value in allvars_contents.items():
+                ansible_property = AnsibleProperty(key, value,
+                                                   'group_vars/all.yml')
+                self.properties.append(ansible_property)
+                self.unique_properties[key] = ansible_property
         except Exception as e:
             raise e
 
         try:
             self.globals_path = os.path.join(kolla_etc, GLOBALS_FILENAME)
-            globals_data = sync_read_file(self.globals_path)
-            globals_contents = yaml.load(globals_data)
+            globals_contents = cache.load(self.globals_path, locked=True)
             self.file_contents[self.globals_path] = globals_contents
             globals_contents = self.filter_jinja2(globals_contents)
             for key, value in globals_contents.items():
@@ -98,6 +152,8 @@ class AnsibleProperties(object):
         except Exception as e:
             raise e
 
+        cache.write(prune=True)
+
     def get_all(self):
         return sorted(self.properties, key=lambda x: x.name)
 
@@ -120,7 +176,7 @@ class AnsibleProperties(object):
                 self.log.debug('removing non-string: %s' % str(value))
                 del contents[key]
                 continue
-            if '{{' in value and '}}' in value:
+            if _is_jinja2(value):
                 self.log.debug('removing jinja2 value: %s' % value)
                 del contents[key]
         return contents
@@ -145,6 +201,17 @@ class AnsibleProperties(object):
         except Exception as e:
             raise e
 
+    @staticmethod
+    def change_properties(set_properties=None, clear_keys=None):
+        # Set and clear many properties of the globals.yml file in one
+        # locked read and write of the file. No property file is parsed,
+        # so this does not need an AnsibleProperties to be loaded.
+        try:
+            change_properties(get_globals_path(), set_properties,
+                              clear_keys)
+        except Exception as e:
+            raise e
+
 
 class AnsibleProperty(object):
 
@@ -152,3 +219,70 @@ class AnsibleProperty(object):
         self.name = name
         self.value = value
         self.file_name = file_name
+
+
+class _PropertyFileCache(object):
+    """parsed contents of property files, cached in a cache file
+
+    Each file is keyed by its path, modification time, size and inode.
+    Only the files that changed since they were cached are parsed.
+    """
+    log = logging.getLogger(__name__)
+
+    def __init__(self):
+        self.cache_path = os.path.join(get_kollacli_etc(),
+                                       PROPERTIES_CACHE_PATH)
+        self._cache = {}
+        self._changed = False
+        self._loaded_paths = set()
+        try:
+            if os.path.exists(self.cache_path):
+                with open(self.cache_path) as cache_file:
+                    self._cache = json.load(cache_file)
+        except Exception as e:
+            self.log.debug('properties cache not read: %s' % e)
+
+    def load(self, path, locked=False):
+        """return the parsed contents of a yaml file
+
+        A locked file is read with a lock held, as kollacli may be
+        writing it. The caller may change the returned dict.
+        """
+        # stat before the read, so a change made during the read is
+        # noticed the next time
+        stat = os.stat(path)
+        file_key = [stat.st_mtime, stat.st_size, stat.st_ino]
+        self._loaded_paths.add(path)
+        entry = self._cache.get(path)
+        if entry and entry[0] == file_key:
+            return dict(entry[1])
+
+        if locked:
+            data = sync_read_file(path)
+        else:
+            with open(path) as yaml_file:
+                data = yaml_file.read()
+        contents = yaml_load(data) or {}
+        self._cache[path] = [file_key, contents]
+        self._changed = True
+        return dict(contents)
+
+    def write(self, prune=False):
+        """write the cache file, if any file was parsed
+
+        If prune, entries for files that were not loaded are dropped.
+        The cache is only an optimization, it is not written if that
+        fails.
+        """
+        if prune:
+            for path in list(self._cache):
+                if path not in self._loaded_paths:
+                    del self._cache[path]
+                    self._changed = True
+        if not self._changed:
+            return
+        try:
+            atomic_write_file(self.cache_path,
+                              json.dumps(self._cache, separators=(',', ':')))
+        except Exception as e:
+            self.log.debug('properties cache not written: %s' % e)
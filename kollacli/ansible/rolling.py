@@ -0,0 +1,145 @@
+# Copyright(c) 2015, Oracle and/or its affiliates.  All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+import math
+
+from kollacli.ansible.inventory import COMPUTE_GRP_NAME
+from kollacli.ansible.inventory import DEPLOY_GROUPS
+from kollacli.ansible.staged import StagedDeploy
+from kollacli.exceptions import CommandError
+
+# compute hosts need the control services, so they are deployed last
+ROLLING_GROUPS = ([group for group in DEPLOY_GROUPS
+                   if group != COMPUTE_GRP_NAME] + [COMPUTE_GRP_NAME])
+
+
+def parse_batch_sizes(batch_sizes):
+    """parse a batch size option
+
+    batch_sizes is a comma separated list of sizes. A size is a number of
+    hosts (2) or a percentage of the hosts of a group (25%). A size can
+    be for one group (compute=25%), a size without a group is for all of
+    the other groups.
+
+    return dict of group name to (size, is_percentage), the size for all
+    of the other groups has the key None
+    """
+    sizes = {}
+    for item in batch_sizes.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        groupname = None
+        size = item
+        if '=' in item:
+            groupname, size = [part.strip() for part in item.split('=', 1)]
+            if groupname not in DEPLOY_GROUPS:
+                raise CommandError('Invalid batch size group: %s, it must '
+                                   'be one of: %s'
+                                   % (groupname, ', '.join(DEPLOY_GROUPS)))
+        is_percentage = size.endswith('%')
+        if is_percentage:
+            size = size[:-1]
+        try:
+            size = int(size)
+        except ValueError:
+            size = 0
+        if size < 1 or (is_percentage and size > 100):
+            raise CommandError('Invalid batch size: %s, it must be a number '
+                               'of hosts or a percentage' % item)
+        sizes[groupname] = (size, is_percentage)
+    if not sizes:
+        raise CommandError('No batch size given')
+    return sizes
+
+
+def get_batches(inventory, batch_sizes, hostnames=None, groupnames=None):
+    """split the hosts of each deploy group into batches
+
+    batch_sizes is as returned by parse_batch_sizes. Only the hosts in
+    hostnames and the groups in groupnames are included, if given. A
+    group with no batch size is one batch.
+
+    return list of (group name, list of hostnames), in deploy order
+    """
+    batches = []
+    for groupname in ROLLING_GROUPS:
+        if groupnames and groupname not in groupnames:
+            continue
+        group = inventory.get_group(groupname)
+        if not group:
+            continue
+        group_hostnames = group.get_hostnames()
+        if hostnames:
+            group_hostnames = [hostname for hostname in group_hostnames
+                               if hostname in hostnames]
+        if not group_hostnames:
+            continue
+
+        batch_count = len(group_hostnames)
+        size = batch_sizes.get(groupname, batch_sizes.get(None))
+        if size:
+            size, is_percentage = size
+            if is_percentage:
+                size = int(math.ceil(len(group_hostnames) * size / 100.0))
+            batch_count = size
+        for start in range(0, len(group_hostnames), batch_count):
+            batches.append((groupname,
+                            group_hostnames[start:start + batch_count]))
+    return batches
+
+
+class RollingDeploy(StagedDeploy):
+    """deploy the hosts of each deploy group in batches
+
+    The groups are deployed one after the other. Up to concurrency
+    batches of a group are deployed at the same time, each by its own
+    copy of playbook. Once more than max_failures batches have failed,
+    no more batches are started.
+
+    batches is as returned by get_batches. The results are dicts of
+    format:
+        {'group': group_name, 'hosts': hostnames,
+         'duration': seconds, 'error': error_message}
+    """
+    label = 'Batch deploy'
+    unit_label = 'batches'
+
+    def __init__(self, playbook, batches, concurrency=1, max_failures=0):
+        stages = []
+        for groupname in ROLLING_GROUPS:
+            stage = []
+            for batch_groupname, hostnames in batches:
+                if batch_groupname != groupname:
+                    continue
+                name = '%s batch %s' % (groupname, len(stage) + 1)
+                stage.append((name, {'group': groupname,
+                                     'hosts': hostnames}))
+            if stage:
+                stages.append(stage)
+        super(RollingDeploy, self).__init__(playbook, stages,
+                                            _describe_batch,
+                                            _limit_to_batch, concurrency,
+                                            max_failures)
+
+
+def _describe_batch(result):
+    return result['group']
+
+
+def _limit_to_batch(playbook, result):
+    # the inventory is not filtered, the other hosts must stay in it for
+    # the templates of the batch
+    playbook.hosts = None
+    playbook.groups = None
+    playbook.limit_hosts = result['hosts']
@@ -0,0 +1,203 @@
+# Copyright(c) 2015, Oracle and/or its affiliates.  All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+import json
+import logging
+
+from kollacli.exceptions import CommandError
+from kollacli.utils import load_etc_yaml
+from kollacli.utils import save_etc_yaml
+
+SETTINGS_PATH = 'ansible/settings.yml'
+
+FORKS = 'forks'
+PIPELINING = 'pipelining'
+CONTROL_PERSIST = 'control_persist'
+STRATEGY = 'strategy'
+INVENTORY_FORMAT = 'inventory_format'
+
+SETTING_NAMES = [FORKS, PIPELINING, CONTROL_PERSIST, STRATEGY,
+                 INVENTORY_FORMAT]
+
+STRATEGIES = ['linear', 'free']
+
+INVENTORY_FORMAT_SCRIPT = 'script'
+INVENTORY_FORMAT_INI = 'ini'
+INVENTORY_FORMAT_JSON = 'json'
+
+INVENTORY_FORMATS = [
+    INVENTORY_FORMAT_SCRIPT,
+    INVENTORY_FORMAT_INI,
+    INVENTORY_FORMAT_JSON,
+    ]
+
+# ansible ssh arguments, as in the ansible defaults but with the
+# control persist time from the settings
+SSH_ARGS = '-C -o ControlMaster=auto -o ControlPersist=%ss'
+SSH_ARGS_NO_PERSIST = '-C -o ControlMaster=no'
+
+
+class AnsibleSettings(object):
+    """settings for how ansible runs, stored in the kollacli etc directory
+
+    The settings are:
+    - forks:            number of hosts that ansible works on at once
+    - pipelining:       yes or no, run modules without copying them to
+                        the host first
+    - control_persist:  seconds that an idle ssh connection to a host is
+                        kept open for reuse, 0 to not keep it
+    - strategy:         linear or free, whether hosts wait for each other
+                        at the end of each task (ansible 2 and later)
+    - inventory_format: script, ini or json, the format of the inventory
+                        file that ansible is given, see
+                        Inventory.create_inventory_file (json needs
+                        ansible 2.4 and later)
+
+    A setting that is not set is left to ansible. The inventory format
+    defaults to the KOLLA_CLI_INVENTORY_FORMAT environment variable, or
+    script.
+    """
+    log = logging.getLogger(__name__)
+
+    def __init__(self):
+        self._settings = load_etc_yaml(SETTINGS_PATH)
+
+    def get_setting(self, name):
+        _check_name(name)
+        return self._settings.get(name)
+
+    def get_all(self):
+        """return dict of setting name to value, None if not set"""
+        return dict((name, self._settings.get(name))
+                    for name in SETTING_NAMES)
+
+    def set_setting(self, name, value):
+        self._settings[name] = convert_setting(name, value)
+        save_etc_yaml(SETTINGS_PATH, self._settings)
+
+    def clear_setting(self, name):
+        _check_name(name)
+        if name in self._settings:
+            del self._settings[name]
+            save_etc_yaml(SETTINGS_PATH, self._settings)
+
+    def get_args(self, overrides=None):
+        """return the ansible command line arguments for the settings
+
+        sudo drops the environment of the ansible command unless the
+        sudoers file keeps it, so the settings that ansible takes on its
+        command line are passed there too: forks as --forks, pipelining
+        and control_persist as connection variables in --extra-vars.
+        Extra vars take precedence over the inventory and the ansible
+        config. strategy has no command line form, it is only passed in
+        the environment.
+
+        overrides is as for get_env.
+        """
+        settings = self._get_settings(overrides)
+        args = []
+        if settings.get(FORKS) is not None:
+            args.append('--forks %s' % settings[FORKS])
+        extra_vars = {}
+        if settings.get(PIPELINING) is not None:
+            extra_vars['ansible_pipelining'] = settings[PIPELINING]
+            extra_vars['ansible_ssh_pipelining'] = settings[PIPELINING]
+        if settings.get(CONTROL_PERSIST) is not None:
+            extra_vars['ansible_ssh_args'] = _get_ssh_args(
+                settings[CONTROL_PERSIST])
+        if extra_vars:
+            # the json has no single quotes, so it is quoted with them
+            args.append("--extra-vars '%s'"
+                        % json.dumps(extra_vars, sort_keys=True))
+        return ' '.join(args)
+
+    def get_env(self, overrides=None):
+        """return the ansible environment variables for the settings
+
+        overrides is a dict of setting name to value that takes the
+        place of the stored settings. Values of None are ignored.
+        """
+        settings = self._get_settings(overrides)
+        env = {}
+        if settings.get(FORKS) is not None:
+            env['ANSIBLE_FORKS'] = '%s' % settings[FORKS]
+        if settings.get(PIPELINING) is not None:
+            pipelining = '%s' % settings[PIPELINING]
+            # ansible 1 reads the first, ansible 2 reads either
+            env['ANSIBLE_SSH_PIPELINING'] = pipelining
+            env['ANSIBLE_PIPELINING'] = pipelining
+        if settings.get(CONTROL_PERSIST) is not None:
+            env['ANSIBLE_SSH_ARGS'] = _get_ssh_args(settings[CONTROL_PERSIST])
+        if settings.get(STRATEGY) is not None:
+            env['ANSIBLE_STRATEGY'] = settings[STRATEGY]
+        return env
+
+    def _get_settings(self, overrides):
+        settings = dict(self._settings)
+        if overrides:
+            for name, value in overrides.items():
+                if value is not None:
+                    settings[name] = convert_setting(name, value)
+        return settings
+
+
+def convert_setting(name, value):
+    """return the setting value converted from a string, if needed"""
+    _check_name(name)
+    if name == FORKS:
+        return _convert_int(name, value, 1)
+    elif name == CONTROL_PERSIST:
+        return _convert_int(name, value, 0)
+    elif name == PIPELINING:
+        if isinstance(value, bool):
+            return value
+        if ('%s' % value).lower() in ['yes', 'true']:
+            return True
+        if ('%s' % value).lower() in ['no', 'false']:
+            return False
+        raise CommandError('Invalid value for %s: %s, it must be yes or no'
+                           % (name, value))
+    elif name == STRATEGY:
+        return _convert_choice(name, value, STRATEGIES)
+    else:
+        return _convert_choice(name, value, INVENTORY_FORMATS)
+
+
+def _get_ssh_args(control_persist):
+    if control_persist:
+        return SSH_ARGS % control_persist
+    return SSH_ARGS_NO_PERSIST
+
+
+def _convert_choice(name, value, choices):
+    if value not in choices:
+        raise CommandError('Invalid value for %s: %s, it must be one of: %s'
+                           % (name, value, ', '.join(choices)))
+    return value
+
+
+def _convert_int(name, value, minimum):
+    try:
+        int_value = int(value)
+    except (TypeError, ValueError):
+        int_value = None
+    if int_value is None or int_value < minimum:
+        raise CommandError('Invalid value for %s: %s, it must be a number '
+                           'of at least %s' % (name, value, minimum))
+    return int_value
+
+
+def _check_name(name):
+    if name not in SETTING_NAMES:
+        raise CommandError('Invalid setting name: %s, it must be one of: %s'
+                           % (name, ', '.join(SETTING_NAMES)))
@@ -0,0 +1,126 @@
+# Copyright(c) 2015, Oracle and/or its affiliates.  All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+import copy
+import logging
+import time
+
+from collections import OrderedDict
+
+from kollacli.exceptions import CommandError
+from kollacli.utils import run_host_tasks
+
+
+class StagedDeploy(object):
+    """deploy the units of each stage with copies of a playbook
+
+    stages is a list of stages, a stage is a list of (name, result) for
+    its units. A result is a dict with at least a 'hosts' entry, the
+    other entries describe the unit to describe and limit_playbook.
+    describe(result) returns the summary description of a unit, and
+    limit_playbook(playbook, result) limits a copy of the playbook to a
+    unit.
+
+    The stages are deployed one after the other. Up to concurrency units
+    of a stage are deployed at the same time, each by its own copy of
+    playbook, or all of them if concurrency is None. Once more than
+    max_failures units have failed, no more units are started.
+
+    Subclasses set label and unit_label.
+    """
+    log = logging.getLogger(__name__)
+
+    # used in the log and summary, e.g. 'Batch deploy'
+    label = 'Staged deploy'
+
+    # plural of what a unit is, e.g. 'batches'
+    unit_label = 'units'
+
+    def __init__(self, playbook, stages, describe, limit_playbook,
+                 concurrency=1, max_failures=0):
+        self.playbook = playbook
+        self.stages = stages
+        self.describe = describe
+        self.limit_playbook = limit_playbook
+        self.concurrency = concurrency
+        self.max_failures = max_failures
+
+        # after run: the results of the units, in stage order, each with
+        # its 'duration' in seconds and 'error' message set
+        self.results = []
+
+    def run(self):
+        failed_count = 0
+        for stage in self.stages:
+            concurrency = self.concurrency or len(stage)
+            units = OrderedDict()
+            for name, result in stage:
+                result['duration'] = None
+                result['error'] = None
+                units[name] = (result, min(concurrency, len(stage)) > 1)
+                self.results.append(result)
+
+            if failed_count > self.max_failures:
+                for result, _ in units.values():
+                    result['error'] = ('Not run, more than %s failed'
+                                       % self.max_failures)
+                continue
+
+            failed = run_host_tasks(
+                self._deploy, units, concurrency,
+                description=self.label,
+                max_failures=self.max_failures - failed_count)
+            for name, err_msg in failed.items():
+                result = units[name][0]
+                if not result['error']:
+                    result['error'] = err_msg
+                if result['duration'] is not None:
+                    failed_count += 1
+
+        self.log.info(self.get_summary())
+        if failed_count:
+            raise CommandError('%s of %s %s failed'
+                               % (failed_count, len(self.results),
+                                  self.unit_label))
+
+    def get_summary(self):
+        summary = '%s summary:\n' % self.label
+        for result in self.results:
+            if result['duration'] is None:
+                status = result['error']
+            elif result['error']:
+                status = 'failed in %.1fs: %s' % (result['duration'],
+                                                  result['error'])
+            else:
+                status = 'succeeded in %.1fs' % result['duration']
+            summary += ('- %s (%s): %s\n'
+                        % (self.describe(result),
+                           ', '.join(result['hosts']), status))
+        return summary
+
+    def _deploy(self, name, result, concurrent):
+        playbook = copy.copy(self.playbook)
+        self.limit_playbook(playbook, result)
+        if concurrent:
+            # output of units at the same time would be interleaved
+            playbook.print_output = False
+        self.log.info('Starting %s: %s' % (name, ', '.join(result['hosts'])))
+        start = time.time()
+        try:
+            playbook.run()
+        except Exception as e:
+            result['error'] = '%s' % e
+            raise
+        finally:
+            result['duration'] = time.time() - start
+        self.log.info('Finished %s in %.1fs' % (name, result['duration']))
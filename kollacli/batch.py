@@ -0,0 +1,152 @@
+# Copyright(c) 2015, Oracle and/or its affiliates.  All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+import json
+import logging
+import os
+import traceback
+
+from kollacli.ansible.inventory import Inventory
+from kollacli.exceptions import CommandError
+from kollacli import utils
+
+from cliff.command import Command
+
+# batch command: (inventory operation, argument order)
+# the argument order maps the arguments of the kollacli command, for
+# example 'group addhost <groupname> <hostname>', to the arguments of the
+# inventory operation, add_host(hostname, groupname).
+BATCH_COMMANDS = {
+    'host add':             ('add_host', [0]),
+    'host remove':          ('remove_host', [0]),
+    'group add':            ('add_group', [0]),
+    'group remove':         ('remove_group', [0]),
+    'group addhost':        ('add_host', [1, 0]),
+    'group removehost':     ('remove_host', [1, 0]),
+    'service addgroup':     ('add_group_to_service', [1, 0]),
+    'service removegroup':  ('remove_group_from_service', [1, 0]),
+    }
+
+STRUCTURED_EXTENSIONS = ['.json', '.yaml', '.yml']
+
+
+class Batch(Command):
+    """Apply a file of host, group and service commands
+
+    The inventory is loaded once, every command in the file is applied
+    and validated, and the inventory is saved once. If any command fails,
+    no changes are made.
+
+    The file is either a list of commands, one per line:
+
+        # comment
+        host add host1
+        group addhost control host1
+        service addgroup nova compute
+
+    or, for .yml, .yaml and .json files, a list whose entries are
+    either a command string or a list of command words.
+
+    These commands are supported: host add, host remove, group add,
+    group remove, group addhost, group removehost, service addgroup,
+    service removegroup.
+    """
+    log = logging.getLogger(__name__)
+
+    def get_parser(self, prog_name):
+        parser = super(Batch, self).get_parser(prog_name)
+        parser.add_argument('path', metavar='<batch_file>',
+                            help='batch file absolute path')
+        return parser
+
+    def take_action(self, parsed_args):
+        try:
+            path = parsed_args.path.strip()
+            commands = read_batch_file(path)
+            operations = get_batch_operations(commands)
+
+            inventory = Inventory.load()
+            inventory.apply_operations(operations)
+            Inventory.save(inventory)
+            self.log.info('%s batch commands applied' % len(operations))
+        except CommandError as e:
+            raise e
+        except Exception:
+            raise Exception(traceback.format_exc())
+
+
+def read_batch_file(path):
+    """read a batch file
+
+    return a list of (line number, [command words])
+    """
+    if not os.path.isfile(path):
+        raise CommandError('No file exists at %s. ' % path +
+                           'An absolute file path is required.')
+
+    with open(path, 'r') as batch_file:
+        file_data = batch_file.read()
+
+    commands = []
+    extension = os.path.splitext(path)[1].lower()
+    if extension in STRUCTURED_EXTENSIONS:
+        if extension == '.json':
+            entries = json.loads(file_data)
+        else:
+            entries = utils.yaml_load(file_data)
+        if not isinstance(entries, list):
+            raise CommandError('%s does not contain a list of commands'
+                               % path)
+        for i, entry in enumerate(entries):
+            if isinstance(entry, list):
+                words = ['%s' % word for word in entry]
+            else:
+                words = ('%s' % entry).split()
+            commands.append((i + 1, words))
+    else:
+        for i, line in enumerate(file_data.split('\n')):
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            commands.append((i + 1, line.split()))
+
+    if not commands:
+        raise CommandError('%s is empty' % path)
+    return commands
+
+
+def get_batch_operations(commands):
+    """convert batch commands to inventory operations
+
+    commands is a list of (line number, [command words])
+    return a list of (op, [args]) for Inventory.apply_operations
+    """
+    operations = []
+    errors = []
+    for (line_num, words) in commands:
+        command = ' '.join(words[0:2])
+        args = [utils.convert_to_unicode(word) for word in words[2:]]
+        if command not in BATCH_COMMANDS:
+            errors.append('- line %s: unknown command (%s)'
+                          % (line_num, ' '.join(words)))
+            continue
+        op, arg_order = BATCH_COMMANDS[command]
+        if len(args) != len(arg_order):
+            errors.append('- line %s: %s takes %s argument(s)'
+                          % (line_num, command, len(arg_order)))
+            continue
+        operations.append((op, [args[i] for i in arg_order]))
+
+    if errors:
+        raise CommandError('Invalid batch file: \n%s' % '\n'.join(errors))
+    return operations
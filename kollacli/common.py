@@ -17,9 +17,13 @@ import tarfile
 import tempfile
 import traceback
 
+from kollacli.ansible import fingerprints
+from kollacli.ansible import planner
+from kollacli.ansible import properties
+from kollacli.ansible import rolling
+from kollacli.ansible import settings
 from kollacli.ansible.inventory import Inventory
 from kollacli.ansible.playbook import AnsiblePlaybook
-from kollacli.ansible.properties import AnsibleProperties
 from kollacli.exceptions import CommandError
 from kollacli.utils import convert_to_unicode
 from kollacli.utils import get_kolla_etc
@@ -29,10 +33,16 @@ from kollacli.utils import get_kollacli_etc
 from kollacli.utils import run_cmd
 
 from cliff.command import Command
+from cliff.lister import Lister
 
 
-class Deploy(Command):
-    """Deploy"""
+class Deploy(Lister):
+    """Deploy
+
+    The plan of a dry run and the profile of a deploy are listed with the
+    cliff formatters. Nothing is listed otherwise. The profile of a failed
+    deploy is saved but not listed.
+    """
 
     log = logging.getLogger(__name__)
 
@@ -49,6 +59,52 @@ class Deploy(Command):
                             help='deployment service list')
         parser.add_argument('--serial', action='store_true',
                             help='deploy serially')
+        parser.add_argument('--profile', action='store_true',
+                            help='report the slowest roles, tasks and ' +
+                                 'hosts of the deployment')
+        parser.add_argument('--top', nargs='?', type=int, default=10,
+                            metavar='<count>',
+                            help='number of slowest roles, tasks and ' +
+                                 'hosts to report')
+        parser.add_argument('--forks', nargs='?', metavar='<count>',
+                            help='number of hosts to deploy at once')
+        parser.add_argument('--pipelining', nargs='?', metavar='<yes|no>',
+                            help='run ansible modules without copying ' +
+                                 'them to the hosts')
+        parser.add_argument('--control-persist', nargs='?',
+                            metavar='<seconds>',
+                            help='seconds to keep idle ssh connections ' +
+                                 'open for reuse')
+        parser.add_argument('--strategy', nargs='?',
+                            metavar='<linear|free>',
+                            help='whether hosts wait for each other at ' +
+                                 'the end of each task')
+        parser.add_argument('--batch-size', nargs='?',
+                            metavar='<size_list>',
+                            help='deploy the hosts of each group in ' +
+                                 'batches of this many hosts (2) or ' +
+                                 'percent of hosts (25%%), per group ' +
+                                 '(compute=25%%,control=1) or for all ' +
+                                 'groups')
+        parser.add_argument('--batch-concurrency', nargs='?', type=int,
+                            default=1, metavar='<count>',
+                            help='number of batches of a group to deploy ' +
+                                 'at once')
+        parser.add_argument('--max-failed-batches', nargs='?', type=int,
+                            default=0, metavar='<count>',
+                            help='number of failed batches after which ' +
+                                 'no more batches are started')
+        parser.add_argument('--plan', action='store_true',
+                            help='deploy the services in waves, each ' +
+                                 'service after the services it needs, ' +
+                                 'and the services of a wave on ' +
+                                 'separate hosts at the same time')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='print the deploy plan without deploying')
+        parser.add_argument('--incremental', action='store_true',
+                            help='only deploy the services whose ' +
+                                 'configuration changed since they ' +
+                                 'were last deployed')
         return parser
 
     def take_action(self, parsed_args):
@@ -56,8 +112,41 @@ class Deploy(Command):
             if parsed_args.hosts and parsed_args.groups:
                 raise CommandError('Hosts and Groups arguments cannot both ' +
                                    'be present at the same time.')
+            if parsed_args.top is None or parsed_args.top < 1:
+                raise CommandError('Top count must be at least 1')
+            deploy_settings = self._get_settings(parsed_args)
+            batch_sizes = None
+            if parsed_args.batch_size:
+                batch_sizes = rolling.parse_batch_sizes(
+                    parsed_args.batch_size)
+                if parsed_args.profile:
+                    raise CommandError('Profile is not supported for ' +
+                                       'deploys in batches')
+                if (parsed_args.batch_concurrency is None or
+                        parsed_args.batch_concurrency < 1):
+                    raise CommandError('Batch concurrency must be at ' +
+                                       'least 1')
+                if (parsed_args.max_failed_batches is None or
+                        parsed_args.max_failed_batches < 0):
+                    raise CommandError('Max failed batches cannot be ' +
+                                       'negative')
+            if parsed_args.dry_run and not parsed_args.plan:
+                raise CommandError('Dry run is only supported for ' +
+                                   'planned deploys')
+            if parsed_args.incremental and (parsed_args.hosts or
+                                            parsed_args.groups):
+                raise CommandError('Incremental deploys are not ' +
+                                   'supported for a host or group list')
+            if parsed_args.plan:
+                if not parsed_args.services and not parsed_args.incremental:
+                    raise CommandError('A planned deploy needs a ' +
+                                       'service list')
+                if batch_sizes or parsed_args.profile:
+                    raise CommandError('Batches and profile are not ' +
+                                       'supported for planned deploys')
 
-            self._run_rules()
+            if not parsed_args.dry_run:
+                self._run_rules()
 
             playbook = AnsiblePlaybook()
             kolla_home = get_kolla_home()
@@ -77,21 +166,188 @@ class Deploy(Command):
                 playbook.services = tag_list.split(',')
             if parsed_args.serial:
                 playbook.serial = True
+            playbook.settings = deploy_settings
 
             playbook.verbose_level = self.app.options.verbose_level
-            playbook.run()
+
+            service_fingerprints = None
+            if parsed_args.incremental:
+                service_fingerprints = self._get_fingerprints(playbook)
+                if not service_fingerprints:
+                    self.log.info('No service configuration has changed ' +
+                                  'since the last deploy')
+                    return (), []
+            elif not parsed_args.dry_run:
+                # the deploy is not fingerprinted, so the next incremental
+                # deploy must not skip its services
+                try:
+                    fingerprints.clear_fingerprints(playbook.services)
+                except Exception as e:
+                    # the deploy itself does not need the fingerprints
+                    self.log.warning('Service fingerprints not cleared, '
+                                     'the next incremental deploy may '
+                                     'skip changed services: %s' % e)
+
+            output = (), []
+            if parsed_args.plan:
+                plan_output = self._run_plan(playbook, parsed_args)
+                if parsed_args.dry_run:
+                    return plan_output
+            elif batch_sizes:
+                self._run_batches(playbook, batch_sizes, parsed_args)
+            else:
+                try:
+                    playbook.run()
+                except Exception:
+                    # a failed deploy is profiled too, to show where it
+                    # failed. The profile is saved but not listed.
+                    if parsed_args.profile:
+                        self._save_profile(playbook)
+                    raise
+                if parsed_args.profile:
+                    output = self._get_profile(playbook, parsed_args)
+
+            if service_fingerprints:
+                try:
+                    fingerprints.save_fingerprints(service_fingerprints)
+                except Exception as e:
+                    self.log.warning('Service fingerprints not saved: %s'
+                                     % e)
+            return output
         except CommandError as e:
             raise e
         except Exception:
             raise Exception(traceback.format_exc())
 
+    def _run_batches(self, playbook, batch_sizes, parsed_args):
+        inventory = Inventory.load()
+        for hostname in playbook.hosts or []:
+            if not inventory.get_host(hostname):
+                raise CommandError('Host (%s) not found. ' % hostname)
+        for groupname in playbook.groups or []:
+            if not inventory.get_group(groupname):
+                raise CommandError('Group (%s) not found. ' % groupname)
+
+        batches = rolling.get_batches(inventory, batch_sizes,
+                                      playbook.hosts, playbook.groups)
+        if not batches:
+            raise CommandError('No hosts to deploy')
+        rolling_deploy = rolling.RollingDeploy(
+            playbook, batches, parsed_args.batch_concurrency,
+            parsed_args.max_failed_batches)
+        rolling_deploy.run()
+
+    def _run_plan(self, playbook, parsed_args):
+        """deploy in waves, or return the plan of a dry run"""
+        inventory = Inventory.load()
+        hostnames = playbook.hosts
+        if playbook.groups:
+            hostnames = []
+            for groupname in playbook.groups:
+                group = inventory.get_group(groupname)
+                if not group:
+                    raise CommandError('Group (%s) not found. ' % groupname)
+                hostnames.extend(group.get_hostnames())
+        elif hostnames:
+            for hostname in hostnames:
+                if not inventory.get_host(hostname):
+                    raise CommandError('Host (%s) not found. ' % hostname)
+
+        servicenames = playbook.services
+        if not servicenames:
+            servicenames = [service.name
+                            for service in inventory.get_services()]
+        plan = planner.get_plan(inventory, servicenames, hostnames)
+        if parsed_args.dry_run:
+            data = []
+            for wave_number, runs in enumerate(plan, 1):
+                for run in runs:
+                    data.append((wave_number, ', '.join(run['services']),
+                                 ', '.join(run['hosts'])))
+            return ('Wave', 'Services', 'Hosts'), data
+        if not plan:
+            raise CommandError('No hosts to deploy')
+        planner.WaveDeploy(playbook, plan).run()
+
+    def _get_fingerprints(self, playbook):
+        """fingerprint the configuration of the services to deploy
+
+        playbook.services is set to the services whose fingerprint has
+        changed, and only they are returned. The services are not limited
+        the first time, when no service has been fingerprinted.
+
+        return dict of service name to fingerprint
+        """
+        inventory = Inventory.load()
+        servicenames = playbook.services
+        if not servicenames:
+            servicenames = [service.name
+                            for service in inventory.get_services()]
+        try:
+            service_fingerprints = fingerprints.get_fingerprints(
+                inventory, servicenames)
+        except Exception as e:
+            raise CommandError('Unable to fingerprint services: %s' % e)
+
+        changed = fingerprints.get_changed_services(service_fingerprints)
+        if playbook.services or len(changed) < len(servicenames):
+            playbook.services = changed
+        if changed:
+            self.log.info('Deploying changed services: %s'
+                          % ', '.join(changed))
+        return dict([(servicename, service_fingerprints[servicename])
+                     for servicename in changed])
+
+    def _get_settings(self, parsed_args):
+        """return the ansible settings given on the command line"""
+        deploy_settings = {
+            settings.FORKS: parsed_args.forks,
+            settings.PIPELINING: parsed_args.pipelining,
+            settings.CONTROL_PERSIST: parsed_args.control_persist,
+            settings.STRATEGY: parsed_args.strategy,
+            }
+        for name, value in deploy_settings.items():
+            if value is not None:
+                # check the value before the deploy starts
+                deploy_settings[name] = settings.convert_setting(
+                    name, value.strip())
+        return deploy_settings
+
+    def _get_profile(self, playbook, parsed_args):
+        """save the profile of a deploy and return it as a listing"""
+        if not playbook.events:
+            self.log.warning('No profile, playbook events were not recorded')
+            return (), []
+        profile = playbook.events.get_profile()
+        data = []
+        for kind in ['role', 'task', 'host']:
+            for rank, item in enumerate(
+                    profile[kind + 's'][:parsed_args.top], 1):
+                name = item['name'] or '(no role)'
+                if kind == 'task' and item['role']:
+                    name = '%s : %s' % (item['role'], name)
+                data.append((rank, kind, name, round(item['duration'], 1),
+                             item.get('slowest_host') or ''))
+        self.log.info('Deploy took %.1f seconds' % profile['duration'])
+        self._save_profile(playbook)
+        return ('Rank', 'Type', 'Name', 'Seconds', 'Slowest Host'), data
+
+    def _save_profile(self, playbook):
+        if not playbook.events:
+            self.log.warning('No profile, playbook events were not recorded')
+            return
+        try:
+            profile_path = playbook.write_profile()
+            self.log.info('Profile saved to %s' % profile_path)
+        except Exception as e:
+            self.log.warning('Profile not saved: %s' % e)
+
     def _run_rules(self):
         # check that ring files are in /etc/kolla/config/swift if
         # swift is enabled
         expected_files = ['account.ring.gz',
                           'container.ring.gz',
                           'object.ring.gz']
-        properties = AnsibleProperties()
         is_enabled = properties.get_property('enable_swift')
         if is_enabled == 'yes':
             path_pre = os.path.join(get_kolla_etc(), 'config', 'swift')
@@ -170,9 +426,9 @@ class Dump(Command):
 
         # collect the json inventory output
         inventory = Inventory.load()
-        inv_path = inventory.create_json_gen_file()
-        cmds.append(inv_path)
+        inventory_json = inventory.get_ansible_json()
 
+        path = None
         try:
             fd, path = tempfile.mkstemp(suffix='.tmp')
             os.close(fd)
@@ -185,6 +441,8 @@ class Dump(Command):
                     lines = output.split('\n')
                     for line in lines:
                         tmp_file.write(line + '\n')
+                tmp_file.write('\n\n$ ansible json inventory\n')
+                tmp_file.write(inventory_json + '\n')
             tar.add(path, arcname=os.path.join('kolla', 'cmds_output'))
 
         except Exception as e:
@@ -192,8 +450,6 @@ class Dump(Command):
         finally:
             if path:
                 os.remove(path)
-            if inv_path:
-                os.remove(inv_path)
         return
 
 
@@ -17,7 +17,6 @@ import logging
 import os
 import traceback
 import utils
-import yaml
 
 from kollacli.ansible.inventory import Inventory
 from kollacli.ansible.playbook import AnsiblePlaybook
@@ -94,11 +93,8 @@ class HostDestroy(Command):
                 destroy_type = 'stop'
 
             self.log.info('please be patient as this may take a while.')
-            ansible_properties = properties.AnsibleProperties()
-            base_distro = \
-                ansible_properties.get_property('kolla_base_distro')
-            install_type = \
-                ansible_properties.get_property('kolla_install_type')
+            base_distro = properties.get_property('kolla_base_distro')
+            install_type = properties.get_property('kolla_install_type')
             container_prefix = base_distro + '-' + install_type
             kollacli_home = get_kollacli_home()
             playbook = AnsiblePlaybook()
@@ -191,23 +187,50 @@ class HostCheck(Command):
 
     def get_parser(self, prog_name):
         parser = super(HostCheck, self).get_parser(prog_name)
-        parser.add_argument('hostname', metavar='<hostname>', help='hostname')
+        parser.add_argument('hostname', nargs='?',
+                            metavar='<hostname>', help='hostname')
+        parser.add_argument('--all', action='store_true',
+                            help='check all hosts')
         return parser
 
     def take_action(self, parsed_args):
         try:
-            hostname = parsed_args.hostname.strip()
-            hostname = utils.convert_to_unicode(hostname)
+            if not parsed_args.hostname and not parsed_args.all:
+                raise CommandError('Hostname or --all is required')
+            if parsed_args.hostname and parsed_args.all:
+                raise CommandError('Hostname and --all cannot both be '
+                                   'present')
             inventory = Inventory.load()
-            if not inventory.get_host(hostname):
-                _host_not_found(self.log, hostname)
 
-            inventory.check_host(hostname)
+            if parsed_args.all:
+                hostnames = inventory.get_hostnames()
+                if not hostnames:
+                    raise CommandError('No hosts to check')
+                self._check_hosts(inventory, hostnames)
+            else:
+                hostname = parsed_args.hostname.strip()
+                hostname = utils.convert_to_unicode(hostname)
+                if not inventory.get_host(hostname):
+                    _host_not_found(self.log, hostname)
+
+                inventory.check_host(hostname)
         except CommandError as e:
             raise e
         except Exception as e:
             raise Exception(traceback.format_exc())
 
+    def _check_hosts(self, inventory, hostnames):
+        results = inventory.check_hosts(hostnames)
+        for hostname, result in sorted(results['reachable'].items()):
+            self.log.info('Host (%s) check succeeded (%.2fs)'
+                          % (hostname, result['time']))
+        if results['unreachable']:
+            summary = '\n'
+            for hostname, result in sorted(results['unreachable'].items()):
+                summary = summary + '- %s: %s\n' % (hostname,
+                                                    result['error'])
+            raise CommandError('Not all hosts were reachable: %s' % summary)
+
 
 class HostSetup(Command):
     """Setup openstack-kollacli on host"""
@@ -222,6 +245,18 @@ class HostSetup(Command):
         parser.add_argument('--file', '-f', nargs='?',
                             metavar='<hosts_info_file>',
                             help='hosts info file absolute path')
+        parser.add_argument('--parallel', nargs='?', type=int, default=1,
+                            metavar='<count>',
+                            help='number of hosts from the hosts info file ' +
+                                 'to set up at the same time')
+        parser.add_argument('--timeout', nargs='?', type=int,
+                            metavar='<seconds>',
+                            help='seconds after which the setup of a host ' +
+                                 'from the hosts info file fails')
+        parser.add_argument('--retries', nargs='?', type=int, default=0,
+                            metavar='<count>',
+                            help='number of times to retry the setup of a ' +
+                                 'host from the hosts info file')
         return parser
 
     def take_action(self, parsed_args):
@@ -232,12 +267,20 @@ class HostSetup(Command):
             if parsed_args.hostname and parsed_args.file:
                 raise CommandError('Hostname and hosts info file path ' +
                                    'cannot both be present')
+            if parsed_args.parallel is None or parsed_args.parallel < 1:
+                raise CommandError('Parallel count must be at least 1')
+            if parsed_args.timeout is not None and parsed_args.timeout < 1:
+                raise CommandError('Timeout must be at least 1 second')
+            if parsed_args.retries is None or parsed_args.retries < 0:
+                raise CommandError('Retry count cannot be negative')
             inventory = Inventory.load()
 
             if parsed_args.file:
                 # multi-host setup via xml file
                 hosts_data = self.get_yml_data(parsed_args.file.strip())
-                inventory.setup_hosts(hosts_data)
+                inventory.setup_hosts(hosts_data, parsed_args.parallel,
+                                      parsed_args.timeout,
+                                      parsed_args.retries)
             else:
                 # single host setup
                 hostname = parsed_args.hostname.strip()
@@ -273,7 +316,7 @@ class HostSetup(Command):
         with open(yml_path, 'r') as hosts_file:
             file_data = hosts_file.read()
 
-        hosts_info = yaml.load(file_data)
+        hosts_info = utils.yaml_load(file_data)
         if not hosts_info:
             raise CommandError('%s is empty' % yml_path)
         return hosts_info
@@ -12,37 +12,100 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 import logging
+import os
 import traceback
 
+from collections import OrderedDict
+
 from kollacli.ansible import properties
+from kollacli.exceptions import CommandError
+from kollacli import utils
 
 from cliff.command import Command
 from cliff.lister import Lister
 
 
 class PropertySet(Command):
-    "Property Set"
+    """Property Set
+
+    Set one property, or many properties from a yml file. The file holds
+    a mapping of property name to value. A property with no value (~)
+    is cleared.
+    """
 
     log = logging.getLogger(__name__)
 
     def get_parser(self, prog_name):
         parser = super(PropertySet, self).get_parser(prog_name)
-        parser.add_argument('propertyname', metavar='<propertyname>',
+        parser.add_argument('propertyname', nargs='?',
+                            metavar='<propertyname>',
                             help='propertyname')
-        parser.add_argument('propertyvalue', metavar='<propertyvalue',
+        parser.add_argument('propertyvalue', nargs='?',
+                            metavar='<propertyvalue',
                             help='propertyvalue')
+        parser.add_argument('--file', nargs='?', metavar='<file_path>',
+                            help='absolute path to a yml file of ' +
+                                 'properties to set')
         return parser
 
     def take_action(self, parsed_args):
         try:
+            if parsed_args.file:
+                if parsed_args.propertyname or parsed_args.propertyvalue:
+                    raise CommandError('A property and a file cannot ' +
+                                       'both be given')
+                set_properties, clear_keys = self._get_file_properties(
+                    parsed_args.file.strip())
+                # one locked read and write of globals.yml, without
+                # loading all of the property files
+                properties.AnsibleProperties.change_properties(
+                    set_properties, clear_keys)
+                return
+
+            if (parsed_args.propertyname is None or
+                    parsed_args.propertyvalue is None):
+                raise CommandError('A property name and value, or a ' +
+                                   'file, are required')
             property_name = parsed_args.propertyname.strip()
             property_value = parsed_args.propertyvalue.strip()
 
             ansible_properties = properties.AnsibleProperties()
             ansible_properties.set_property(property_name, property_value)
+        except CommandError as e:
+            raise e
         except Exception:
             raise Exception(traceback.format_exc())
 
+    def _get_file_properties(self, path):
+        """return (dict of properties to set, list of properties to clear)
+
+        Both are in the order of the file, so new properties are added to
+        globals.yml in that order.
+        """
+        if not os.path.isfile(path):
+            raise CommandError('No file exists at %s. ' % path +
+                               'An absolute file path is required.')
+        with open(path, 'r') as properties_file:
+            file_properties = utils.yaml_load(properties_file, ordered=True)
+        if not isinstance(file_properties, dict):
+            raise CommandError('%s does not contain a mapping of ' % path +
+                               'property names to values')
+
+        set_properties = OrderedDict()
+        clear_keys = []
+        for name, value in file_properties.items():
+            if value is None:
+                clear_keys.append(name)
+            elif isinstance(value, bool):
+                # unquoted yes and no are read as booleans
+                set_properties[name] = 'yes' if value else 'no'
+            elif isinstance(value, (list, dict)):
+                raise CommandError('Property (%s) value must be a ' % name +
+                                   'string, number or boolean')
+            else:
+                set_properties[name] = ('%s' % value).strip()
+        return set_properties, clear_keys
+
 
 class PropertyClear(Command):
     "Property Clear"
@@ -0,0 +1,91 @@
+# Copyright(c) 2015, Oracle and/or its affiliates.  All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+import logging
+import traceback
+
+from kollacli.ansible import settings
+from kollacli.exceptions import CommandError
+
+from cliff.command import Command
+from cliff.lister import Lister
+
+
+class SettingSet(Command):
+    """Set an ansible setting
+
+    The settings are forks, pipelining, control_persist, strategy and
+    inventory_format.
+    """
+
+    log = logging.getLogger(__name__)
+
+    def get_parser(self, prog_name):
+        parser = super(SettingSet, self).get_parser(prog_name)
+        parser.add_argument('settingname', metavar='<settingname>',
+                            help='settingname')
+        parser.add_argument('settingvalue', metavar='<settingvalue>',
+                            help='settingvalue')
+        return parser
+
+    def take_action(self, parsed_args):
+        try:
+            setting_name = parsed_args.settingname.strip()
+            setting_value = parsed_args.settingvalue.strip()
+
+            ansible_settings = settings.AnsibleSettings()
+            ansible_settings.set_setting(setting_name, setting_value)
+        except CommandError as e:
+            raise e
+        except Exception:
+            raise Exception(traceback.format_exc())
+
+
+class SettingClear(Command):
+    """Clear an ansible setting"""
+
+    log = logging.getLogger(__name__)
+
+    def get_parser(self, prog_name):
+        parser = super(SettingClear, self).get_parser(prog_name)
+        parser.add_argument('settingname', metavar='<settingname>',
+                            help='settingname')
+        return parser
+
+    def take_action(self, parsed_args):
+        try:
+            setting_name = parsed_args.settingname.strip()
+
+            ansible_settings = settings.AnsibleSettings()
+            ansible_settings.clear_setting(setting_name)
+        except CommandError as e:
+            raise e
+        except Exception:
+            raise Exception(traceback.format_exc())
+
+
+class SettingList(Lister):
+    """List all ansible settings"""
+
+    log = logging.getLogger(__name__)
+
+    def take_action(self, parsed_args):
+        ansible_settings = settings.AnsibleSettings()
+        data = []
+        for name, value in sorted(ansible_settings.get_all().items()):
+            if value is None:
+                value = ''
+            elif isinstance(value, bool):
+                value = 'yes' if value else 'no'
+            data.append((name, value))
+        return (('Setting Name', 'Setting Value'), data)
@@ -14,6 +14,8 @@
 import logging
 import os.path
 import paramiko
+import select
+import time
 import traceback
 
 from distutils.version import StrictVersion
@@ -22,24 +24,85 @@ from kollacli.exceptions import CommandError
 from kollacli.utils import get_admin_user
 from kollacli.utils import get_kollacli_etc
 from kollacli.utils import get_setup_user
+from kollacli.utils import run_host_tasks
 
 MIN_DOCKER_VERSION = '1.8.1'
 
+SSH_PORT = 22
 
-def ssh_connect(net_addr, username, password):
+# seconds to wait for output before checking for exited commands
+SSH_EXEC_POLL_INTERVAL = 0.1
+
+SSH_RECV_SIZE = 32768
+
+# paramiko added the auth_timeout connect argument in 2.2, older
+# versions wait for authentication for as long as the server allows
+PARAMIKO_AUTH_TIMEOUT = paramiko.__version_info__ >= (2, 2)
+
+# commands that check a host meets the requirements of kolla
+HOST_CHECK_CMDS = ['docker --version',
+                   'docker info',
+                   'python -c "import docker"']
+
+
+def ssh_connect(net_addr, username, password, port=SSH_PORT, timeout=None):
+    ssh_client = None
     try:
         logging.getLogger('paramiko').setLevel(logging.WARNING)
         ssh_client = paramiko.SSHClient()
         ssh_client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        ssh_client.connect(hostname=net_addr, username=username,
-                           password=password)
+        timeouts = {'timeout': timeout, 'banner_timeout': timeout}
+        if PARAMIKO_AUTH_TIMEOUT:
+            timeouts['auth_timeout'] = timeout
+        ssh_client.connect(hostname=net_addr, port=port, username=username,
+                           password=password, **timeouts)
         return ssh_client
     except Exception:
         _close_ssh_client(ssh_client)
         raise Exception(traceback.format_exc())
 
 
-def ssh_setup_host(net_addr, password, setup_user=None):
+def ssh_setup_hosts(hosts_info, parallel=1, timeout=None, retries=0,
+                    retry_delay=1, pre_checks=False):
+    """setup multiple hosts over ssh
+
+    hosts_info is a dict of format:
+    {'hostname1': {
+        'password': password
+        'uname': user_name
+        'port': ssh_port
+        }
+    }
+    The uname and port entries are optional.
+
+    Up to parallel hosts are set up at the same time. A host that takes
+    more than timeout seconds fails, and a failed host is tried again up
+    to retries times, unless it timed out.
+
+    If pre_checks is true, the host checks are run along with the setup
+    of each host, and a host that fails them fails.
+
+    return dict of hostname to error message for hosts that failed,
+    as in Inventory.setup_hosts
+    """
+    failed_hosts = {}
+    host_args = {}
+    for hostname, host_info in hosts_info.items():
+        if not host_info or 'password' not in host_info:
+            failed_hosts[hostname] = 'No password in yml file'
+            continue
+        host_args[hostname] = (host_info['password'],
+                               host_info.get('uname'),
+                               host_info.get('port', SSH_PORT),
+                               timeout, pre_checks)
+    failed_hosts.update(run_host_tasks(ssh_setup_host, host_args, parallel,
+                                       timeout, retries, retry_delay,
+                                       description='Host ssh setup'))
+    return failed_hosts
+
+
+def ssh_setup_host(net_addr, password, setup_user=None, port=SSH_PORT,
+                   timeout=None, pre_checks=False):
     log = logging.getLogger(__name__)
     admin_user = get_admin_user()
     if setup_user is None:
@@ -48,17 +111,30 @@ def ssh_setup_host(net_addr, password, setup_user=None):
     ssh_client = None
 
     try:
-        ssh_client = ssh_connect(net_addr, setup_user, password)
+        ssh_client = ssh_connect(net_addr, setup_user, password, port,
+                                 timeout)
 
-        # before modifying the host, check that it meets requirements
-        # TODO(bmace) pre / post checks should be done with ansible
-
-        # populate authorized keys file w/ public key
+        # populate authorized keys file w/ public key, unless it is
+        # there already, so setup can be run again on a host
         key_dir = os.path.join(os.path.expanduser('~kolla'),
                                '.ssh', 'authorized_keys')
-        cmd = ('/usr/bin/sudo su - %s -c "echo \'%s\' >> %s"'
-               % (admin_user, public_key, key_dir))
-        _exec_ssh_cmd(cmd, ssh_client, log)
+        public_key = public_key.strip()
+        cmd = ('/usr/bin/sudo su - %s -c "grep -qxF \'%s\' %s || '
+               'echo \'%s\' >> %s"'
+               % (admin_user, public_key, key_dir, public_key, key_dir))
+
+        # TODO(bmace) pre / post checks should be done with ansible
+        if pre_checks:
+            # the host checks and the key cost one round trip together.
+            # sudo may need a tty, the checks must not have one, as a pty
+            # merges stderr into stdout.
+            results = ssh_exec_cmds(HOST_CHECK_CMDS + [cmd], ssh_client, log,
+                                    get_pty=[False] * len(HOST_CHECK_CMDS) +
+                                    [True], timeout=timeout)
+            _pre_setup_checks(results, log)
+        else:
+            ssh_exec_cmds([cmd], ssh_client, log, get_pty=[True],
+                          timeout=timeout)
 
         # TODO(bmace) verify ssh connection to the new account
     except Exception as e:
@@ -67,53 +143,35 @@ def ssh_setup_host(net_addr, password, setup_user=None):
         _close_ssh_client(ssh_client)
 
 
-def _pre_setup_checks(ssh_client, log):
-        cmd = 'docker --version'
-        msg, errmsg = _exec_ssh_cmd(cmd, ssh_client, log)
-        if errmsg:
-            raise CommandError("'%s' failed. Is docker installed? : %s"
-                               % (cmd, errmsg))
-        if 'Docker version' not in msg:
-            raise CommandError("'%s' failed. Is docker installed? : %s"
-                               % (cmd, msg))
-
-        version = msg.split('version ')[1].split(',')[0]
-        if StrictVersion(version) < StrictVersion(MIN_DOCKER_VERSION):
-            raise CommandError('docker version (%s) below minimum (%s)'
-                               % (version, msg))
-
-        # docker is installed, now check if it is running
-        cmd = 'docker info'
-        _, errmsg = _exec_ssh_cmd(cmd, ssh_client, log)
-        # docker info can return warning messages in stderr, ignore them
-        if errmsg and 'WARNING' not in errmsg:
-            raise CommandError("'%s' failed. Is docker running? : %s"
-                               % (cmd, errmsg))
-
-        # check for docker-py
-        cmd = 'python -c "import docker"'
-        msg, errmsg = _exec_ssh_cmd(cmd, ssh_client, log)
-        if errmsg:
-            raise CommandError('host check failed. ' +
-                               'Is docker-py installed?')
-
-
-def _post_setup_checks(net_addr, log):
-    try:
-        ssh_client = ssh_connect(net_addr, get_admin_user(), '')
+def _pre_setup_checks(results, log):
+    """check the results of HOST_CHECK_CMDS, as from ssh_exec_cmds"""
+    version_cmd, info_cmd, _ = HOST_CHECK_CMDS
 
-    except Exception as e:
-        raise CommandError("remote login failed : %s" % e)
+    msg, errmsg = results[0]
+    if errmsg:
+        raise CommandError("'%s' failed. Is docker installed? : %s"
+                           % (version_cmd, errmsg))
+    if 'Docker version' not in msg:
+        raise CommandError("'%s' failed. Is docker installed? : %s"
+                           % (version_cmd, msg))
 
-    try:
-        # a basic test
-        ssh_client.exec_command('ls')
+    version = msg.split('version ')[1].split(',')[0]
+    if StrictVersion(version) < StrictVersion(MIN_DOCKER_VERSION):
+        raise CommandError('docker version (%s) below minimum (%s)'
+                           % (version, msg))
 
-    except Exception as e:
-        raise CommandError("remote command 'ls' failed : %s" % e)
+    # docker is installed, now check if it is running
+    _, errmsg = results[1]
+    # docker info can return warning messages in stderr, ignore them
+    if errmsg and 'WARNING' not in errmsg:
+        raise CommandError("'%s' failed. Is docker running? : %s"
+                           % (info_cmd, errmsg))
 
-    finally:
-        _close_ssh_client(ssh_client)
+    # check for docker-py
+    _, errmsg = results[2]
+    if errmsg:
+        raise CommandError('host check failed. ' +
+                           'Is docker-py installed?')
 
 
 def _close_ssh_client(ssh_client):
@@ -124,15 +182,71 @@ def _close_ssh_client(ssh_client):
             pass
 
 
-def _exec_ssh_cmd(cmd, ssh_client, log):
-    log.debug(cmd)
-    _, stdout, stderr = ssh_client.exec_command(cmd, get_pty=True)
-    msg = stdout.read()
-    errmsg = stderr.read()
-    log.debug('%s : %s' % (msg, errmsg))
-    if errmsg:
-        log.warn('WARNING: command (%s) message : %s' % (cmd, errmsg.strip()))
-    return msg, errmsg
+def ssh_exec_cmds(cmds, ssh_client, log, get_pty=False, timeout=None):
+    """run commands at the same time over one ssh transport
+
+    Each command gets its own channel on the transport of ssh_client, so
+    the commands cost one round trip rather than one each.
+
+    get_pty is a bool for all of the commands, or a list of bools in the
+    order of cmds. The ssh server merges the stderr of a command that
+    has a pty into its stdout.
+
+    If the commands have not all finished after timeout seconds, their
+    channels are closed and an exception is raised.
+
+    return list of (msg, errmsg) in the order of cmds
+    """
+    if not isinstance(get_pty, list):
+        get_pty = [get_pty] * len(cmds)
+    deadline = None
+    if timeout:
+        deadline = time.time() + timeout
+    transport = ssh_client.get_transport()
+    channels = []
+    try:
+        for cmd, cmd_pty in zip(cmds, get_pty):
+            log.debug(cmd)
+            channel = transport.open_session()
+            channels.append(channel)
+            if cmd_pty:
+                channel.get_pty()
+            channel.exec_command(cmd)
+
+        outputs = [([], []) for _ in cmds]
+        running = list(range(len(channels)))
+        while running:
+            if deadline and time.time() > deadline:
+                raise Exception('Commands did not finish in %s seconds'
+                                % timeout)
+            select.select([channels[i] for i in running], [], [],
+                          SSH_EXEC_POLL_INTERVAL)
+            for i in list(running):
+                channel = channels[i]
+                while channel.recv_ready():
+                    outputs[i][0].append(channel.recv(SSH_RECV_SIZE))
+                while channel.recv_stderr_ready():
+                    outputs[i][1].append(
+                        channel.recv_stderr(SSH_RECV_SIZE))
+                # the exit status arrives after all of the output
+                if (channel.exit_status_ready() and
+                        not channel.recv_ready() and
+                        not channel.recv_stderr_ready()):
+                    running.remove(i)
+    finally:
+        for channel in channels:
+            channel.close()
+
+    results = []
+    for cmd, (out, err) in zip(cmds, outputs):
+        msg = ''.join(out)
+        errmsg = ''.join(err)
+        log.debug('%s : %s' % (msg, errmsg))
+        if errmsg:
+            log.warn('WARNING: command (%s) message : %s'
+                     % (cmd, errmsg.strip()))
+        results.append((msg, errmsg))
+    return results
 
 
 def ssh_get_public_key():
@@ -11,13 +11,66 @@
 #    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
 #    License for the specific language governing permissions and limitations
 #    under the License.
+import errno
 import fcntl
 import logging
 import os
-import pexpect
 import pwd
+import re
+import shlex
+import signal
+import subprocess
+import tempfile
+import threading
+import time
 import yaml
 
+from collections import deque
+from collections import OrderedDict
+from six.moves import queue
+
+# a top level key of a yaml mapping, e.g.
+#   key: value
+#   "key":
+YAML_KEY_RE = re.compile(r'^(?!- )([\'"]?)([^\s#\'"][^:\'"]*)\1\s*:(\s|$)')
+
+# the libyaml C parser and emitter are much faster than the pure python
+# ones, but libyaml may not be installed
+try:
+    from yaml import CSafeDumper as YamlDumper
+    from yaml import CSafeLoader as YamlLoader
+except ImportError:
+    from yaml import SafeDumper as YamlDumper
+    from yaml import SafeLoader as YamlLoader
+
+# sudo output when it needs a password. With no terminal to prompt on,
+# sudo fails with one of the later messages instead. The last is from a
+# sudoers file with requiretty set.
+SUDO_PROMPTS = [
+    '[sudo] password',
+    'no tty present',
+    'a terminal is required',
+    'you must have a tty to run sudo',
+    ]
+
+# the lecture that sudo may print before its password prompt
+SUDO_LECTURE = [
+    'We trust you have received the usual lecture',
+    'Administrator. It usually boils down to these',
+    '#1) Respect the privacy of others.',
+    '#2) Think before you type.',
+    '#3) With great power comes great responsibility.',
+    ]
+
+# runs a command in a new session. The session is started by a command
+# rather than by a preexec_fn, which is not safe in a python 2 process
+# that has threads.
+SETSID_PATH = '/usr/bin/setsid'
+
+# prefix of the properties that turn a service on or off, e.g.
+#   enable_nova: "yes"
+ENABLE_KEY_PREFIX = 'enable_'
+
 
 def get_kolla_home():
     return os.environ.get("KOLLA_HOME", "/usr/share/kolla/")
@@ -51,6 +104,32 @@ def get_kolla_log_file_size():
     return os.environ.get('KOLLA_LOG_FILE_SIZE', 500000)
 
 
+def get_cmd_output_lines():
+    return int(os.environ.get('KOLLA_CLI_CMD_OUTPUT_LINES', 10000))
+
+
+def get_inventory_format():
+    return os.environ.get("KOLLA_CLI_INVENTORY_FORMAT", "script")
+
+
+def get_ansible_version():
+    """return the installed ansible version as a tuple of ints
+
+    return None if ansible cannot be imported
+    """
+    try:
+        from ansible import __version__ as ansible_version
+    except ImportError:
+        return None
+    version = []
+    for part in ansible_version.split('.'):
+        match = re.match(r'\d+', part)
+        if not match:
+            break
+        version.append(int(match.group()))
+    return tuple(version)
+
+
 def get_admin_user():
     return os.environ.get("KOLLA_CLI_ADMIN_USER", "kolla")
 
@@ -68,11 +147,45 @@ def get_pk_bits():
     return 1024
 
 
+class _OrderedYamlLoader(YamlLoader):
+    """yaml loader that keeps the order of mapping keys"""
+
+
+def _construct_ordered_mapping(loader, node):
+    loader.flatten_mapping(node)
+    return OrderedDict(loader.construct_pairs(node))
+
+
+_OrderedYamlLoader.add_constructor(
+    yaml.resolver.BaseResolver.DEFAULT_MAPPING_TAG,
+    _construct_ordered_mapping)
+
+
+def yaml_load(stream, ordered=False):
+    """parse yaml from a string or file
+
+    All yaml in kollacli is parsed here, with the libyaml C parser if
+    it is available. If ordered, mappings are OrderedDicts in the order
+    of their keys in the yaml.
+    """
+    if ordered:
+        return yaml.load(stream, Loader=_OrderedYamlLoader)
+    return yaml.load(stream, Loader=YamlLoader)
+
+
+def yaml_dump(data, stream=None, **kwargs):
+    """emit data as yaml
+
+    return yaml string if stream is None
+    """
+    return yaml.dump(data, stream, Dumper=YamlDumper, **kwargs)
+
+
 def load_etc_yaml(fileName):
     contents = {}
     try:
         with open(get_kollacli_etc() + fileName, 'r') as f:
-            contents = yaml.load(f)
+            contents = yaml_load(f)
     except Exception:
         # TODO(bmace) if file doesn't exist on a load we don't
         # want to blow up, some better behavior here?
@@ -82,7 +195,7 @@ def load_etc_yaml(fileName):
 
 def save_etc_yaml(fileName, contents):
     with open(get_kollacli_etc() + fileName, 'w') as f:
-        f.write(yaml.dump(contents))
+        f.write(yaml_dump(contents))
 
 
 def convert_to_unicode(the_string):
@@ -99,9 +212,20 @@ def convert_to_unicode(the_string):
     return uni_string
 
 
-def run_cmd(cmd, print_output=True):
+def run_cmd(cmd, print_output=True, line_callback=None, max_lines=None,
+            env=None):
     """run a system command
 
+    Output is read a line at a time, as the command writes it. If
+    line_callback is set, it is called with each line of output as soon
+    as that line is read.
+
+    Only the last max_lines lines of output are kept, so that a long
+    running command does not use unbounded memory. By default this is
+    the value of get_cmd_output_lines().
+
+    env is a dict of extra environment variables for the command.
+
     return:
     - err_msg:  empty string=command succeeded
                 not None=command failed
@@ -110,37 +234,224 @@ def run_cmd(cmd, print_output=True):
     If the command is an ansible playbook command, record the
     output in an ansible log file.
     """
-    pwd_prompt = '[sudo] password'
     log = logging.getLogger(__name__)
+    if max_lines is None:
+        max_lines = get_cmd_output_lines()
     err_msg = ''
-    output = ''
-    child = None
+    lines = deque(maxlen=max_lines)
+    line_count = 0
+    process = None
+    new_session = False
+    interrupted = False
     try:
-        child = pexpect.spawn(cmd)
-        sniff = child.read(len(pwd_prompt))
-        if sniff == pwd_prompt:
-            output = sniff + '\n'
-            raise Exception(
-                'Insufficient permissions to run command "%s"' % cmd)
-        child.maxsize = 1
-        child.timeout = 86400
-        for line in child:
-            outline = sniff + line.rstrip()
-            sniff = ''
-            output = ''.join([output, outline, '\n'])
+        # the command runs in a new session, so sudo can not prompt for
+        # a password on the terminal and wait there forever.
+        cmd_env = dict(os.environ, PYTHONUNBUFFERED='1')
+        if env:
+            cmd_env.update(env)
+        if isinstance(cmd, unicode):
+            # shlex does not support unicode
+            cmd = cmd.encode('utf-8')
+        args = shlex.split(cmd)
+        if os.path.exists(SETSID_PATH):
+            args.insert(0, SETSID_PATH)
+            new_session = True
+        process = subprocess.Popen(args,
+                                   stdin=subprocess.PIPE,
+                                   stdout=subprocess.PIPE,
+                                   stderr=subprocess.STDOUT,
+                                   close_fds=True,
+                                   env=cmd_env)
+        process.stdin.close()
+        # sudo prompts before the command writes anything, possibly after
+        # its lecture
+        before_output = True
+        for line in iter(process.stdout.readline, ''):
+            outline = line.rstrip()
+            if before_output:
+                if _is_sudo_prompt(outline):
+                    lines.append(outline)
+                    raise Exception(
+                        'Insufficient permissions to run command "%s"'
+                        % cmd)
+                before_output = _is_sudo_lecture(outline)
+            line_count += 1
+            lines.append(outline)
             if print_output:
                 log.info(outline)
+            if line_callback:
+                line_callback(outline)
 
     except Exception as e:
         err_msg = '%s' % e
+    except BaseException:
+        # ctrl-c, stop the command before giving up on it
+        interrupted = True
+        raise
     finally:
-        if child:
-            child.close()
-            if child.exitstatus != 0:
+        if process:
+            if process.poll() is None and (err_msg or interrupted):
+                _kill_process_group(process, new_session)
+            process.stdout.close()
+            if process.wait() != 0:
                 err_msg = 'Command Failed %s' % err_msg
+
+    output_lines = list(lines)
+    if line_count > len(output_lines):
+        output_lines.insert(0, '(%s earlier lines of output not kept)'
+                            % (line_count - len(output_lines)))
+    output = ''.join('%s\n' % line for line in output_lines)
     return err_msg, output
 
 
+def _kill_process_group(process, new_session=True):
+    """stop a command and the commands it started
+
+    A command that leads its own session has a process group with the
+    same id as the command. Without a session, only the command is
+    stopped.
+    """
+    try:
+        if new_session:
+            os.killpg(process.pid, signal.SIGTERM)
+        else:
+            process.terminate()
+    except OSError as e:
+        # the command already exited
+        if e.errno != errno.ESRCH:
+            raise e
+
+
+def _is_sudo_lecture(line):
+    """true if line is blank or a line of the sudo lecture"""
+    line = line.strip()
+    if not line:
+        return True
+    for lecture_line in SUDO_LECTURE:
+        if line.startswith(lecture_line):
+            return True
+    return False
+
+
+def _is_sudo_prompt(line):
+    """true if sudo wants a password that it cannot be given"""
+    for prompt in SUDO_PROMPTS:
+        if prompt in line:
+            return True
+    return False
+
+
+def run_host_tasks(task, host_args, parallel=1, timeout=None, retries=0,
+                   retry_delay=1, description='Host task', max_failures=None):
+    """run task(hostname, *args) for many hosts from a pool of threads
+
+    host_args is a dict of hostname to the args tuple for that host.
+    Hosts are started in the iteration order of host_args.
+
+    Up to parallel hosts are run at the same time. An attempt that takes
+    more than timeout seconds fails. A failed host is tried again up to
+    retries times, waiting retry_delay seconds before the first retry
+    and twice as long before each later one. A host whose attempt timed
+    out is not tried again, as that attempt may still be running. The
+    task should be given the timeout too, so that it stops on its own.
+
+    Once more than max_failures hosts have failed, no more hosts are
+    started. The hosts that were not started are reported as failed.
+
+    return dict of hostname to error message for hosts that failed
+    """
+    log = logging.getLogger(__name__)
+    work_queue = queue.Queue()
+    for hostname in host_args:
+        work_queue.put(hostname)
+
+    failed_hosts = {}
+    progress = {'done': 0}
+    lock = threading.Lock()
+    host_count = len(host_args)
+
+    def worker():
+        while True:
+            try:
+                hostname = work_queue.get_nowait()
+            except queue.Empty:
+                return
+            with lock:
+                if (max_failures is not None and
+                        len(failed_hosts) > max_failures):
+                    failed_hosts[hostname] = ('Not run, more than %s failed'
+                                              % max_failures)
+                    continue
+            err_msg = None
+            delay = retry_delay
+            for attempt in range(retries + 1):
+                if attempt:
+                    log.info('%s of host (%s) failed, retry %s of %s in '
+                             '%s seconds: %s'
+                             % (description, hostname, attempt, retries,
+                                delay, err_msg))
+                    time.sleep(delay)
+                    delay *= 2
+                try:
+                    _run_with_timeout(task, (hostname,) + host_args[hostname],
+                                      timeout)
+                    err_msg = None
+                    break
+                except _TaskTimeout as e:
+                    err_msg = '%s' % e
+                    break
+                except Exception as e:
+                    err_msg = '%s' % e
+            with lock:
+                if err_msg:
+                    failed_hosts[hostname] = err_msg
+                progress['done'] += 1
+                log.info('%s progress: %s of %s done, %s failed'
+                         % (description, progress['done'], host_count,
+                            len(failed_hosts)))
+
+    threads = []
+    for _ in range(min(parallel, host_count)):
+        thread = threading.Thread(target=worker)
+        thread.daemon = True
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        # join with a timeout so that ctrl-c is not blocked
+        while thread.is_alive():
+            thread.join(1)
+    return failed_hosts
+
+
+class _TaskTimeout(Exception):
+    pass
+
+
+def _run_with_timeout(func, args, timeout):
+    if not timeout:
+        func(*args)
+        return
+
+    errors = []
+
+    def target():
+        try:
+            func(*args)
+        except Exception as e:
+            errors.append(e)
+
+    # the thread cannot be stopped, if it times out it is left to finish
+    # on its own, in the background
+    thread = threading.Thread(target=target)
+    thread.daemon = True
+    thread.start()
+    thread.join(timeout)
+    if thread.is_alive():
+        raise _TaskTimeout('Timed out after %s seconds' % timeout)
+    if errors:
+        raise errors[0]
+
+
 def change_property(file_path, property_key, property_value, clear=False):
     """change property with a file
 
@@ -154,41 +465,161 @@ def change_property(file_path, property_key, property_value, clear=False):
     If not clear, and key is not found, the new property will be appended.
     If not clear, and key is found, edit property in place.
     """
-    try:
-        new_contents = []
-        read_data = sync_read_file(file_path)
-        lines = read_data.split('\n')
-        new_line = '%s: "%s"' % (property_key, property_value)
-        property_key_found = False
-        last_line_empty = False
-        for line in lines:
-            line = line.rstrip()
-
-            # yank spurious empty lines
-            if line:
-                last_line_empty = False
+    if clear:
+        change_properties(file_path, clear_keys=[property_key])
+    else:
+        change_properties(file_path, {property_key: property_value})
+
+
+def change_properties(file_path, set_properties=None, clear_keys=None):
+    """set and clear many properties of a property file in one rewrite
+
+    set_properties:    dict of property name to value
+    clear_keys:        list of property names to remove
+
+    The file is locked while it is read, edited and written. If this
+    user owns the file and can write its directory, it is replaced
+    atomically, keeping its group and permissions. Otherwise it is
+    rewritten in place.
+    """
+    while True:
+        with open(file_path, 'r+') as prop_file:
+            fcntl.flock(prop_file, fcntl.LOCK_EX)
+            file_stat = os.fstat(prop_file.fileno())
+            if file_stat.st_ino != os.stat(file_path).st_ino:
+                # replaced while waiting for the lock, lock the new file
+                continue
+            editor = PropertyFileEditor(prop_file.read())
+            for key, value in (set_properties or {}).items():
+                editor.set(key, value)
+            for key in clear_keys or []:
+                editor.clear(key)
+            if not editor.is_changed():
+                return
+            data = editor.get_data()
+            file_dir = os.path.dirname(os.path.abspath(file_path))
+            if (file_stat.st_uid == os.getuid() and
+                    os.access(file_dir, os.W_OK)):
+                try:
+                    atomic_write_file(file_path, data,
+                                      file_stat.st_mode & 0o7777,
+                                      (file_stat.st_uid, file_stat.st_gid))
+                    return
+                except OSError as e:
+                    # this user cannot give the file its group
+                    if e.errno != errno.EPERM:
+                        raise e
+            prop_file.seek(0)
+            prop_file.truncate()
+            prop_file.write(data)
+            return
+
+
+class PropertyFileEditor(object):
+    """edit the top level keys of a yaml property file
+
+    The lines of each key, and the value lines that follow it, are
+    indexed once. Sets and clears are then applied together by
+    get_data(). All other lines, such as comments, are kept as they are
+    and in the same order. New keys are added at the end of the file.
+    """
+
+    def __init__(self, data):
+        self.lines = data.split('\n')
+
+        # key to list of (start, end) line spans, one per time the key
+        # is in the file
+        self.spans = OrderedDict()
+        self._changes = OrderedDict()
+        self._index()
+
+    def _index(self):
+        key = None
+        for i, line in enumerate(self.lines):
+            match = YAML_KEY_RE.match(line)
+            if match:
+                key = match.group(2).rstrip()
+                self.spans.setdefault(key, []).append([i, i + 1])
+            elif line.startswith('---') or line.startswith('...'):
+                key = None
+            elif key and line.strip() and not line.startswith('#'):
+                # an indented or list value line of the key, comment and
+                # blank lines only belong to a key if value lines follow
+                self.spans[key][-1][1] = i + 1
+
+    def has_key(self, key):
+        return key in self.spans
+
+    def set(self, key, value):
+        value = ('%s' % value).replace('\\', '\\\\').replace('"', '\\"')
+        self._changes[key] = '%s: "%s"' % (key, value)
+
+    def clear(self, key):
+        if key in self.spans:
+            self._changes[key] = None
+        else:
+            self._changes.pop(key, None)
+
+    def is_changed(self):
+        return bool(self._changes)
+
+    def get_data(self):
+        """return the file data with the changes applied"""
+        replaced = {}
+        added = []
+        for key, new_line in self._changes.items():
+            if key not in self.spans:
+                added.append(new_line)
+                continue
+            # the first line of the key is replaced, duplicates are removed
+            for i, (start, end) in enumerate(self.spans[key]):
+                replaced[start] = (end, new_line if i == 0 else None)
+
+        new_lines = []
+        i = 0
+        while i < len(self.lines):
+            if i in replaced:
+                i, new_line = replaced[i]
+                if new_line is not None:
+                    new_lines.append(new_line)
+                continue
+            new_lines.append(self.lines[i])
+            i += 1
+        if added:
+            if new_lines and not new_lines[-1]:
+                # keep the file ending with a newline
+                new_lines[-1:-1] = added
             else:
-                if last_line_empty:
-                    continue
-                last_line_empty = True
+                new_lines.extend(added)
+        return '\n'.join(new_lines)
 
-            if line[0:len(property_key)] == property_key:
-                property_key_found = True
-                if clear:
-                    # clear existing property
-                    continue
-                # edit existing property
-                line = new_line
-            new_contents.append(line)
-        if not property_key_found and not clear:
-            # add new property to file
-            new_contents.append(new_line)
 
-        write_data = '\n'.join(new_contents)
-        sync_write_file(file_path, write_data)
+def get_relevant_values(values, name, names):
+    """return the values whose keys are about name
 
-    except Exception as e:
-        raise e
+    A key is about the one of names that it is prefixed with, as in
+    nova_api_port or enable_nova. The longest such name wins. A key that
+    is prefixed with none of names is about every name.
+    """
+    relevant = {}
+    for key, value in values.items():
+        key_name = _get_key_name(key, names)
+        if key_name is None or key_name == name:
+            relevant[key] = value
+    return relevant
+
+
+def _get_key_name(key, names):
+    """return the one of names that key is prefixed with, or None"""
+    key = key.lower()
+    if key.startswith(ENABLE_KEY_PREFIX):
+        key = key[len(ENABLE_KEY_PREFIX):]
+    key_name = None
+    for name in names:
+        if key == name or key.startswith(name + '_'):
+            if key_name is None or len(name) > len(key_name):
+                key_name = name
+    return key_name
 
 
 def sync_read_file(path, mode='r'):
@@ -213,3 +644,26 @@ def sync_write_file(path, data, mode='w'):
             data_file.write(data)
     except Exception as e:
         raise e
+
+
+def atomic_write_file(path, data, permissions=0o664, owner=None):
+    """write file by replacing it
+
+    The data is written to a temporary file in the same directory, which
+    is then renamed over path. Readers see either the old or the new file,
+    never a partially written one. owner is a (uid, gid) to give the new
+    file, if given.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path),
+                                    prefix='.%s.' % os.path.basename(path))
+    try:
+        with os.fdopen(fd, 'w') as tmp_file:
+            tmp_file.write(data)
+        if owner:
+            os.chown(tmp_path, owner[0], owner[1])
+        os.chmod(tmp_path, permissions)
+        os.rename(tmp_path, path)
+    except Exception as e:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise e
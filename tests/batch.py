@@ -0,0 +1,124 @@
+# Copyright(c) 2015, Oracle and/or its affiliates.  All Rights Reserved.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License"); you may
+#   not use this file except in compliance with the License. You may obtain
+#   a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#   WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#   License for the specific language governing permissions and limitations
+#   under the License.
+#
+from common import KollaCliTest
+
+import json
+import os
+import tempfile
+import unittest
+
+from kollacli.ansible.inventory import ANSIBLE_CONNECTION
+from kollacli.ansible.inventory import Inventory
+from kollacli.exceptions import CommandError
+from kollacli.utils import yaml_dump
+
+TEST_BATCH_FNAME = 'unittest_batch'
+
+
+class TestFunctional(KollaCliTest):
+
+    def test_batch_lines(self):
+        host1 = 'test_batch_host1'
+        host2 = 'test_batch_host2'
+        group1 = 'test_batch_group1'
+
+        path = self.write_batch_file(
+            '.txt',
+            '# add hosts and groups\n'
+            'host add %s\n'
+            'host add %s\n'
+            '\n'
+            'group add %s\n'
+            'group addhost %s %s\n'
+            'group addhost control %s\n'
+            'service addgroup nova %s\n'
+            % (host1, host2, group1, group1, host1, host2, group1))
+        self.run_cli_cmd('batch %s' % path)
+
+        group_hosts = self.get_group_hosts()
+        self.assertEqual([host1], group_hosts[group1])
+        self.assertEqual([host2], group_hosts['control'])
+
+        msg = self.run_cli_cmd('service listgroups -f json')
+        for cli_service in json.loads(msg):
+            if cli_service['Service'] == 'nova':
+                self.assertIn(group1, cli_service['Groups'])
+
+    def test_batch_yml(self):
+        host1 = 'test_batch_host1'
+
+        path = self.write_batch_file(
+            '.yml',
+            yaml_dump(['host add %s' % host1,
+                       ['group', 'addhost', 'compute', host1]]))
+        self.run_cli_cmd('batch %s' % path)
+
+        group_hosts = self.get_group_hosts()
+        self.assertEqual([host1], group_hosts['compute'])
+
+    def test_batch_errors(self):
+        host1 = 'test_batch_host1'
+
+        # an invalid command, nothing is applied
+        path = self.write_batch_file(
+            '.txt',
+            'host add %s\n'
+            'host frobnicate %s\n' % (host1, host1))
+        msg = self.run_cli_cmd('batch %s' % path, True)
+        self.assertIn('ERROR', msg, 'invalid command did not error')
+
+        # a command that fails against the inventory, nothing is applied
+        path = self.write_batch_file(
+            '.txt',
+            'host add %s\n'
+            'group addhost not_a_group %s\n' % (host1, host1))
+        msg = self.run_cli_cmd('batch %s' % path, True)
+        self.assertIn('ERROR', msg, 'invalid group did not error')
+
+        msg = self.run_cli_cmd('host list -f json')
+        self.assertNotIn(host1, msg, 'failed batch added a host')
+
+    def test_batch_rollback_vars(self):
+        inventory = Inventory()
+        prior_vars = inventory.get_group('control').get_vars()
+
+        # a failed batch restores the group vars changed by an earlier
+        # operation, as well as the inventory
+        self.assertRaises(CommandError, inventory.apply_operations,
+                          [('set_deploy_mode', [False]),
+                           ('add_host', ['test_batch_host1',
+                                         'not_a_group'])])
+        self.assertTrue(inventory.remote_mode)
+        control_vars = inventory.get_group('control').get_vars()
+        self.assertEqual(prior_vars, control_vars)
+        self.assertNotIn(ANSIBLE_CONNECTION, control_vars)
+
+    def get_group_hosts(self):
+        msg = self.run_cli_cmd('group listhosts -f json')
+        group_hosts = {}
+        for cli_group in json.loads(msg):
+            group_hosts[cli_group['Group']] = cli_group['Hosts']
+        return group_hosts
+
+    def write_batch_file(self, extension, data):
+        fd, path = tempfile.mkstemp(prefix=TEST_BATCH_FNAME + '_',
+                                    suffix=extension)
+        self.addCleanup(os.remove, path)
+        with os.fdopen(fd, 'w') as batch_file:
+            batch_file.write(data)
+        return path
+
+if __name__ == '__main__':
+    unittest.main()
@@ -14,16 +14,21 @@
 #
 import logging
 import os
+import paramiko
 import pxssh
+import socket
 import subprocess
 import sys
+import threading
+import time
 import traceback
-import yaml
 
 import testtools
 
 import kollacli.utils as utils
 
+from kollacli.exceptions import CommandError
+
 TEST_SUFFIX = 'test/'
 VENV_PY_PATH = '.venv/bin/python'
 KOLLA_CMD = 'kollacli'
@@ -52,11 +57,12 @@ class KollaCliTest(testtools.TestCase):
 
         self._set_cmd_prefix()
 
-        # make sure inventory dirs exists and remove inventory file
+        # make sure inventory dirs exists and remove inventory files
         self._init_dir(etc_path)
         etc_ansible_path = os.path.join(etc_path, 'ansible/')
         self._init_dir(etc_ansible_path)
         self._init_file(os.path.join(etc_ansible_path, 'inventory.json'))
+        self._init_file(os.path.join(etc_ansible_path, 'inventory.journal'))
 
     def run_cli_cmd(self, cmd, expect_error=False):
         full_cmd = ('%s %s' % (self.cmd_prefix, cmd))
@@ -201,6 +207,111 @@ class KollaCliTest(testtools.TestCase):
         return groups
 
 
+class SshTestServer(object):
+    """local stand-in ssh server for testing the kollacli ssh code
+
+    Any user can log in with the server password. Commands are run by
+    the local shell, unless run_cmds is false. Then they are only
+    recorded in commands. A login is delayed by login_delay seconds, to
+    imitate a slow host.
+    """
+    def __init__(self, address='127.0.0.1', password='test', login_delay=0,
+                 run_cmds=True):
+        self.address = address
+        self.password = password
+        self.login_delay = login_delay
+        self.run_cmds = run_cmds
+        self.login_attempts = 0
+        self.commands = []
+        self._host_key = paramiko.RSAKey.generate(1024)
+        self._sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self._sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self._sock.bind((address, 0))
+        self.port = self._sock.getsockname()[1]
+        self._transports = []
+        self._running = False
+
+    def start(self):
+        self._sock.listen(100)
+        self._running = True
+        thread = threading.Thread(target=self._accept)
+        thread.daemon = True
+        thread.start()
+
+    def stop(self):
+        self._running = False
+        self._sock.close()
+        for transport in self._transports:
+            transport.close()
+
+    def _accept(self):
+        while self._running:
+            try:
+                client_sock, _ = self._sock.accept()
+            except Exception:
+                return
+            transport = paramiko.Transport(client_sock)
+            transport.add_server_key(self._host_key)
+            self._transports.append(transport)
+            transport.start_server(server=_SshTestServerInterface(self))
+
+
+class _SshTestServerInterface(paramiko.ServerInterface):
+
+    def __init__(self, server):
+        self._server = server
+        self._pty_chanids = set()
+
+    def get_allowed_auths(self, username):
+        return 'password'
+
+    def check_auth_password(self, username, password):
+        self._server.login_attempts += 1
+        if self._server.login_delay:
+            time.sleep(self._server.login_delay)
+        if password != self._server.password:
+            return paramiko.AUTH_FAILED
+        return paramiko.AUTH_SUCCESSFUL
+
+    def check_channel_request(self, kind, chanid):
+        if kind == 'session':
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_pty_request(self, channel, term, width, height,
+                                  pixelwidth, pixelheight, modes):
+        self._pty_chanids.add(channel.get_id())
+        return True
+
+    def check_channel_exec_request(self, channel, command):
+        thread = threading.Thread(target=self._exec, args=(channel, command))
+        thread.daemon = True
+        thread.start()
+        return True
+
+    def _exec(self, channel, command):
+        self._server.commands.append(command)
+        if not self._server.run_cmds:
+            # give the reply to the exec request time to be sent first
+            time.sleep(0.1)
+            channel.send_exit_status(0)
+            channel.close()
+            return
+        # like sshd, a command with a pty has its stderr in its stdout
+        stderr = subprocess.PIPE
+        if channel.get_id() in self._pty_chanids:
+            stderr = subprocess.STDOUT
+        process = subprocess.Popen(command, shell=True,
+                                   stdout=subprocess.PIPE,
+                                   stderr=stderr)
+        out, err = process.communicate()
+        channel.sendall(out)
+        if err:
+            channel.sendall_stderr(err)
+        channel.send_exit_status(process.returncode)
+        channel.close()
+
+
 class TestConfig(object):
     """host systems for testing
 
@@ -258,7 +369,7 @@ class TestConfig(object):
         with open(path, 'r+') as cfg_file:
             yml_data = cfg_file.read()
 
-        test_cfg = yaml.load(yml_data)
+        test_cfg = utils.yaml_load(yml_data)
 
         hosts_info = test_cfg['hosts']
         if hosts_info:
@@ -301,3 +412,22 @@ class TestConfig(object):
         self.log.info(out)
         session.logout()
         return out
+
+
+class StubPlaybook(object):
+    """stands in for AnsiblePlaybook, records the hosts deployed"""
+
+    def __init__(self, fail_hosts):
+        self.fail_hosts = fail_hosts
+        self.deployed = []
+        self.hosts = None
+        self.groups = None
+        self.limit_hosts = None
+        self.services = None
+        self.print_output = True
+
+    def run(self):
+        self.deployed.append(self.limit_hosts)
+        for host in self.limit_hosts:
+            if host in self.fail_hosts:
+                raise CommandError('deploy of %s failed' % host)
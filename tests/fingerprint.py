@@ -0,0 +1,157 @@
+# Copyright(c) 2015, Oracle and/or its affiliates.  All Rights Reserved.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License"); you may
+#   not use this file except in compliance with the License. You may obtain
+#   a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#   WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#   License for the specific language governing permissions and limitations
+#   under the License.
+#
+from common import KollaCliTest
+
+from kollacli.ansible import fingerprints
+from kollacli.ansible.inventory import Inventory
+from kollacli.ansible.inventory import SERVICES
+from kollacli.ansible.properties import ANSIBLE_ROLES_PATH
+from kollacli.utils import get_kolla_etc
+from kollacli.utils import get_kollacli_etc
+from kollacli.utils import get_relevant_values
+
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class TestFunctional(KollaCliTest):
+
+    def test_service_fingerprints(self):
+        path = os.path.join(get_kollacli_etc(),
+                            fingerprints.FINGERPRINTS_PATH)
+        if os.path.exists(path):
+            os.remove(path)
+
+        # the roles are fingerprinted from a stand-in kolla home
+        kolla_home = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, kolla_home)
+        for servicename in SERVICES:
+            os.makedirs(os.path.join(kolla_home, ANSIBLE_ROLES_PATH,
+                                     servicename, 'defaults'))
+        self.addCleanup(setattr, fingerprints, 'get_kolla_home',
+                        fingerprints.get_kolla_home)
+        fingerprints.get_kolla_home = lambda: kolla_home
+
+        servicenames = ['glance', 'neutron', 'nova']
+        pwd_fingerprints = {'nova': '1', 'glance': '2'}
+        inventory = Inventory.load()
+        before = fingerprints.get_fingerprints(inventory, servicenames,
+                                               pwd_fingerprints)
+        self.assertEqual(servicenames,
+                         fingerprints.get_changed_services(before))
+        fingerprints.save_fingerprints(before)
+        self.assertEqual([], fingerprints.get_changed_services(before))
+
+        # a nova password only changes nova
+        pwd_fingerprints['nova'] = '3'
+        after = fingerprints.get_fingerprints(inventory, servicenames,
+                                              pwd_fingerprints)
+        self.assertEqual(['nova'], fingerprints.get_changed_services(after))
+        pwd_fingerprints['nova'] = '1'
+
+        # a rabbitmq password changes the services that need rabbitmq
+        pwd_fingerprints['rabbitmq'] = '4'
+        after = fingerprints.get_fingerprints(inventory, servicenames,
+                                              pwd_fingerprints)
+        self.assertEqual(['neutron', 'nova'],
+                         fingerprints.get_changed_services(after))
+        del pwd_fingerprints['rabbitmq']
+
+        # any file of a role changes its service
+        role_path = os.path.join(kolla_home, ANSIBLE_ROLES_PATH, 'nova',
+                                 'defaults', 'main.yml')
+        with open(role_path, 'w') as role_file:
+            role_file.write('nova_test_default: 1\n')
+        after = fingerprints.get_fingerprints(inventory, servicenames,
+                                              pwd_fingerprints)
+        self.assertEqual(['nova'], fingerprints.get_changed_services(after))
+        os.remove(role_path)
+
+        # so does a configuration override file of the service
+        overrides_dir = os.path.join(get_kolla_etc(),
+                                     fingerprints.CONFIG_OVERRIDES_PATH,
+                                     'nova')
+        created = not os.path.exists(overrides_dir)
+        if created:
+            os.makedirs(overrides_dir)
+        override_path = os.path.join(overrides_dir, 'test_fingerprint.conf')
+        try:
+            with open(override_path, 'w') as override_file:
+                override_file.write('[DEFAULT]\ndebug = True\n')
+            after = fingerprints.get_fingerprints(inventory, servicenames,
+                                                  pwd_fingerprints)
+            self.assertEqual(['nova'],
+                             fingerprints.get_changed_services(after))
+        finally:
+            if created:
+                shutil.rmtree(overrides_dir)
+            else:
+                os.remove(override_path)
+
+        # a group change only changes the services of the group
+        self.run_cli_cmd('host add host_test1')
+        self.run_cli_cmd('group addhost network host_test1')
+        inventory = Inventory.load()
+        after = fingerprints.get_fingerprints(inventory, servicenames,
+                                              pwd_fingerprints)
+        self.assertEqual(['neutron'],
+                         fingerprints.get_changed_services(after))
+
+        # a service deployed without a fingerprint is deployed again
+        fingerprints.clear_fingerprints(['nova'])
+        self.assertEqual(['nova'], fingerprints.get_changed_services(before))
+
+        # fingerprints that cannot be rewritten are removed
+        def fail_write(*args, **kwargs):
+            raise IOError('test write failure')
+        atomic_write_file = fingerprints.atomic_write_file
+        fingerprints.atomic_write_file = fail_write
+        try:
+            fingerprints.clear_fingerprints(['glance'])
+        finally:
+            fingerprints.atomic_write_file = atomic_write_file
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(servicenames,
+                         fingerprints.get_changed_services(before))
+        fingerprints.save_fingerprints(before)
+
+        # a key is about the service it is prefixed with
+        values = {'nova_compute_virt_type': 1, 'enable_nova': 2,
+                  'heat_keystone_user': 3, 'database_password': 4}
+        self.assertEqual(['database_password', 'enable_nova',
+                          'nova_compute_virt_type'],
+                         sorted(get_relevant_values(values, 'nova',
+                                                    SERVICES)))
+        self.assertEqual(['database_password'],
+                         sorted(get_relevant_values(values, 'keystone',
+                                                    SERVICES)))
+
+        # a property that is not about a service changes every service
+        key = 'test_fingerprint_property'
+        try:
+            self.run_cli_cmd('property set %s 1' % key)
+            after = fingerprints.get_fingerprints(inventory, servicenames,
+                                                  pwd_fingerprints)
+            self.assertEqual(servicenames,
+                             fingerprints.get_changed_services(after))
+        finally:
+            self.run_cli_cmd('property clear %s' % key)
+            os.remove(path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -19,7 +19,8 @@ import json
 import os
 import time
 import unittest
-import yaml
+
+from kollacli.utils import yaml_dump
 
 TEST_YML_FNAME = 'unittest_hosts_setup.yml'
 
@@ -167,6 +168,50 @@ class TestFunctional(KollaCliTest):
         msg = self.run_cli_cmd('host setup -f %s' % yml_path, True)
         self.assertIn('ERROR', msg, 'no password for host did not error')
 
+    def test_hosts_setup_parallel(self):
+        """test multi-host parallel setup failure summary"""
+        hostnames = ['host_test1.invalid', 'host_test2.invalid',
+                     'host_test3.invalid']
+        yml_dict = {}
+        for hostname in hostnames:
+            self.run_cli_cmd('host add %s' % hostname)
+            yml_dict[hostname] = {'password': '123'}
+        yml_dict['NOT_HOSTNAME'] = {'password': '123'}
+        self.write_yml(yml_dict)
+        yml_path = self.get_yml_path()
+
+        # every host fails, and every failure is in the summary
+        msg = self.run_cli_cmd('host setup -f %s --parallel 2' % yml_path,
+                               True)
+        self.assertIn('Not all hosts were set up', msg,
+                      'parallel setup did not error: %s' % msg)
+        for hostname in hostnames + ['NOT_HOSTNAME']:
+            self.assertIn('- %s:' % hostname, msg,
+                          '%s not in failure summary: %s' % (hostname, msg))
+
+        # invalid parallel count
+        msg = self.run_cli_cmd('host setup -f %s --parallel 0' % yml_path,
+                               True)
+        self.assertIn('ERROR', msg, 'parallel count of 0 did not error')
+
+    def test_hosts_check_all(self):
+        """test checking all hosts with one ansible command"""
+        hostnames = ['host_test1.invalid', 'host_test2.invalid']
+        for hostname in hostnames:
+            self.run_cli_cmd('host add %s' % hostname)
+
+        # neither host exists, both are in the failure summary
+        msg = self.run_cli_cmd('host check --all', True)
+        self.assertIn('Not all hosts were reachable', msg,
+                      'host check --all did not error: %s' % msg)
+        for hostname in hostnames:
+            self.assertIn('- %s:' % hostname, msg,
+                          '%s not in failure summary: %s' % (hostname, msg))
+
+        # hostname and --all both present
+        msg = self.run_cli_cmd('host check --all %s' % hostnames[0], True)
+        self.assertIn('ERROR', msg, 'hostname and --all did not error')
+
     def _check_cli_output(self, exp_hosts, cli_output):
         """Verify cli data against model data
 
@@ -207,7 +252,7 @@ class TestFunctional(KollaCliTest):
                             % (exp_hostname, cli_output))
 
     def write_yml(self, yml_dict):
-        yml = yaml.dump(yml_dict)
+        yml = yaml_dump(yml_dict)
         with open(self.get_yml_path(), 'w') as yml_file:
             yml_file.write(yml)
 
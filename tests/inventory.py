@@ -0,0 +1,206 @@
+# Copyright(c) 2015, Oracle and/or its affiliates.  All Rights Reserved.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License"); you may
+#   not use this file except in compliance with the License. You may obtain
+#   a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#   WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#   License for the specific language governing permissions and limitations
+#   under the License.
+#
+from common import KollaCliTest
+
+from kollacli.ansible.inventory import GENERATED_INVENTORY_MAX_AGE
+from kollacli.ansible.inventory import GENERATED_INVENTORY_PREFIX
+from kollacli.ansible.inventory import Inventory
+from kollacli.ansible.inventory import INVENTORY_PATH
+from kollacli.ansible.inventory import JOURNAL_COMPACT_THRESHOLD
+from kollacli.ansible.inventory import JSONPICKLE_OBJECT_KEY
+from kollacli.ansible.inventory import SERVICES
+from kollacli.exceptions import CommandError
+from kollacli import utils
+from kollacli.utils import get_kollacli_etc
+
+import glob
+import json
+import os
+import shutil
+import time
+import unittest
+
+
+class TestFunctional(KollaCliTest):
+
+    def test_static_inventory(self):
+        # files left by earlier runs would be reused rather than created
+        for path in glob.glob(os.path.join(get_kollacli_etc(),
+                                           GENERATED_INVENTORY_PREFIX + '*')):
+            os.remove(path)
+
+        host1 = 'host_test1'
+        group1 = 'control'
+        self.run_cli_cmd('host add %s' % host1)
+        self.run_cli_cmd('group addhost %s %s' % (group1, host1))
+
+        inventory = Inventory.load()
+
+        # ini inventory
+        path = inventory.create_inventory_file(inventory_format='ini')
+        with open(path, 'r') as inv_file:
+            ini_data = inv_file.read()
+        self.assertIn('[%s]\n%s\n' % (group1, host1), ini_data,
+                      '%s not in ini inventory: %s' % (host1, ini_data))
+        self.assertIn('[%s:vars]\n' % group1, ini_data,
+                      'no %s vars in ini inventory: %s' % (group1, ini_data))
+        for service in SERVICES:
+            self.assertIn('[%s:children]\n' % service, ini_data,
+                          '%s not in ini inventory: %s' % (service, ini_data))
+
+        # json inventory, in the ansible yaml plugin layout
+        path = inventory.create_inventory_file(inventory_format='json')
+        with open(path, 'r') as inv_file:
+            json_data = inv_file.read()
+        groups = json.loads(json_data)
+        self.assertIn(host1, groups[group1]['hosts'],
+                      '%s not in json inventory: %s' % (host1, json_data))
+        for service in SERVICES:
+            self.assertIn(service, groups,
+                          '%s not in json inventory: %s'
+                          % (service, json_data))
+
+        # non-ascii names are written as utf-8
+        inventory.add_group(u'test_gr\xfcp')
+        ini_path = inventory.create_inventory_file(inventory_format='ini')
+        with open(ini_path, 'r') as inv_file:
+            self.assertIn('[test_gr\xc3\xbcp]\n', inv_file.read())
+        inventory.remove_group(u'test_gr\xfcp')
+
+        # the json format needs a newer ansible
+        get_ansible_version = utils.get_ansible_version
+        utils.get_ansible_version = lambda: (2, 3, 1)
+        try:
+            self.assertRaises(CommandError, inventory.create_inventory_file,
+                              inventory_format='json')
+        finally:
+            utils.get_ansible_version = get_ansible_version
+
+        # an unchanged inventory reuses the same file, and touches it
+        old_time = time.time() - GENERATED_INVENTORY_MAX_AGE - 60
+        os.utime(path, (old_time, old_time))
+        self.assertEqual(path,
+                         inventory.create_inventory_file(
+                             inventory_format='json'),
+                         'inventory file not reused')
+        self.assertGreater(os.path.getmtime(path), old_time)
+
+        # a changed inventory gets a new file
+        self.run_cli_cmd('host add host_test2')
+        inventory = Inventory.load()
+        new_path = inventory.create_inventory_file(inventory_format='json')
+        self.assertNotEqual(path, new_path, 'inventory file not regenerated')
+        self.assertTrue(os.path.exists(path),
+                        'old inventory file removed: %s' % path)
+
+        # a file unused for longer than the max age is removed
+        os.utime(path, (old_time, old_time))
+        self.run_cli_cmd('host add host_test3')
+        inventory = Inventory.load()
+        inventory.create_inventory_file(inventory_format='json')
+        self.assertFalse(os.path.exists(path),
+                         'unused inventory file not removed: %s' % path)
+
+    def test_concurrent_saves(self):
+        # a command saves after another has compacted the journal
+        reader = Inventory.load()
+        writer = Inventory.load()
+        for i in range(JOURNAL_COMPACT_THRESHOLD + 1):
+            writer.add_host('host_writer%s' % i)
+            Inventory.save(writer)
+        reader.add_host('host_reader')
+        Inventory.save(reader)
+        inventory = Inventory.load()
+        self.assertIsNotNone(inventory.get_host('host_reader'))
+        self.assertIsNotNone(inventory.get_host('host_writer0'))
+
+        # a saved inventory has the hosts saved by other commands, so
+        # its cached json does too
+        inventory_a = Inventory.load()
+        inventory_b = Inventory.load()
+        inventory_a.add_host('host_a')
+        inventory_b.add_host('host_b')
+        Inventory.save(inventory_a)
+        Inventory.save(inventory_b)
+        for inventory in [inventory_b, Inventory.load()]:
+            json_hosts = json.loads(inventory.get_ansible_json())
+            hosts = json_hosts['_meta']['hostvars'].keys()
+            self.assertIn('host_a', hosts)
+            self.assertIn('host_b', hosts)
+
+    def test_save_without_snapshot(self):
+        # a save after the journal has a header only appends to it
+        inventory = Inventory.load()
+        Inventory.save(inventory)
+
+        def parse_snapshot():
+            raise AssertionError('inventory file parsed by a save')
+
+        names = ['_load_snapshot', '_read_snapshot_revision']
+        saved = dict((name, Inventory.__dict__[name]) for name in names)
+        try:
+            for name in names:
+                setattr(Inventory, name, staticmethod(parse_snapshot))
+            for i in range(3):
+                inventory.add_host('host_test%s' % i)
+                Inventory.save(inventory)
+        finally:
+            for name, func in saved.items():
+                setattr(Inventory, name, func)
+
+        inventory = Inventory.load()
+        for i in range(3):
+            self.assertIsNotNone(inventory.get_host('host_test%s' % i))
+
+    def test_upgrade_v1_inventory(self):
+        # inventory_v1.json was written with jsonpickle by version 1
+        v1_path = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                               'inventory_v1.json')
+        inventory_path = os.path.join(get_kollacli_etc(), INVENTORY_PATH)
+        shutil.copyfile(v1_path, inventory_path)
+
+        inventory = Inventory.load()
+        self.assertEqual(Inventory.class_version, inventory.version)
+        self.assertEqual(['v1_host1', 'v1_host2'],
+                         sorted(inventory.get_hostnames()))
+        self.assertEqual('b', inventory.get_host('v1_host1').get_vars()
+                         .get('v1_host_var'))
+        self.assertEqual(['v1_host1'],
+                         inventory.get_group('control').get_hostnames())
+        self.assertEqual(['v1_host2'],
+                         inventory.get_group('compute').get_hostnames())
+        group = inventory.get_group('v1_group')
+        self.assertEqual(['v1_host2'], group.get_hostnames())
+        self.assertEqual('a', group.get_vars().get('v1_group_var'))
+        self.assertEqual(sorted(SERVICES),
+                         sorted(service.name for service
+                                in inventory.get_services()))
+
+        # the file is rewritten in the version 2 schema
+        with open(inventory_path, 'r') as inventory_file:
+            inv_dict = json.load(inventory_file)
+        self.assertNotIn(JSONPICKLE_OBJECT_KEY, inv_dict)
+        self.assertEqual(Inventory.class_version, inv_dict['version'])
+
+        # and loads back to the same inventory
+        inventory = Inventory.load()
+        self.assertEqual(['v1_host2'],
+                         inventory.get_group('v1_group').get_hostnames())
+        self.assertEqual('b', inventory.get_host('v1_host1').get_vars()
+                         .get('v1_host_var'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+# Copyright(c) 2015, Oracle and/or its affiliates.  All Rights Reserved.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License"); you may
+#   not use this file except in compliance with the License. You may obtain
+#   a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#   WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#   License for the specific language governing permissions and limitations
+#   under the License.
+#
+from common import KollaCliTest
+from common import StubPlaybook
+
+from kollacli.ansible.inventory import Inventory
+from kollacli.ansible.inventory import SERVICES
+from kollacli.ansible import planner
+from kollacli.exceptions import CommandError
+
+import unittest
+
+
+class TestFunctional(KollaCliTest):
+
+    def test_deploy_plan(self):
+        self.assertEqual(sorted(SERVICES),
+                         sorted(planner.SERVICE_DEPENDENCIES))
+        waves = planner.get_waves(['nova', 'keystone', 'rabbitmq',
+                                   'mysqlcluster', 'neutron'])
+        self.assertEqual([['mysqlcluster', 'rabbitmq'], ['keystone'],
+                          ['neutron', 'nova']], waves)
+
+        # dependencies outside of the list are already deployed
+        waves = planner.get_waves(['nova', 'neutron'])
+        self.assertEqual([['neutron', 'nova']], waves)
+
+        self.assertRaises(CommandError, planner.get_waves, ['a', 'b'],
+                          {'a': ['b'], 'b': ['a']})
+
+        # nova is on the control hosts, neutron on the network hosts
+        self.run_cli_cmd('service removegroup neutron-server control')
+        self.run_cli_cmd('host add host_test1')
+        self.run_cli_cmd('host add host_test2')
+        self.run_cli_cmd('group addhost control host_test1')
+        self.run_cli_cmd('group addhost network host_test2')
+        inventory = Inventory.load()
+        plan = planner.get_plan(inventory, ['rabbitmq', 'keystone', 'nova',
+                                            'neutron', 'heat'])
+        self.assertEqual(
+            [[{'services': ['keystone', 'rabbitmq'], 'hosts': ['host_test1']}],
+             [{'services': ['heat', 'nova'], 'hosts': ['host_test1']},
+              {'services': ['neutron'], 'hosts': ['host_test2']}]],
+            plan)
+
+        # services that share a host are deployed together
+        self.run_cli_cmd('group addhost network host_test1')
+        inventory = Inventory.load()
+        plan = planner.get_plan(inventory, ['nova', 'neutron'])
+        self.assertEqual(
+            [[{'services': ['neutron', 'nova'],
+               'hosts': ['host_test1', 'host_test2']}]], plan)
+        plan = planner.get_plan(inventory, ['nova', 'neutron'],
+                                hostnames=['host_test2'])
+        self.assertEqual(
+            [[{'services': ['neutron'], 'hosts': ['host_test2']}]], plan)
+
+        msg = self.run_cli_cmd('deploy --plan --dry-run '
+                               '--services=keystone,rabbitmq')
+        self.assertIn('keystone', msg)
+        self.assertIn('host_test1', msg)
+
+        # nova and neutron are deployed to the compute hosts too
+        self.run_cli_cmd('host add host_test3')
+        self.run_cli_cmd('group addhost compute host_test3')
+        inventory = Inventory.load()
+        plan = planner.get_plan(inventory, ['nova', 'neutron', 'keystone'],
+                                hostnames=['host_test3'])
+        self.assertEqual(
+            [[{'services': ['neutron', 'nova'], 'hosts': ['host_test3']}]],
+            plan)
+
+        # no more waves after a failed one
+        plan = planner.get_plan(inventory, ['mysqlcluster', 'keystone'])
+        playbook = StubPlaybook(fail_hosts=['host_test1'])
+        wave_deploy = planner.WaveDeploy(playbook, plan)
+        self.assertRaises(CommandError, wave_deploy.run)
+        self.assertEqual([['host_test1']], playbook.deployed)
+        self.assertIn('Not run', wave_deploy.results[1]['error'])
+
+
+if __name__ == '__main__':
+    unittest.main()
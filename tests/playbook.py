@@ -0,0 +1,93 @@
+# Copyright(c) 2015, Oracle and/or its affiliates.  All Rights Reserved.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License"); you may
+#   not use this file except in compliance with the License. You may obtain
+#   a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#   WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#   License for the specific language governing permissions and limitations
+#   under the License.
+#
+from common import KollaCliTest
+
+from kollacli.ansible import playbook
+from kollacli.ansible.playbook import CALLBACK_PLUGINS_PATH
+from kollacli.ansible.playbook import PlaybookEvents
+from kollacli.utils import get_kollacli_home
+
+import json
+import os
+import tempfile
+import unittest
+
+
+class TestFunctional(KollaCliTest):
+
+    def test_playbook_events(self):
+        events = [
+            {'event': 'play_start', 'name': 'play1', 'time': 100.0},
+            {'event': 'task_start', 'name': 'task1', 'role': 'role1',
+             'time': 101.0},
+            {'event': 'host_result', 'host': 'host1', 'status': 'changed',
+             'time': 103.0},
+            {'event': 'host_result', 'host': 'host2', 'status': 'failed',
+             'msg': 'failed msg', 'time': 106.0},
+            {'event': 'task_start', 'name': 'task2', 'role': None,
+             'time': 107.0},
+            {'event': 'host_result', 'host': 'host1', 'status': 'ok',
+             'time': 108.0},
+            {'event': 'playbook_end', 'time': 110.0},
+            ]
+        fd, path = tempfile.mkstemp()
+        with os.fdopen(fd, 'w') as events_file:
+            for event in events:
+                events_file.write(json.dumps(event) + '\n')
+        try:
+            run = PlaybookEvents.load(path)
+        finally:
+            os.remove(path)
+
+        self.assertEqual(10.0, run.get_duration())
+        self.assertEqual(['task1', 'task2'],
+                         [task['name'] for task in run.tasks])
+        task1 = run.tasks[0]
+        self.assertEqual('role1', task1['role'])
+        self.assertEqual('play1', task1['play'])
+        self.assertEqual(6.0, task1['duration'])
+        self.assertEqual(2.0, task1['hosts']['host1']['duration'])
+        self.assertEqual('failed msg', task1['hosts']['host2']['msg'])
+        self.assertEqual(3.0, run.tasks[1]['duration'])
+
+        self.assertEqual(3.0, run.hosts['host1']['duration'])
+        self.assertEqual(1, run.hosts['host1']['changed'])
+        self.assertEqual(1, run.hosts['host1']['ok'])
+        self.assertEqual(5.0, run.hosts['host2']['duration'])
+        self.assertEqual(1, run.hosts['host2']['failed'])
+
+        # the profile lists the slowest first
+        profile = run.get_profile()
+        self.assertEqual(['role1', None],
+                         [role['name'] for role in profile['roles']])
+        self.assertEqual('host2', profile['tasks'][0]['slowest_host'])
+        self.assertEqual(['host2', 'host1'],
+                         [host['name'] for host in profile['hosts']])
+
+    def test_callback_plugins(self):
+        # the kollacli plugins are added to the site plugins
+        kollacli_path = os.path.join(get_kollacli_home(),
+                                     CALLBACK_PLUGINS_PATH)
+        site_path = os.pathsep.join(['/site/plugins1', '/site/plugins2'])
+        self.assertEqual(os.pathsep.join([site_path, kollacli_path]),
+                         playbook._get_callback_plugins(site_path))
+        self.assertEqual(kollacli_path, playbook._get_callback_plugins(
+            kollacli_path))
+        self.assertTrue(playbook._get_callback_plugins(None)
+                        .endswith(kollacli_path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -14,10 +14,20 @@
 #
 from common import KollaCliTest
 
+import json
 import os
+import stat
+import tempfile
 import unittest
 
+from kollacli.ansible import properties
+from kollacli.ansible.properties import AnsibleProperties
+from kollacli.ansible.properties import PROPERTIES_CACHE_PATH
 from kollacli.utils import get_kolla_etc
+from kollacli.utils import change_properties
+from kollacli.utils import get_kollacli_etc
+from kollacli.utils import yaml_dump
+from kollacli.utils import yaml_load
 
 
 class TestFunctional(KollaCliTest):
@@ -68,6 +78,172 @@ class TestFunctional(KollaCliTest):
         self.assertEqual(size_start, size_end, 'globals.yml size changed ' +
                          'from %s to %s' % (size_start, size_end))
 
+    def test_property_cache(self):
+        cache_path = os.path.join(get_kollacli_etc(), PROPERTIES_CACHE_PATH)
+        if os.path.exists(cache_path):
+            os.remove(cache_path)
+        globals_path = os.path.join(get_kolla_etc(), 'globals.yml')
+        key = 'TeStKeY'
+        AnsibleProperties()
+        self.assertTrue(os.path.exists(cache_path))
+
+        # unchanged files are not parsed again
+        with open(cache_path) as cache_file:
+            cache = json.load(cache_file)
+        cache[globals_path][1][key] = 'cached'
+        with open(cache_path, 'w') as cache_file:
+            json.dump(cache, cache_file)
+        self.assertEqual('cached', AnsibleProperties().get_property(key))
+
+        # changed files are
+        try:
+            self.run_cli_cmd('property set %s changed' % key)
+            self.assertEqual('changed',
+                             AnsibleProperties().get_property(key))
+        finally:
+            self.run_cli_cmd('property clear %s' % key)
+        self.assertIsNone(AnsibleProperties().get_property(key))
+
+    def test_property_lazy(self):
+        cache_path = os.path.join(get_kollacli_etc(), PROPERTIES_CACHE_PATH)
+        globals_path = os.path.join(get_kolla_etc(), 'globals.yml')
+
+        # a property in globals.yml is found without reading other files
+        key = 'TeStKeY'
+        try:
+            self.run_cli_cmd('property set %s lazy' % key)
+            if os.path.exists(cache_path):
+                os.remove(cache_path)
+            self.assertEqual('lazy', properties.get_property(key))
+            with open(cache_path) as cache_file:
+                self.assertEqual([globals_path], json.load(cache_file).keys())
+
+            # jinja2 values are skipped
+            self.run_cli_cmd('property set %s {{x}}' % key)
+            self.assertIsNone(properties.get_property(key))
+        finally:
+            self.run_cli_cmd('property clear %s' % key)
+
+        ansible_properties = AnsibleProperties()
+        for prop in ansible_properties.get_all_unique():
+            self.assertEqual(prop.value, properties.get_property(prop.name))
+        self.assertIsNone(properties.get_property('no_such_property'))
+
+    def test_property_editor(self):
+        data = ('---\n'
+                '# comment about foo\n'
+                'foo: "1"\n'
+                'foo_bar: "2"\n'
+                '\n'
+                'a_list:\n'
+                '  - a\n'
+                '# comment about dup\n'
+                '- b\n'
+                'dup: "3"\n'
+                '"quoted": "4"\n'
+                'dup: "5"\n')
+        fd, path = tempfile.mkstemp()
+        try:
+            with os.fdopen(fd, 'w') as yml_file:
+                yml_file.write(data)
+            os.chmod(path, 0o640)
+
+            # a key does not match other keys that start with it
+            change_properties(path, {'foo': 'x"y'})
+            with open(path) as yml_file:
+                new_data = yml_file.read()
+            self.assertEqual(data.replace('foo: "1"', 'foo: "x\\"y"'),
+                             new_data)
+            self.assertEqual(0o640, stat.S_IMODE(os.stat(path).st_mode))
+
+            # the group of the file is kept, if this user can set it
+            gids = [gid for gid in os.getgroups() if gid != os.getgid()]
+            if not gids and os.getuid() == 0:
+                gids = [os.getgid() + 1]
+            if gids:
+                os.chown(path, -1, gids[0])
+                change_properties(path, {'foo_bar': '3'})
+                self.assertEqual(gids[0], os.stat(path).st_gid)
+                change_properties(path, {'foo_bar': '2'})
+
+            # many changes in one rewrite
+            change_properties(path, {'a_list': 'c', 'quoted': '6',
+                                     'new': '7'},
+                              ['foo', 'dup', 'missing'])
+            with open(path) as yml_file:
+                new_data = yml_file.read()
+            self.assertEqual('---\n'
+                             '# comment about foo\n'
+                             'foo_bar: "2"\n'
+                             '\n'
+                             'a_list: "c"\n'
+                             'quoted: "6"\n'
+                             'new: "7"\n', new_data)
+            self.assertEqual({'foo_bar': '2', 'a_list': 'c', 'quoted': '6',
+                              'new': '7'}, yaml_load(new_data))
+        finally:
+            os.remove(path)
+
+    def test_property_change_many(self):
+        cache_path = os.path.join(get_kollacli_etc(), PROPERTIES_CACHE_PATH)
+        keys = ['TeStKeY1', 'TeStKeY2']
+        try:
+            self.run_cli_cmd('property set %s old' % keys[1])
+            if os.path.exists(cache_path):
+                os.remove(cache_path)
+
+            # set and clear in one rewrite, without parsing any file
+            AnsibleProperties.change_properties({keys[0]: 'one'}, [keys[1]])
+            self.assertFalse(os.path.exists(cache_path),
+                             'property files parsed')
+            self.assertEqual(['one', None],
+                             [properties.get_property(key) for key in keys])
+        finally:
+            AnsibleProperties.change_properties(clear_keys=keys)
+        self.assertEqual([None, None],
+                         [properties.get_property(key) for key in keys])
+
+    def test_property_set_file(self):
+        globals_path = os.path.join(get_kolla_etc(), 'globals.yml')
+        size_start = os.path.getsize(globals_path)
+        fd, path = tempfile.mkstemp(suffix='.yml')
+        os.close(fd)
+        keys = ['TeStKeY1', 'TeStKeY2', 'TeStKeY3']
+        try:
+            with open(path, 'w') as yml_file:
+                yml_file.write('%s: 3\n%s: one\n%s: yes\n'
+                               % (keys[2], keys[0], keys[1]))
+            self.run_cli_cmd('property set --file %s' % path)
+            ansible_properties = AnsibleProperties()
+            self.assertEqual(['one', 'yes', '3'],
+                             [ansible_properties.get_property(key)
+                              for key in keys])
+
+            # new properties are added in the order of the file
+            with open(globals_path) as globals_file:
+                globals_data = globals_file.read()
+            self.assertEqual(
+                [keys[2], keys[0], keys[1]],
+                sorted(keys, key=globals_data.find))
+
+            # properties with no value are cleared
+            with open(path, 'w') as yml_file:
+                yaml_dump({keys[0]: None, keys[1]: 'two', keys[2]: None},
+                          yml_file)
+            self.run_cli_cmd('property set --file %s' % path)
+            self.assertEqual([None, 'two', None],
+                             [properties.get_property(key) for key in keys])
+
+            msg = self.run_cli_cmd('property set', expect_error=True)
+            self.assertIn('required', msg)
+            msg = self.run_cli_cmd('property set %s x --file %s'
+                                   % (keys[0], path), expect_error=True)
+            self.assertIn('cannot', msg)
+        finally:
+            self.run_cli_cmd('property clear %s' % keys[1])
+            os.remove(path)
+        self.assertEqual(size_start, os.path.getsize(globals_path))
+
     def _property_value_exists(self, key, value, cli_output):
         """Verify cli data against model data"""
         # check for any host in cli output that shouldn't be there
@@ -0,0 +1,95 @@
+# Copyright(c) 2015, Oracle and/or its affiliates.  All Rights Reserved.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License"); you may
+#   not use this file except in compliance with the License. You may obtain
+#   a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#   WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#   License for the specific language governing permissions and limitations
+#   under the License.
+#
+from common import KollaCliTest
+from common import StubPlaybook
+
+from kollacli.ansible.inventory import Inventory
+from kollacli.ansible.playbook import AnsiblePlaybook
+from kollacli.ansible import rolling
+from kollacli.exceptions import CommandError
+
+import json
+import unittest
+
+
+class TestFunctional(KollaCliTest):
+
+    def test_rolling_batches(self):
+        compute_hosts = ['host_test%s' % i for i in range(1, 6)]
+        control_hosts = ['host_test6']
+        for host in compute_hosts + control_hosts:
+            self.run_cli_cmd('host add %s' % host)
+        for host in compute_hosts:
+            self.run_cli_cmd('group addhost compute %s' % host)
+        for host in control_hosts:
+            self.run_cli_cmd('group addhost control %s' % host)
+        inventory = Inventory.load()
+
+        # control is deployed before compute, in batches of 40%
+        sizes = rolling.parse_batch_sizes('compute=40%')
+        batches = rolling.get_batches(inventory, sizes)
+        self.assertEqual([('control', control_hosts),
+                          ('compute', compute_hosts[0:2]),
+                          ('compute', compute_hosts[2:4]),
+                          ('compute', compute_hosts[4:5])], batches)
+
+        # a size for all groups, and a host filter
+        sizes = rolling.parse_batch_sizes('2')
+        batches = rolling.get_batches(inventory, sizes,
+                                      hostnames=compute_hosts[1:])
+        self.assertEqual([('compute', compute_hosts[1:3]),
+                          ('compute', compute_hosts[3:5])], batches)
+
+        for batch_size in ['0', '101%', 'x', 'nogroup=1', '']:
+            self.assertRaises(CommandError, rolling.parse_batch_sizes,
+                              batch_size)
+
+        # stop after the first failed batch
+        sizes = rolling.parse_batch_sizes('1')
+        batches = rolling.get_batches(inventory, sizes)
+        playbook = StubPlaybook(fail_hosts=[compute_hosts[1]])
+        rolling_deploy = rolling.RollingDeploy(playbook, batches)
+        self.assertRaises(CommandError, rolling_deploy.run)
+        self.assertEqual([control_hosts, compute_hosts[0:1],
+                          compute_hosts[1:2]], playbook.deployed)
+        results = rolling_deploy.results
+        self.assertEqual(6, len(results))
+        self.assertIsNone(results[1]['error'])
+        self.assertIsNotNone(results[1]['duration'])
+        self.assertIn('failed', results[2]['error'])
+        self.assertIn('Not run', results[3]['error'])
+
+        # allow one failure
+        playbook = StubPlaybook(fail_hosts=[compute_hosts[1]])
+        rolling_deploy = rolling.RollingDeploy(playbook, batches,
+                                               concurrency=2, max_failures=1)
+        self.assertRaises(CommandError, rolling_deploy.run)
+        self.assertEqual(6, len(playbook.deployed))
+
+        # a batch is limited to its hosts, the inventory still has the
+        # other hosts
+        playbook = AnsiblePlaybook()
+        rolling._limit_to_batch(playbook, {'group': 'compute',
+                                           'hosts': compute_hosts[0:1]})
+        self.assertEqual(compute_hosts[0:1], playbook.limit_hosts)
+        inventory_filter = playbook.get_inventory_filter(inventory)
+        groups = json.loads(inventory.get_ansible_json(inventory_filter))
+        self.assertEqual(control_hosts, groups['control']['hosts'])
+        self.assertIn('control', groups['rabbitmq']['children'])
+        self.assertEqual(compute_hosts, sorted(groups['compute']['hosts']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+# Copyright(c) 2015, Oracle and/or its affiliates.  All Rights Reserved.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License"); you may
+#   not use this file except in compliance with the License. You may obtain
+#   a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#   WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#   License for the specific language governing permissions and limitations
+#   under the License.
+#
+from common import KollaCliTest
+
+from kollacli.ansible.inventory import Inventory
+from kollacli.ansible.settings import AnsibleSettings
+from kollacli.ansible.settings import SETTINGS_PATH
+from kollacli.utils import get_kollacli_etc
+
+import json
+import os
+import unittest
+
+
+class TestFunctional(KollaCliTest):
+
+    def setUp(self):
+        super(TestFunctional, self).setUp()
+        self._init_file(os.path.join(get_kollacli_etc(), SETTINGS_PATH))
+
+    def test_setting_set_clear(self):
+        self.check_settings({})
+
+        self.run_cli_cmd('setting set forks 20')
+        self.run_cli_cmd('setting set pipelining yes')
+        self.run_cli_cmd('setting set control_persist 300')
+        self.run_cli_cmd('setting set strategy free')
+        self.check_settings({'forks': '20', 'pipelining': 'yes',
+                             'control_persist': '300', 'strategy': 'free'})
+
+        env = AnsibleSettings().get_env()
+        self.assertEqual('20', env['ANSIBLE_FORKS'])
+        self.assertEqual('True', env['ANSIBLE_PIPELINING'])
+        self.assertIn('ControlPersist=300s', env['ANSIBLE_SSH_ARGS'])
+        self.assertEqual('free', env['ANSIBLE_STRATEGY'])
+
+        # sudo may drop the environment, so the settings are passed on the
+        # ansible command line too
+        args = AnsibleSettings().get_args()
+        self.assertIn('--forks 20', args)
+        extra_vars = json.loads(args.split("--extra-vars '")[1][:-1])
+        self.assertEqual(True, extra_vars['ansible_pipelining'])
+        self.assertIn('ControlPersist=300s', extra_vars['ansible_ssh_args'])
+        self.assertNotIn('free', args)
+
+        # overrides take the place of stored settings
+        env = AnsibleSettings().get_env({'forks': '5', 'strategy': None})
+        self.assertEqual('5', env['ANSIBLE_FORKS'])
+        self.assertEqual('free', env['ANSIBLE_STRATEGY'])
+        self.assertIn('--forks 5',
+                      AnsibleSettings().get_args({'forks': '5'}))
+
+        self.run_cli_cmd('setting clear forks')
+        self.run_cli_cmd('setting clear strategy')
+        self.check_settings({'pipelining': 'yes', 'control_persist': '300'})
+        env = AnsibleSettings().get_env()
+        self.assertNotIn('ANSIBLE_FORKS', env)
+
+        # invalid names and values
+        for cmd in ['setting set forks 0', 'setting set pipelining maybe',
+                    'setting set control_persist -1',
+                    'setting set strategy fastest',
+                    'setting set nosuchsetting 1',
+                    'setting clear nosuchsetting']:
+            msg = self.run_cli_cmd(cmd, True)
+            self.assertIn('ERROR', msg, '%s did not error' % cmd)
+        self.check_settings({'pipelining': 'yes', 'control_persist': '300'})
+
+    def test_setting_inventory_format(self):
+        self.run_cli_cmd('setting set inventory_format ini')
+        self.check_settings({'inventory_format': 'ini'})
+        self.assertNotIn('inventory_format', AnsibleSettings().get_env())
+
+        # the setting picks the format of the inventory file, unless one
+        # is given
+        inventory = Inventory.load()
+        self.assertTrue(inventory.create_inventory_file().endswith('.ini'))
+        self.assertTrue(inventory.create_inventory_file(
+            inventory_format='json').endswith('.json'))
+
+        msg = self.run_cli_cmd('setting set inventory_format xml', True)
+        self.assertIn('ERROR', msg, 'invalid inventory format did not error')
+        self.run_cli_cmd('setting clear inventory_format')
+        self.check_settings({})
+
+    def check_settings(self, expected):
+        msg = self.run_cli_cmd('setting list -f json')
+        cli_settings = json.loads(msg)
+        for cli_setting in cli_settings:
+            name = cli_setting['Setting Name']
+            self.assertEqual(expected.get(name, ''),
+                             '%s' % cli_setting['Setting Value'],
+                             'setting %s: %s' % (name, cli_settings))
+
+
+if __name__ == '__main__':
+    unittest.main()
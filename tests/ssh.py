@@ -0,0 +1,116 @@
+# Copyright(c) 2015, Oracle and/or its affiliates.  All Rights Reserved.
+#
+#   Licensed under the Apache License, Version 2.0 (the "License"); you may
+#   not use this file except in compliance with the License. You may obtain
+#   a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+#   Unless required by applicable law or agreed to in writing, software
+#   distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#   WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#   License for the specific language governing permissions and limitations
+#   under the License.
+#
+from common import KollaCliTest
+from common import SshTestServer
+
+from kollacli.sshutils import ssh_exec_cmds
+from kollacli.sshutils import ssh_setup_hosts
+from kollacli.utils import get_kollacli_etc
+
+import os
+import paramiko
+import time
+import unittest
+
+
+class TestFunctional(KollaCliTest):
+
+    def setUp(self):
+        super(TestFunctional, self).setUp()
+        self.server = SshTestServer()
+        self.server.start()
+        self.addCleanup(self.server.stop)
+
+    def test_ssh_exec_cmds(self):
+        ssh_client = paramiko.SSHClient()
+        ssh_client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        ssh_client.connect(hostname='127.0.0.1', port=self.server.port,
+                           username='kolla', password=self.server.password,
+                           look_for_keys=False, allow_agent=False)
+        self.addCleanup(ssh_client.close)
+
+        # results come back in command order, with stderr kept apart
+        cmds = ['sleep 1; echo one', 'echo two >&2', 'sleep 1; echo three']
+        start = time.time()
+        results = ssh_exec_cmds(cmds, ssh_client, self.log)
+        elapsed = time.time() - start
+        self.assertEqual([('one\n', ''), ('', 'two\n'), ('three\n', '')],
+                         results, 'unexpected results: %s' % results)
+
+        # the commands ran at the same time
+        self.assertLess(elapsed, 1.9,
+                        'commands ran one at a time: %.2fs' % elapsed)
+
+        # with a pty, stderr comes back in stdout
+        results = ssh_exec_cmds(['echo one', 'echo two >&2'], ssh_client,
+                                self.log, get_pty=[False, True])
+        self.assertEqual([('one\n', ''), ('two\n', '')], results,
+                         'unexpected pty results: %s' % results)
+
+    def test_ssh_setup_hosts(self):
+        key_path = os.path.join(get_kollacli_etc(), 'id_rsa.pub')
+        if not os.path.exists(key_path):
+            with open(key_path, 'w') as key_file:
+                key_file.write('ssh-rsa TESTKEY kolla@test')
+            self.addCleanup(os.remove, key_path)
+
+        # each stand-in host listens on its own loopback address
+        ok_servers = [SshTestServer(address='127.0.0.%s' % i,
+                                    run_cmds=False)
+                      for i in range(2, 5)]
+        slow_server = SshTestServer(address='127.0.0.5', login_delay=3,
+                                    run_cmds=False)
+        for server in ok_servers + [slow_server]:
+            server.start()
+            self.addCleanup(server.stop)
+
+        hosts_info = {}
+        for server in ok_servers + [slow_server]:
+            hosts_info[server.address] = {'password': server.password,
+                                          'port': server.port}
+        hosts_info[self.server.address] = {'password': 'wrong',
+                                           'port': self.server.port}
+        hosts_info['127.0.0.6'] = {'port': self.server.port}
+
+        failed_hosts = ssh_setup_hosts(hosts_info, parallel=4, timeout=1,
+                                       retries=1, retry_delay=0.1)
+
+        self.assertEqual(set([slow_server.address, self.server.address,
+                              '127.0.0.6']),
+                         set(failed_hosts.keys()),
+                         'unexpected failures: %s' % failed_hosts)
+        self.assertIn('Timed out', failed_hosts[slow_server.address])
+        self.assertIn('No password', failed_hosts['127.0.0.6'])
+        for server in ok_servers:
+            self.assertEqual(1, server.login_attempts)
+            # without pre checks only the key is added
+            self.assertEqual(1, len(server.commands))
+            self.assertIn('authorized_keys', server.commands[0])
+
+        # failed hosts were tried again, unless they timed out
+        self.assertEqual(2, self.server.login_attempts)
+        self.assertEqual(1, slow_server.login_attempts)
+
+        # the host checks and the key go in one batch. The stand-in host
+        # has no docker, so it fails the checks.
+        server = ok_servers[0]
+        failed_hosts = ssh_setup_hosts(
+            {server.address: hosts_info[server.address]}, timeout=1,
+            pre_checks=True)
+        self.assertIn('docker', failed_hosts[server.address])
+        self.assertEqual(5, len(server.commands))
+
+if __name__ == '__main__':
+    unittest.main()
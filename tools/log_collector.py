@@ -31,7 +31,7 @@ def run_ansible_cmd(cmd, host):
     out = None
     user = get_admin_user()
     inventory = Inventory.load()
-    inv_path = inventory.create_json_gen_file()
+    inv_path = inventory.create_inventory_file()
 
     acmd = ('/usr/bin/sudo -u %s ansible %s -i %s -a "%s"'
             % (user, host, inv_path, cmd))
@@ -42,8 +42,6 @@ def run_ansible_cmd(cmd, host):
                                       stderr=subprocess.PIPE).communicate()
     except Exception as e:
         print('%s\nCannot communicate with host: %s, skipping' % (e, host))
-    finally:
-        os.remove(inv_path)
 
     if not out:
         print('Host %s is not accessible: %s, skipping' % (host, err))
@@ -76,11 +74,8 @@ def get_containers(host):
               % (host, out))
         return None
 
-    ansible_properties = properties.AnsibleProperties()
-    base_distro = \
-        ansible_properties.get_property('kolla_base_distro')
-    install_type = \
-        ansible_properties.get_property('kolla_install_type')
+    base_distro = properties.get_property('kolla_base_distro')
+    install_type = properties.get_property('kolla_install_type')
     # typically this prefix will be "ol-openstack-"
     container_prefix = base_distro + '-' + install_type + '-'
 
@@ -12,11 +12,21 @@
 #    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
 #    License for the specific language governing permissions and limitations
 #    under the License.
+import errno
 import getopt
+import hashlib
+import hmac
+import json
+import os
 import sys
+import tempfile
 
 from kollacli import utils
 
+# key of the password fingerprints, readable only by the owner of the
+# passwords file, in the directory of the passwords file
+FINGERPRINT_KEY_FILENAME = '.passwords_fingerprint.key'
+
 
 def _print_pwd_keys(path):
     pwd_keys = ''
@@ -34,6 +44,49 @@ def _print_pwd_keys(path):
     print(pwd_keys)
 
 
+def _print_pwd_fingerprints(path, servicenames):
+    pwd_values = {}
+    pwd_data = utils.sync_read_file(path)
+    for line in pwd_data.split('\n'):
+        if line.startswith('#'):
+            # skip commented lines
+            continue
+        if ':' in line:
+            pwd_key, pwd_value = line.split(':', 1)
+            pwd_values[pwd_key] = pwd_value.strip()
+
+    # one keyed digest per service, so the values cannot be guessed
+    # from the output
+    key = _get_fingerprint_key(path)
+    for servicename in servicenames:
+        relevant = utils.get_relevant_values(pwd_values, servicename,
+                                             servicenames)
+        fingerprint = hmac.new(key, json.dumps(sorted(relevant.items())),
+                               hashlib.sha256).hexdigest()
+        print('%s:%s' % (servicename, fingerprint))
+
+
+def _get_fingerprint_key(path):
+    key_path = os.path.join(os.path.dirname(os.path.abspath(path)),
+                            FINGERPRINT_KEY_FILENAME)
+    if not os.path.exists(key_path):
+        # link a complete key file into place, in case another editor
+        # is creating it too
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(key_path),
+                                        prefix=FINGERPRINT_KEY_FILENAME)
+        try:
+            with os.fdopen(fd, 'wb') as key_file:
+                key_file.write(os.urandom(32))
+            os.link(tmp_path, key_path)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise e
+        finally:
+            os.remove(tmp_path)
+    with open(key_path, 'rb') as key_file:
+        return key_file.read()
+
+
 def main():
     """edit password in passwords.yml file
 
@@ -43,13 +96,17 @@ def main():
     -v value # value of password
     -c       # flag to clear the password
     -l       # print to stdout a csv string of the existing keys
+    -s names # print to stdout a service:fingerprint line for each of a
+             # csv string of service names, which changes when the
+             # passwords about the service change
     """
-    opts, _ = getopt.getopt(sys.argv[1:], 'p:k:v:cl')
+    opts, _ = getopt.getopt(sys.argv[1:], 'p:k:v:cls:')
     path = ''
     pwd_key = ''
     pwd_value = ''
     clear_flag = False
     list_flag = False
+    servicenames = None
     for opt, arg in opts:
         if opt == '-p':
             path = arg
@@ -61,10 +118,15 @@ def main():
             clear_flag = True
         elif opt == '-l':
             list_flag = True
+        elif opt == '-s':
+            servicenames = arg.split(',')
 
     if list_flag:
         # print the password keys
         _print_pwd_keys(path)
+    elif servicenames:
+        # print the password fingerprints of the services
+        _print_pwd_fingerprints(path, servicenames)
     else:
         # edit a password
         utils.change_property(path, pwd_key, pwd_value, clear_flag)
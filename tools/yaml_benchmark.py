@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+# Copyright(c) 2015, Oracle and/or its affiliates.  All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+import os
+import sys
+import time
+import yaml
+
+from kollacli.ansible.properties import ALLVARS_PATH
+from kollacli.ansible.properties import ANSIBLE_DEFAULTS_PATH
+from kollacli.ansible.properties import ANSIBLE_ROLES_PATH
+from kollacli.ansible.properties import GLOBALS_FILENAME
+from kollacli.utils import get_kolla_etc
+from kollacli.utils import get_kolla_home
+from kollacli.utils import YamlLoader
+
+
+def get_property_files():
+    """return paths of the yaml files that kollacli reads properties from"""
+    kolla_home = get_kolla_home()
+    paths = [os.path.join(get_kolla_etc(), GLOBALS_FILENAME),
+             os.path.join(kolla_home, ALLVARS_PATH)]
+    roles_dir = os.path.join(kolla_home, ANSIBLE_ROLES_PATH)
+    for role_name in sorted(next(os.walk(roles_dir))[1]):
+        path = os.path.join(roles_dir, role_name, ANSIBLE_DEFAULTS_PATH)
+        paths.append(path)
+    return [path for path in paths if os.path.isfile(path)]
+
+
+def time_loader(loader, file_datas, rounds):
+    start = time.time()
+    for _ in range(rounds):
+        for file_data in file_datas:
+            yaml.load(file_data, Loader=loader)
+    return (time.time() - start) / rounds
+
+
+def main():
+    """time parsing the property files with each yaml loader
+
+    sys.argv:
+    rounds  # number of times to parse the files, default 10
+    """
+    rounds = 10
+    if len(sys.argv) > 1:
+        rounds = int(sys.argv[1])
+
+    paths = get_property_files()
+    if not paths:
+        print('No property files found under %s' % get_kolla_home())
+        sys.exit(1)
+    file_datas = []
+    for path in paths:
+        with open(path, 'r') as yaml_file:
+            file_datas.append(yaml_file.read())
+    size = sum([len(file_data) for file_data in file_datas])
+    print('Parsing %s files, %s bytes, %s rounds'
+          % (len(paths), size, rounds))
+
+    python_time = time_loader(yaml.SafeLoader, file_datas, rounds)
+    print('%-12s %8.1f ms' % ('SafeLoader', python_time * 1000))
+    if YamlLoader is yaml.SafeLoader:
+        print('libyaml is not installed, kollacli uses SafeLoader')
+        return
+    c_time = time_loader(YamlLoader, file_datas, rounds)
+    print('%-12s %8.1f ms' % (YamlLoader.__name__, c_time * 1000))
+    print('speedup      %8.1fx' % (python_time / c_time))
+
+
+if __name__ == '__main__':
+    main()